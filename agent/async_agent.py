@@ -0,0 +1,341 @@
+import asyncio
+import logging
+import os
+
+import httpx
+from openai import AsyncOpenAI
+
+from llm_agent import LLMAgent
+from rollout_fork import Fork, cluster_forks, share_context_state
+from round_log import RoundLog
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncLLMAgent(LLMAgent):
+    """LLMAgent that runs every rollout as a task on one asyncio event loop.
+
+    Concurrency is bounded by explicit limits instead of OS threads:
+    --max_concurrent_rollouts (rollouts in progress), --max_concurrent_llm
+    (in-flight LLM requests) and --max_concurrent_tools (in-flight tool-server
+    requests). Idle rollouts cost a coroutine, not a thread.
+    """
+
+    def __init__(self, args):
+        super().__init__(args)
+        self.async_client = None
+        self.tool_client = None
+        self.llm_semaphore = None
+        self.tool_semaphore = None
+        self.rollout_semaphore = None
+
+    def _setup_event_loop_resources(self):
+        # Clients and semaphores bind to the running loop, so create them inside it
+        self.async_client = AsyncOpenAI(
+            base_url=os.getenv("OPENAI_API_BASE"),
+            api_key=os.getenv("OPENAI_API_KEY"),
+            max_retries=0,
+            http_client=httpx.AsyncClient(limits=httpx.Limits(
+                max_connections=self.args.max_concurrent_llm,
+                max_keepalive_connections=self.args.max_concurrent_llm
+            ), timeout=httpx.Timeout(600.0, connect=30.0))
+        )
+        self.tool_client = httpx.AsyncClient(limits=httpx.Limits(
+            max_connections=self.args.max_concurrent_tools,
+            max_keepalive_connections=self.args.max_concurrent_tools
+        ))
+        self.llm_semaphore = asyncio.Semaphore(self.args.max_concurrent_llm)
+        self.tool_semaphore = asyncio.Semaphore(self.args.max_concurrent_tools)
+        self.rollout_semaphore = asyncio.Semaphore(self.args.max_concurrent_rollouts)
+
+    def _rollout_concurrency(self):
+        return self.args.max_concurrent_rollouts
+
+    async def _close_event_loop_resources(self):
+        await self.tool_client.aclose()
+        await self.async_client.close()
+
+    async def call_llm_async(self, messages, instance_id=None, round_num=None, n=1):
+        """Async counterpart of call_llm (non-streaming) with the same retry policy"""
+        max_retries = 500
+        retry_count = 0
+
+        while retry_count < max_retries:
+            estimate = await self._acquire_llm_slot_async(messages)
+            try:
+                async with self.llm_semaphore:
+                    with tracer.span("llm_call", round=round_num, attempt=retry_count + 1):
+                        raw_response = await self.async_client.chat.completions.with_raw_response.create(
+                            **self._completion_kwargs(messages, stream=False, n=n)
+                        )
+                        response = raw_response.parse()
+                        if asyncio.iscoroutine(response):
+                            response = await response
+                usage = response.usage.model_dump() if response.usage else None
+                self._release_llm_slot(estimate, usage, raw_response.headers)
+                outputs = [self._choice_output(choice) for choice in response.choices]
+                return outputs[0] if n == 1 else outputs
+
+            except asyncio.CancelledError as e:
+                # Rollout cancelled (early stop, shutdown): CancelledError isn't an Exception, but the slot must go back
+                self._release_llm_slot_after_error(estimate, e)
+                raise
+
+            except Exception as e:
+                rate_limited = self._release_llm_slot_after_error(estimate, e)
+                retry_count += 1
+                wait_time = min(2 ** retry_count, 60)
+                logger.warning(f"LLM call failed (attempt {retry_count}/{max_retries}): {str(e)}")
+
+                if retry_count >= max_retries:
+                    return f"ERROR: Failed to get LLM response after {max_retries} attempts: {str(e)}"
+
+                if rate_limited:
+                    continue
+
+                with tracer.span("llm_retry_wait", attempt=retry_count):
+                    await asyncio.sleep(wait_time)
+
+    async def call_llm_n_async(self, messages, n, instance_id=None, round_num=None):
+        """Async counterpart of call_llm_n"""
+        outputs = await self.call_llm_async(messages, instance_id, round_num, n=n)
+        if n == 1 and not self._is_llm_error(outputs):
+            outputs = [outputs]
+        while not self._is_llm_error(outputs) and len(outputs) < n:
+            extra = await self.call_llm_async(messages, instance_id, round_num)
+            if self._is_llm_error(extra):
+                return extra
+            outputs.append(extra)
+        return outputs
+
+    async def _acquire_llm_slot_async(self, messages):
+        if not self.rate_limiter:
+            return 0.0
+        with tracer.span("llm_rate_wait"):
+            return await self.rate_limiter.acquire_async(self.rate_limiter.estimate_tokens(messages))
+
+    async def _save_result_async(self, result):
+        # File writes happen under a per-instance lock; keep them off the event loop
+        await asyncio.to_thread(self._save_result, result)
+
+    async def process_single_item_async(self, item, rollout_idx):
+        instance_id = item["instance_id"]
+
+        async with self.rollout_semaphore:
+            if self.processed_instances[instance_id] >= self.args.rollout_number:
+                print(f"Skipping {instance_id} rollout {rollout_idx + 1} (already completed {self.processed_instances[instance_id]} valid rollouts)")
+                return None
+
+            if self.early_stop.decided(instance_id):
+                print(f"Skipping {instance_id} rollout {rollout_idx + 1} (answer already decided by vote)")
+                self.early_stop.record("skipped")
+                return None
+
+            with tracer.trace(instance_id, rollout_idx):
+                return await self._run_rollout_async(item, rollout_idx)
+
+    async def _run_rollout_async(self, item, rollout_idx):
+        """Async counterpart of _run_rollout"""
+        instance_id = item["instance_id"]
+        rollout_key = f"{instance_id}#{rollout_idx}"
+
+        try:
+            with tracer.span("prompt_build"):
+                messages = await asyncio.to_thread(self._initial_messages, item)
+            initial_count = len(messages)
+            log, loop_state, start_round = self._start_rollout(rollout_key, messages)
+            terminated = False
+            cancelled = False
+            vote = None
+
+            for round_num in range(start_round, self.args.max_rounds):
+                if self.early_stop.decided(instance_id):
+                    cancelled = True
+                    self.early_stop.record("cancelled")
+                    break
+
+                print(f"Processing {instance_id} rollout {rollout_idx + 1}, round {round_num + 1}")
+
+                llm_response = await self.call_llm_async(
+                    log.compacted(self.context_manager), instance_id, round_num + 1
+                )
+
+                if isinstance(llm_response, str) and llm_response.startswith("ERROR:"):
+                    print(f"Failed to get valid LLM response for {instance_id}")
+                    error_result = {
+                        "instance_id": instance_id,
+                        "rollout_idx": rollout_idx,
+                        "error": llm_response,
+                        "round_failed": round_num + 1,
+                        "terminated": False
+                    }
+                    await self._save_result_async(error_result)
+                    return error_result
+
+                async with self.tool_semaphore:
+                    result = await self.message_processor.process_round_async(
+                        llm_response, item, log, self.tool_client, rollout_key=rollout_key
+                    )
+
+                if result.get("terminated"):
+                    terminated = True
+                    vote = await self._cast_vote_async(item, log, rollout_key)
+                    break
+
+                if self.loop_detector.check(loop_state, log):
+                    print(f"Stopping {instance_id} rollout {rollout_idx + 1}: stuck in a loop ({loop_state['stopped']})")
+                    break
+
+                await asyncio.to_thread(self.checkpoints.save_round, rollout_key, round_num + 1, log, loop_state,
+                                        initial_count)
+
+            result = {
+                "instance_id": instance_id,
+                "rollout_idx": rollout_idx,
+                "conversation": log.conversation(),
+                "final_messages": log.messages,
+                "terminated": terminated
+            }
+            if vote:
+                result["vote"] = vote
+            if cancelled:
+                result["cancelled"] = True
+            if self.loop_detector.enabled:
+                result["loop_detection"] = self.loop_detector.report(loop_state)
+
+            await self._save_result_async(result)
+
+            status = "TERMINATED" if terminated else "CANCELLED" if cancelled else "INCOMPLETE"
+            print(f"Completed: {instance_id} (rollout {rollout_idx + 1}/{self.args.rollout_number}) - {status}")
+
+            return result
+
+        except Exception as e:
+            error_result = {
+                "instance_id": instance_id,
+                "rollout_idx": rollout_idx,
+                "error": str(e),
+                "terminated": False
+            }
+
+            await self._save_result_async(error_result)
+            print(f"Error processing {instance_id} rollout {rollout_idx + 1}: {str(e)}")
+            return error_result
+
+    async def process_rollout_group_async(self, item, rollout_indices):
+        """Async counterpart of process_rollout_group"""
+        instance_id = item["instance_id"]
+
+        async with self.rollout_semaphore:
+            if self.processed_instances[instance_id] >= self.args.rollout_number:
+                print(f"Skipping {instance_id} (already completed {self.processed_instances[instance_id]} valid rollouts)")
+                return None
+
+            if self.early_stop.decided(instance_id):
+                print(f"Skipping {instance_id} (answer already decided by vote)")
+                self.early_stop.record("skipped", len(rollout_indices))
+                return None
+
+            with tracer.trace(instance_id, rollout_indices[0]) as span:
+                if span is not None:
+                    span.set(forks=len(rollout_indices))
+                return await self._run_rollout_group_async(item, rollout_indices)
+
+    async def _run_rollout_group_async(self, item, rollout_indices):
+        """Async counterpart of _run_rollout_group"""
+        instance_id = item["instance_id"]
+
+        try:
+            with tracer.span("prompt_build"):
+                messages = await asyncio.to_thread(self._initial_messages, item)
+        except Exception as e:
+            print(f"Error processing {instance_id}: {str(e)}")
+            forks = [Fork(rollout_idx, RoundLog()) for rollout_idx in rollout_indices]
+            for fork in forks:
+                fork.fail(str(e))
+            return await asyncio.to_thread(self._finish_forks, instance_id, forks)
+
+        forks = self._start_forks(instance_id, messages, rollout_indices)
+
+        for round_num in range(min(fork.rounds for fork in forks), self.args.max_rounds):
+            running = self._active_forks(instance_id, forks)
+            if not running:
+                break
+            active = [fork for fork in running if fork.rounds <= round_num]
+            print(f"Processing {instance_id} rollouts {[fork.rollout_idx + 1 for fork in active]}, round {round_num + 1}")
+
+            clusters = cluster_forks(active)
+            outputs = await asyncio.gather(*[
+                self.call_llm_n_async(cluster[0].log.compacted(self.context_manager), len(cluster), instance_id,
+                                      round_num + 1)
+                for cluster in clusters
+            ])
+            for cluster, cluster_outputs in zip(clusters, outputs):
+                share_context_state(cluster)
+                self._apply_fork_outputs(item, cluster, cluster_outputs, round_num + 1)
+            for fork in active:
+                if fork.status == "terminated":
+                    fork.vote = await self._cast_vote_async(item, fork.log, f"{instance_id}#{fork.rollout_idx}")
+
+            groups = cluster_forks([fork for fork in active if fork.pending_tool_calls])
+            exec_results = await asyncio.gather(*[
+                self._execute_pending_limited(group[0].pending_tool_calls, group[0].log.messages,
+                                              f"{instance_id}#{group[0].rollout_idx}")
+                for group in groups
+            ])
+            for group, group_results in zip(groups, exec_results):
+                self._apply_fork_observations(group, group_results)
+            self._check_fork_loops(instance_id, active)
+            await asyncio.to_thread(self._checkpoint_forks, instance_id, active, round_num + 1, len(messages))
+
+        return await asyncio.to_thread(self._finish_forks, instance_id, forks)
+
+    async def _cast_vote_async(self, item, log, rollout_key):
+        """Async counterpart of _cast_vote"""
+        answer = self._vote_answer(log)
+        if answer is None:
+            return None
+        exec_result = None
+        if self.early_stop.mode == "result":
+            async with self.tool_semaphore:
+                exec_results = await self.message_processor.execute_tool_calls_async(
+                    [self._answer_call(answer, log.messages)], self.tool_client, rollout_key
+                )
+            exec_result = exec_results[0]
+        return self._record_vote(item["instance_id"], answer, exec_result)
+
+    async def _execute_pending_limited(self, tool_calls, messages, rollout_key):
+        async with self.tool_semaphore:
+            return await self.message_processor.execute_pending_async(tool_calls, messages, self.tool_client,
+                                                                      rollout_key)
+
+    async def _execute_tasks_async(self, tasks_to_process):
+        self._setup_event_loop_resources()
+        completed_count = 0
+        try:
+            if self.fork_rollouts:
+                futures = [
+                    asyncio.ensure_future(self.process_rollout_group_async(item, rollout_indices))
+                    for item, rollout_indices in self._group_tasks(tasks_to_process)
+                ]
+            else:
+                futures = [
+                    asyncio.ensure_future(self.process_single_item_async(item, rollout_idx))
+                    for item, rollout_idx in tasks_to_process
+                ]
+            for future in asyncio.as_completed(futures):
+                try:
+                    result = await future
+                    if result is not None:
+                        completed_count += len(result) if isinstance(result, list) else 1
+                        print(f"Progress: {completed_count}/{len(tasks_to_process)} completed")
+                except Exception as e:
+                    print(f"Unexpected error processing rollout: {str(e)}")
+        finally:
+            await self._close_event_loop_resources()
+        return completed_count
+
+    def _execute_tasks(self, tasks_to_process):
+        """Run all (item, rollout_idx) tasks concurrently on one event loop"""
+        return asyncio.run(self._execute_tasks_async(tasks_to_process))
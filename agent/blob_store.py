@@ -0,0 +1,169 @@
+import hashlib
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+BLOB_FILE = "blobs.bin"
+BLOB_REF = "$blob"
+# Record header: codec byte, 20-byte SHA-1 of the text, 4-byte big-endian payload length
+_HEADER = struct.Struct(">c20sI")
+_ZSTD = b"z"
+_ZLIB = b"d"
+# Decompressed texts kept for repeated reads (the same system prompt or schema across results), in characters
+CACHE_CHARS = 64 * 1024 * 1024
+
+
+class BlobStore:
+    """Content-addressed store for large strings in <output_folder>/blobs.bin.
+
+    Each distinct text is stored once, compressed (zstd when the
+    `zstandard` package is installed, zlib otherwise), and referred to from
+    results as {"$blob": "<sha1>"}. The file is append-only; a record torn
+    by a crash is ignored when the file is scanned. Texts read back are kept
+    in an LRU cache of at most `cache_chars` characters.
+    """
+
+    def __init__(self, output_folder: str, cache_chars: int = CACHE_CHARS):
+        self.path = os.path.join(output_folder, BLOB_FILE)
+        self.cache_chars = cache_chars
+        self._locations = {}
+        self._cache = OrderedDict()
+        self._cached_chars = 0
+        self._valid_size = 0
+        self._file = None
+        self._reader = None
+        self._lock = threading.Lock()
+        self._compressor = zstandard.ZstdCompressor(level=3) if zstandard else None
+        self._scan()
+
+    def _scan(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            offset = 0
+            while True:
+                header = f.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    break
+                codec, digest, length = _HEADER.unpack(header)
+                if len(f.read(length)) < length:
+                    break
+                self._locations[digest.hex()] = (codec, offset + _HEADER.size, length)
+                offset += _HEADER.size + length
+        self._valid_size = offset
+
+    def _compress(self, data: bytes):
+        if self._compressor is not None:
+            return _ZSTD, self._compressor.compress(data)
+        return _ZLIB, zlib.compress(data, 6)
+
+    def put(self, text: str) -> str:
+        """Store a text (if new) and return its id"""
+        data = text.encode("utf-8")
+        digest = hashlib.sha1(data).digest()
+        blob_id = digest.hex()
+        with self._lock:
+            if blob_id in self._locations:
+                return blob_id
+            codec, payload = self._compress(data)
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                self._file = open(self.path, "ab")
+                if self._file.tell() != self._valid_size:
+                    # Drop a torn trailing record so new records stay readable
+                    self._file.truncate(self._valid_size)
+                    self._file.seek(self._valid_size)
+            offset = self._file.tell()
+            self._file.write(_HEADER.pack(codec, digest, len(payload)) + payload)
+            self._locations[blob_id] = (codec, offset + _HEADER.size, len(payload))
+        return blob_id
+
+    def get(self, blob_id: str) -> str:
+        with self._lock:
+            if blob_id in self._cache:
+                self._cache.move_to_end(blob_id)
+                return self._cache[blob_id]
+            location = self._locations.get(blob_id)
+        if location is None:
+            raise KeyError(f"Blob {blob_id} not found in {self.path}")
+        codec, offset, length = location
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+            if self._reader is None:
+                self._reader = open(self.path, "rb")
+            self._reader.seek(offset)
+            payload = self._reader.read(length)
+        if codec == _ZSTD:
+            if zstandard is None:
+                raise RuntimeError(f"Blob {blob_id} is zstd-compressed; install the zstandard package to read it")
+            text = zstandard.ZstdDecompressor().decompress(payload).decode("utf-8")
+        else:
+            text = zlib.decompress(payload).decode("utf-8")
+        with self._lock:
+            if blob_id not in self._cache and len(text) <= self.cache_chars:
+                self._cache[blob_id] = text
+                self._cached_chars += len(text)
+                while self._cached_chars > self.cache_chars:
+                    _, evicted = self._cache.popitem(last=False)
+                    self._cached_chars -= len(evicted)
+        return text
+
+    def flush(self, fsync: bool = False):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+                if fsync:
+                    os.fsync(self._file.fileno())
+
+    def close(self):
+        self.flush(fsync=True)
+        with self._lock:
+            for handle in (self._file, self._reader):
+                if handle is not None:
+                    handle.close()
+            self._file = None
+            self._reader = None
+
+
+def pack_result(result: Dict[str, Any], blobs: BlobStore, min_chars: int) -> Dict[str, Any]:
+    """Copy of a result with message contents of at least `min_chars` characters moved to the blob store.
+
+    conversation and final_messages repeat the same system prompt, schema and
+    observations, so they end up referring to the same blobs.
+    """
+    packed = dict(result)
+    for field in ("conversation", "final_messages"):
+        if isinstance(result.get(field), list):
+            packed[field] = [_pack_message(message, blobs, min_chars) for message in result[field]]
+    return packed
+
+
+def _pack_message(message: Any, blobs: BlobStore, min_chars: int) -> Any:
+    if not isinstance(message, dict):
+        return message
+    content = message.get("content")
+    if isinstance(content, str) and len(content) >= min_chars:
+        return {**message, "content": {BLOB_REF: blobs.put(content)}}
+    return message
+
+
+def unpack(value: Any, blobs: Optional[BlobStore]) -> Any:
+    """Replace every {"$blob": id} reference with the stored text"""
+    if isinstance(value, dict):
+        if len(value) == 1 and BLOB_REF in value:
+            if blobs is None:
+                raise KeyError(f"Blob {value[BLOB_REF]} referenced but no {BLOB_FILE} found")
+            return blobs.get(value[BLOB_REF])
+        return {key: unpack(item, blobs) for key, item in value.items()}
+    if isinstance(value, list):
+        return [unpack(item, blobs) for item in value]
+    return value
@@ -0,0 +1,155 @@
+import json
+import os
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from round_log import RoundLog
+
+CHECKPOINT_FILE = "checkpoints.jsonl"
+
+
+def _encode_state(state: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Context/loop state as JSON: sets become sorted lists, Counters plain dicts"""
+    if state is None:
+        return None
+    return {key: sorted(value) if isinstance(value, set) else dict(value) if isinstance(value, Counter) else value
+            for key, value in state.items()}
+
+
+def _decode_state(encoded: Optional[Dict[str, Any]], template: Dict[str, Any]) -> Dict[str, Any]:
+    state = dict(template)
+    for key, value in (encoded or {}).items():
+        if isinstance(template.get(key), set):
+            value = set(value)
+        elif isinstance(template.get(key), Counter):
+            value = Counter(value)
+        state[key] = value
+    return state
+
+
+class RolloutCheckpoint:
+    """A rollout restored from checkpoints: the log entries appended after its initial prompt, and the round reached"""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.rounds = 0
+        self.entries = []
+        self.context_state = None
+        self.loop_state = None
+
+    def restore(self, initial_messages: List[Dict[str, Any]], context_template: Dict[str, Any],
+                loop_template: Dict[str, Any]):
+        """(RoundLog, loop_state) to continue the rollout with"""
+        log = RoundLog(initial_messages, _decode_state(self.context_state, context_template))
+        log.extend(self.entries)
+        return log, _decode_state(self.loop_state, loop_template)
+
+
+class CheckpointStore:
+    """Per-round checkpoints of in-flight rollouts in <output_folder>/checkpoints.jsonl.
+
+    After every round a rollout appends one line holding only the RoundLog
+    entries added since its previous checkpoint, plus its
+    small context/loop state, so checkpointing never rewrites a
+    conversation. A saved result appends a `done` line. load() replays the
+    file into the unfinished rollouts and rewrites it with just those;
+    those the run then doesn't schedule are discarded with a `done` line.
+    Lines are flushed, not fsynced: this protects against the process dying,
+    which is what loses paid rounds.
+    """
+
+    def __init__(self, output_folder: str, enabled: bool = True):
+        self.enabled = enabled
+        self.path = os.path.join(output_folder, CHECKPOINT_FILE)
+        self._written = {}
+        self._file = None
+        self._lock = threading.Lock()
+
+    def load(self) -> Dict[str, RolloutCheckpoint]:
+        """Unfinished rollouts by rollout key ("<instance_id>#<rollout_idx>"); compacts the file"""
+        if not self.enabled or not os.path.exists(self.path):
+            return {}
+        checkpoints = {}
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                key = record.get("key")
+                if record.get("done"):
+                    checkpoints.pop(key, None)
+                    continue
+                checkpoint = checkpoints.setdefault(key, RolloutCheckpoint(key))
+                if record.get("offset") != len(checkpoint.entries):
+                    # A delta that doesn't continue the previous one (e.g. a torn write before it): restart the rollout
+                    checkpoints.pop(key)
+                    continue
+                checkpoint.entries.extend(record["entries"])
+                checkpoint.rounds = record["round"]
+                checkpoint.context_state = record.get("context_state")
+                checkpoint.loop_state = record.get("loop_state")
+
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for checkpoint in checkpoints.values():
+                f.write(json.dumps({"key": checkpoint.key, "round": checkpoint.rounds, "offset": 0,
+                                    "entries": checkpoint.entries,
+                                    "context_state": checkpoint.context_state,
+                                    "loop_state": checkpoint.loop_state}, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.path)
+        return checkpoints
+
+    def resume(self, key: str, checkpoint: RolloutCheckpoint, initial_count: int):
+        """Continue appending deltas for a rollout restored from `checkpoint`"""
+        with self._lock:
+            self._written[key] = (initial_count + len(checkpoint.entries), initial_count)
+
+    def save_round(self, key: str, round_num: int, log: RoundLog, loop_state: Dict[str, Any] = None,
+                   initial_count: int = 0):
+        """Append what `key` added since its last checkpoint; `initial_count` leading messages are the rebuilt prompt"""
+        if not self.enabled:
+            return
+        with self._lock:
+            sent, initial = self._written.get(key, (initial_count, initial_count))
+            record = {
+                "key": key,
+                "round": round_num,
+                "offset": sent - initial,
+                "entries": log.entries(sent),
+                "context_state": _encode_state(log.context_state),
+                "loop_state": _encode_state(loop_state),
+            }
+            self._append(record)
+            self._written[key] = (len(log), initial)
+
+    def finish(self, key: str):
+        """The rollout's result is saved; its checkpoints are obsolete"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._written.pop(key, None) is not None:
+                self._append({"key": key, "done": True})
+
+    def discard(self, keys):
+        """Rollouts that won't be resumed (their instance was completed or decided without them)"""
+        if not self.enabled:
+            return
+        with self._lock:
+            for key in keys:
+                self._written.pop(key, None)
+                self._append({"key": key, "done": True})
+
+    def _append(self, record: Dict[str, Any]):
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._file = open(self.path, "ab")
+        self._file.write((json.dumps(record, ensure_ascii=False, default=str) + "\n").encode("utf-8"))
+        self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
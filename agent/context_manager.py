@@ -0,0 +1,128 @@
+import threading
+from typing import Any, Dict, List
+
+RECALL_TOOL = "recall_observation"
+OBSERVATION_PREFIX = "EXECUTION RESULT of"
+
+
+def estimate_tokens(text: str) -> float:
+    return len(text or "") / 4.0
+
+
+def is_observation(message: Dict[str, Any]) -> bool:
+    """Tool results: `tool` messages (native protocol) or user messages carrying an execution result (text protocol)"""
+    if message.get("role") == "tool":
+        return True
+    content = message.get("content")
+    return message.get("role") == "user" and isinstance(content, str) and content.startswith(OBSERVATION_PREFIX)
+
+
+def observation_body(content: str) -> str:
+    """Tool output without the "EXECUTION RESULT of [tool]:" header"""
+    content = content or ""
+    if content.startswith(OBSERVATION_PREFIX):
+        content = content.split("\n", 1)[1] if "\n" in content else ""
+    return content.strip()
+
+
+def is_error_observation(content: str) -> bool:
+    """Observations reporting a failed call (tool errors, API errors) rather than output"""
+    body = observation_body(content)
+    first_line = body.split("\n", 1)[0].lower()
+    return (body.startswith("{'error'") or first_line.startswith(("error", "database error", "failed to execute"))
+            or first_line == "command execution failed")
+
+
+class ContextManager:
+    """Keeps the prompt sent to the LLM under a token budget by eliding old tool observations.
+
+    The full `messages` list is never modified; view() returns a copy in which
+    observations older than the last `keep_rounds` rounds are replaced by a
+    short stub pointing at recall_observation. Elision only moves forward
+    (a per-rollout watermark) and, once over budget, trims down to
+    `low_water` of the budget at once, so the elided prefix stays
+    byte-identical across many calls and provider prompt caching keeps
+    hitting. The system prompt and initial user message are never touched.
+    """
+
+    def __init__(self, budget_tokens: int, keep_rounds: int = 3, stub_chars: int = 200, low_water: float = 0.75):
+        self.budget_tokens = budget_tokens
+        self.keep_rounds = keep_rounds
+        self.stub_chars = stub_chars
+        self.low_water = low_water
+        self.stats = {"views": 0, "elided": 0, "tokens_elided": 0.0}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.budget_tokens > 0
+
+    def new_state(self) -> Dict[str, Any]:
+        """Per-rollout state: indices of elided observations in `messages`"""
+        return {"elided": set()}
+
+    def stub(self, index: int, content: str) -> str:
+        head = content[:self.stub_chars].rstrip()
+        ellipsis = "..." if len(content) > self.stub_chars else ""
+        return (f"{head}{ellipsis}\n[Observation {index} elided to save context ({len(content)} chars). "
+                f"Call {RECALL_TOOL} with id={index} to see it in full.]")
+
+    def _eligible(self, messages: List[Dict[str, Any]]) -> List[int]:
+        """Observation indices outside the stable prefix and older than the last keep_rounds rounds"""
+        assistant_indices = [i for i, m in enumerate(messages) if m.get("role") == "assistant"]
+        if len(assistant_indices) <= self.keep_rounds:
+            return []
+        first_round = assistant_indices[0]
+        cutoff = assistant_indices[-self.keep_rounds] if self.keep_rounds > 0 else len(messages)
+        return [i for i in range(first_round, cutoff) if is_observation(messages[i])]
+
+    def view(self, messages: List[Dict[str, Any]], state: Dict[str, Any]) -> List[Dict[str, Any]]:
+        if not self.enabled:
+            return messages
+        elided = state["elided"]
+        newly_elided = 0
+        tokens_elided = 0.0
+
+        total = sum(estimate_tokens(m.get("content")) for m in messages)
+        total -= sum(estimate_tokens(messages[i]["content"]) - estimate_tokens(self.stub(i, messages[i]["content"]))
+                     for i in elided)
+        if total > self.budget_tokens:
+            target = self.budget_tokens * self.low_water
+            for i in self._eligible(messages):
+                if total <= target:
+                    break
+                if i in elided:
+                    continue
+                saved = estimate_tokens(messages[i]["content"]) - estimate_tokens(self.stub(i, messages[i]["content"]))
+                if saved <= 0:
+                    continue
+                elided.add(i)
+                total -= saved
+                newly_elided += 1
+                tokens_elided += saved
+
+        with self._lock:
+            self.stats["views"] += 1
+            self.stats["elided"] += newly_elided
+            self.stats["tokens_elided"] += tokens_elided
+
+        if not elided:
+            return messages
+        return [{**m, "content": self.stub(i, m["content"])} if i in elided else m for i, m in enumerate(messages)]
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, "tokens_elided": int(self.stats["tokens_elided"])}
+
+
+def recall_observation(messages: List[Dict[str, Any]], arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """Answer a recall_observation call from the full history, without a tool-server round trip"""
+    try:
+        index = int(arguments.get("id"))
+    except (TypeError, ValueError):
+        index = -1
+    if 0 <= index < len(messages) and is_observation(messages[index]):
+        content = messages[index]["content"]
+    else:
+        content = f"No observation with id={arguments.get('id')}"
+    return {"content": f"{OBSERVATION_PREFIX} [{RECALL_TOOL}]:\n{content}"}
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional
+
+from context_manager import observation_body, is_error_observation
+
+VOTE_MODES = ("sql", "result")
+# Quoted literals and identifiers keep their case and spacing; everything else is normalized
+_QUOTED = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|`[^`]*`)")
+_LINE_COMMENT = re.compile(r"--[^\n]*")
+_BLOCK_COMMENT = re.compile(r"/\*.*?\*/", re.DOTALL)
+
+
+def normalize_sql(sql: str) -> str:
+    """Comparable form of a SQL answer: comments, case, whitespace and trailing semicolons don't count"""
+    parts = _QUOTED.split(sql or "")
+    for i in range(0, len(parts), 2):
+        text = _BLOCK_COMMENT.sub(" ", _LINE_COMMENT.sub(" ", parts[i]))
+        text = re.sub(r"\s+", " ", text.lower())
+        parts[i] = re.sub(r"\s*([(),=<>+*/-])\s*", r"\1", text)
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+def terminate_answer(conversation: List[Dict[str, Any]]) -> Optional[str]:
+    """The answer argument of the terminate call that ended a conversation, if any"""
+    if not conversation:
+        return None
+    for tool_call in conversation[-1].get("tool_calls") or []:
+        if tool_call.get("name") == "terminate":
+            arguments = tool_call.get("arguments") or {}
+            if isinstance(arguments, str):
+                try:
+                    arguments = json.loads(arguments)
+                except ValueError:
+                    return None
+            answer = arguments.get("answer")
+            return answer if isinstance(answer, str) and answer.strip() else None
+    return None
+
+
+def result_fingerprint(observation: str) -> Optional[str]:
+    """Digest of an execution result, insensitive to row order; None when the query failed"""
+    body = observation_body(observation)
+    if not body or is_error_observation(observation):
+        return None
+    rows = body.split("\n")
+    digest = hashlib.sha1(rows[0].encode("utf-8"))
+    for row in sorted(rows[1:]):
+        digest.update(b"\n" + row.encode("utf-8"))
+    return "result:" + digest.hexdigest()
+
+
+def vote_key(answer: str, fingerprint: Optional[str] = None) -> str:
+    """What rollouts agree on: the result fingerprint when the answer was executed, else the normalized SQL"""
+    return fingerprint or "sql:" + normalize_sql(answer)
+
+
+class EarlyStopCoordinator:
+    """Instance-level vote over the answers of terminated rollouts.
+
+    Once `quorum` rollouts of an instance agree, the instance is decided and
+    its remaining rollouts are cancelled at their next round boundary (or
+    never started), since further samples can't change the majority answer.
+    Shared by every rollout; all methods are thread-safe and non-blocking.
+    """
+
+    def __init__(self, quorum: int, mode: str = "sql"):
+        self.quorum = quorum
+        self.mode = mode
+        self.votes = defaultdict(Counter)
+        self.decisions = {}
+        self.stats = Counter()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.quorum > 0
+
+    def seed(self, results: List[Dict[str, Any]]):
+        """Count the votes of terminated results saved by an earlier run"""
+        for result in results:
+            if result.get("terminated"):
+                key = result.get("vote") or self._answer_key(result.get("conversation"))
+                if key:
+                    self.vote(result["instance_id"], key, count_stats=False)
+
+    @staticmethod
+    def _answer_key(conversation) -> Optional[str]:
+        answer = terminate_answer(conversation)
+        return vote_key(answer) if answer else None
+
+    def vote(self, instance_id: str, key: str, count_stats: bool = True) -> bool:
+        """Record a terminated rollout's answer; returns True if it decides the instance"""
+        with self._lock:
+            if count_stats:
+                self.stats["votes"] += 1
+            if instance_id in self.decisions:
+                return False
+            self.votes[instance_id][key] += 1
+            if self.votes[instance_id][key] < self.quorum:
+                return False
+            self.decisions[instance_id] = key
+            if count_stats:
+                self.stats["decided"] += 1
+            return True
+
+    def decided(self, instance_id: str) -> bool:
+        if not self.enabled:
+            return False
+        with self._lock:
+            return instance_id in self.decisions
+
+    def record(self, outcome: str, count: int = 1):
+        """Count rollouts stopped by a decision: "cancelled" mid-run or "skipped" before starting"""
+        with self._lock:
+            self.stats[outcome] += count
+
+    def summary(self) -> Dict[str, int]:
+        with self._lock:
+            return {"votes": 0, "decided": 0, "cancelled": 0, "skipped": 0, **self.stats}
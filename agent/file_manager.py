@@ -1,14 +1,219 @@
 import json
 import os
+import queue
 import threading
 import glob
 from collections import defaultdict
 
+from result_index import ResultIndex, read_index_summaries, summarize_result
+from blob_store import BLOB_FILE, BlobStore, pack_result, unpack
+
+RESULTS_FILE = "results.jsonl"
+
+
+class JsonlResultStore:
+    """Append-only results log: one JSON line per rollout result in <output_folder>/results.jsonl.
+
+    Each result is written with a single append and flushed, so a crash can
+    tear at most the last line (skipped when reading). fsync is batched over
+    `fsync_every` results and always done on close(). Written results are
+    recorded in the completion index (if given) with their byte offsets.
+    With `blob_min_chars`, message contents at least that long are stored
+    once in the blob store and referenced from the line.
+    """
+
+    def __init__(self, output_folder, fsync_every=32, index=None, blob_min_chars=0):
+        os.makedirs(output_folder, exist_ok=True)
+        self.path = os.path.join(output_folder, RESULTS_FILE)
+        self.fsync_every = max(fsync_every, 1)
+        self.index = index
+        self.blob_min_chars = blob_min_chars
+        self.blobs = BlobStore(output_folder) if blob_min_chars > 0 else None
+        self._file = open(self.path, "ab")
+        if self._file.tell() and not self._ends_with_newline():
+            # Line torn by a crash: terminate it so the next result starts on a line of its own
+            self._file.write(b"\n")
+        self._unsynced = 0
+        self._lock = threading.Lock()
+
+    def _ends_with_newline(self):
+        with open(self.path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    @staticmethod
+    def encode(result):
+        return (json.dumps(result, ensure_ascii=False) + "\n").encode("utf-8")
+
+    def write(self, results):
+        if self.blobs is not None:
+            lines = [self.encode(pack_result(result, self.blobs, self.blob_min_chars)) for result in results]
+        else:
+            lines = [self.encode(result) for result in results]
+        with self._lock:
+            fsync = self._unsynced + len(lines) >= self.fsync_every
+            if self.blobs is not None:
+                # Blobs reach the disk before the lines referring to them
+                self.blobs.flush(fsync)
+            offset = self._file.tell()
+            self._file.write(b"".join(lines))
+            self._file.flush()
+            self._unsynced += len(lines)
+            if fsync:
+                os.fsync(self._file.fileno())
+                self._unsynced = 0
+            if self.index is not None:
+                entries = []
+                for line, result in zip(lines, results):
+                    entries.append((offset, result))
+                    offset += len(line)
+                self.index.record_appended(entries, offset, os.fstat(self._file.fileno()).st_ino)
+
+    def append(self, result):
+        self.write([result])
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            if self.blobs is not None:
+                self.blobs.close()
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+
+
+class BackgroundResultWriter:
+    """Moves result serialization and writes off the rollout threads; queued results are written in batches"""
+
+    _STOP = object()
+
+    def __init__(self, store):
+        self.store = store
+        self._queue = queue.Queue()
+        # First write failure and how many results were lost; raised again by close()
+        self.error = None
+        self.failed = 0
+        self._thread = threading.Thread(target=self._run, name="result-writer", daemon=True)
+        self._thread.start()
+
+    def append(self, result):
+        self._queue.put(result)
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if batch[-1] is self._STOP:
+                batch.pop()
+                stopping = True
+            if batch:
+                try:
+                    self.store.write(batch)
+                except Exception as e:
+                    print(f"Error writing {len(batch)} results to {self.store.path}: {e}")
+                    self.failed += len(batch)
+                    if self.error is None:
+                        self.error = e
+
+    def close(self):
+        """Write what is still queued and close the store; raises if any result could not be written"""
+        self._queue.put(self._STOP)
+        self._thread.join()
+        self.store.close()
+        if self.error is not None:
+            raise OSError(f"{self.failed} results could not be written to {self.store.path}") from self.error
+
+
+def read_results_log(output_folder):
+    """Results from results.jsonl, in write order and with blob references rehydrated; a torn last line is skipped"""
+    path = os.path.join(output_folder, RESULTS_FILE)
+    if not os.path.exists(path):
+        return []
+    blobs = BlobStore(output_folder) if os.path.exists(os.path.join(output_folder, BLOB_FILE)) else None
+    results = []
+    with open(path, "rb") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                results.append(unpack(json.loads(line), blobs))
+            except (ValueError, KeyError) as e:
+                print(f"Skipping unreadable line {line_number} of {path}: {e}")
+    if blobs is not None:
+        blobs.close()
+    return results
+
+
+def load_results_by_instance(output_folder):
+    """{instance_id: [result, ...]} from per-instance JSON files and results.jsonl"""
+    by_instance = defaultdict(list)
+    for file_path in sorted(glob.glob(os.path.join(output_folder, "*.json"))):
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"Error loading {file_path}: {e}")
+            continue
+        for result in data if isinstance(data, list) else [data]:
+            if isinstance(result, dict) and "instance_id" in result:
+                by_instance[result["instance_id"]].append(result)
+    for result in read_results_log(output_folder):
+        if isinstance(result, dict) and "instance_id" in result:
+            by_instance[result["instance_id"]].append(result)
+    return by_instance
+
+
+def read_result_summaries(output_folder):
+    """Result summaries of another run's output folder, which is never written to: from its completion
+    index, opened read-only, or parsed from its result files when the index is missing or too old"""
+    if not os.path.isdir(output_folder):
+        return []
+    summaries = read_index_summaries(output_folder)
+    if summaries is not None:
+        return summaries
+    return [summarize_result(result) for results in load_results_by_instance(output_folder).values()
+            for result in results]
+
+
+def compact_results(output_folder, dest_folder=None):
+    """Write results.jsonl (and any existing per-instance files) out as one <instance_id>.json per instance.
+
+    Compacting in place removes results.jsonl and blobs.bin once every
+    instance file is written, so results aren't counted twice on resume.
+    Don't run it while an agent is still writing to the folder.
+    """
+    dest_folder = dest_folder or output_folder
+    os.makedirs(dest_folder, exist_ok=True)
+    by_instance = load_results_by_instance(output_folder)
+    for instance_id, results in by_instance.items():
+        file_path = os.path.join(dest_folder, f"{instance_id}.json")
+        tmp_path = file_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, file_path)
+    if os.path.abspath(dest_folder) == os.path.abspath(output_folder):
+        for file_name in (RESULTS_FILE, BLOB_FILE):
+            if os.path.exists(os.path.join(output_folder, file_name)):
+                os.remove(os.path.join(output_folder, file_name))
+    return by_instance
+
+
 class FileManager:
     def __init__(self, args):
         self.args = args
         self.file_locks = defaultdict(threading.Lock)
         self.processed_instances = defaultdict(int)
+        self.count_lock = threading.Lock()
+        # jsonl: constant-cost appends to results.jsonl; json: rewrite <instance_id>.json per result
+        self.result_store = getattr(args, 'result_store', 'jsonl')
+        self.writer = None
+        self.index = None
         
     def check_if_terminated(self, result):
         """Check if a result has successfully executed to termination"""
@@ -44,47 +249,68 @@ class FileManager:
         except Exception as e:
             print(f"Error saving to {file_path}: {e}")
     
+    def _get_index(self):
+        with self.count_lock:
+            if self.index is None:
+                self.index = ResultIndex(self.args.output_folder, RESULTS_FILE)
+            return self.index
+    
+    def _get_writer(self):
+        index = self._get_index()
+        with self.count_lock:
+            if self.writer is None:
+                store = JsonlResultStore(self.args.output_folder, getattr(self.args, 'fsync_every', 32), index,
+                                         getattr(self.args, 'blob_min_chars', 0))
+                use_thread = getattr(self.args, 'result_writer_thread', False)
+                self.writer = BackgroundResultWriter(store) if use_thread else store
+            return self.writer
+    
     def add_single_result(self, result):
         """Add a single result to the appropriate instance file"""
         instance_id = result["instance_id"]
         
+        if self.result_store == "jsonl":
+            self._get_writer().append(result)
+            if self.check_if_terminated(result):
+                with self.count_lock:
+                    self.processed_instances[instance_id] += 1
+            return
+            
         with self.file_locks[instance_id]:
             existing_results = self.load_instance_results(instance_id)
             existing_results.append(result)
             self.save_instance_results(instance_id, existing_results)
+            self._get_index().record_file(os.path.basename(self.get_instance_file_path(instance_id)),
+                                          existing_results)
             
             if self.check_if_terminated(result):
                 self.processed_instances[instance_id] += 1
         
-    def load_existing_results(self):
-        """Load existing results from all instance files"""
+    def close(self):
+        """Flush and fsync buffered results (jsonl store) and close the completion index"""
+        writer, self.writer = self.writer, None
+        try:
+            if writer is not None:
+                writer.close()
+        finally:
+            if self.index is not None:
+                self.index.close()
+                self.index = None
+            
+    def load_existing_results(self, rebuild_index=False):
+        """Summaries (instance_id, rollout_idx, terminated, cancelled, vote, rounds) of the saved results, from the
+        completion index; only results the index hasn't seen yet are parsed"""
         if not os.path.exists(self.args.output_folder):
             print("Output folder does not exist, starting fresh")
             return []
             
-        all_results = []
-        instance_files = glob.glob(os.path.join(self.args.output_folder, "*.json"))
-        
-        for file_path in instance_files:
-            try:
-                filename = os.path.basename(file_path)
-                instance_id = filename.replace('.json', '')
-                
-                instance_results = self.load_instance_results(instance_id)
-                terminated_count = 0
-                
-                for result in instance_results:
-                    if isinstance(result, dict) and "instance_id" in result:
-                        all_results.append(result)
-                        if self.check_if_terminated(result):
-                            terminated_count += 1
-                
-                self.processed_instances[instance_id] = terminated_count
-                        
-            except Exception as e:
-                print(f"Error processing {file_path}: {e}")
-                continue
-        
+        index = self._get_index()
+        parsed = index.rebuild() if rebuild_index else index.sync()
+        if parsed:
+            print(f"Indexed {parsed} results not yet in {index.path}")
+        self.processed_instances.update(index.terminated_counts())
+        all_results = index.summaries()
+            
         total_valid = sum(self.processed_instances.values())
         print(f"Found {total_valid} valid (terminated) results for {len(self.processed_instances)} unique instances")
-        return all_results
\ No newline at end of file
+        return all_results
@@ -1,12 +1,12 @@
-import random
 import json
+import contextvars
 import os
 import time
 import logging
+import threading
 from datetime import datetime
-from collections import defaultdict
+from collections import Counter, defaultdict
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from copy import deepcopy
 from typing import Dict, Any, List
 
 from dotenv import load_dotenv
@@ -16,8 +16,23 @@ from openai import OpenAI
 from openai.types.chat import ChatCompletionMessage
 from openai.types.chat.chat_completion import Choice
 
-from file_manager import FileManager
-from message_processor import MessageProcessor
+from file_manager import FileManager, read_result_summaries
+from message_processor import MessageProcessor, TOOL_CALL_CLOSE, close_stopped_tool_call
+from tracing import tracer, summarize, format_summary
+from rate_limiter import LLMRateLimiter
+from tool_schemas import (parse_xml_tool_schemas, default_tool_schemas, native_system_prompt, recall_tool_schema,
+                          search_schema_tool_schema, with_search_schema_tool, with_recall_tool, SEARCH_SCHEMA_TOOL)
+from context_manager import ContextManager
+from rollout_fork import Fork, cluster_forks, share_context_state
+from prompt_cache import LayeredText, PromptCacheStats, apply_cache_hints, prefix_key
+from early_stop import EarlyStopCoordinator, terminate_answer, result_fingerprint, vote_key
+from loop_detector import LoopDetector
+from checkpoint import CheckpointStore
+from round_log import RoundLog
+from prompt_assets import PromptAssetCache
+from schema_index import SchemaPruner, set_index_dir as set_schema_index_dir
+from prefetcher import InstancePrefetcher
+from task_order import order_items, expected_rounds, round_history, interleave_rollouts
 
 # Configure logging - 禁用 httpx 和其他库的 INFO 日志
 logging.basicConfig(level=logging.WARNING)
@@ -41,23 +56,35 @@ class UniversalAgentPromptBuilder:
     """Universal prompt builder that works with any database type"""
     
     def __init__(self, system_prompt_path: str, databases_path: str = None, 
-                 documents_path: str = None, database_type: str = "mysql"):
+                 documents_path: str = None, database_type: str = "mysql", assets: PromptAssetCache = None,
+                 schema_pruner: SchemaPruner = None, schema_search: bool = False, context_recall: bool = False):
         self.system_prompt_path = system_prompt_path
         self.databases_path = databases_path
         self.documents_path = documents_path
         self.database_type = database_type
+        # Schema and knowledge files are read through the shared cache instead of from disk per instance
+        self.assets = assets or PromptAssetCache()
+        # With --schema_top_k, only the tables most relevant to the instruction go into the prompt
+        self.schema_pruner = schema_pruner
         
         # Load system prompt
         self.system_prompt = self._load_system_prompt()
+        if schema_search:
+            self.system_prompt = with_search_schema_tool(self.system_prompt)
+        # With context compaction, elided observations point the model at recall_observation
+        if context_recall:
+            self.system_prompt = with_recall_tool(self.system_prompt)
     
     def _load_system_prompt(self) -> str:
         """Load system prompt from file"""
         try:
-            with open(self.system_prompt_path, 'r', encoding='utf-8') as f:
-                return f.read().strip()
+            system_prompt = self.assets.read_text(self.system_prompt_path)
+            if system_prompt is not None:
+                return system_prompt
+            logger.warning(f"Could not load system prompt: {self.system_prompt_path} not found")
         except Exception as e:
             logger.warning(f"Could not load system prompt: {e}")
-            return "You are a helpful AI assistant with access to database and system tools."
+        return "You are a helpful AI assistant with access to database and system tools."
     
     def _load_external_knowledge(self, instance: Dict[str, Any]) -> str:
         """Load external knowledge if available"""
@@ -66,24 +93,26 @@ class UniversalAgentPromptBuilder:
         
         try:
             knowledge_file = os.path.join(self.documents_path, instance["external_knowledge"])
-            if os.path.exists(knowledge_file):
-                with open(knowledge_file, 'r', encoding='utf-8') as f:
-                    return f.read().strip()
+            knowledge = self.assets.read_text(knowledge_file)
+            if knowledge is not None:
+                return knowledge
         except Exception as e:
             logger.warning(f"Could not load external knowledge: {e}")
         
         return ""
     
-    def _load_database_info(self, db_id: str) -> str:
-        """Load database schema information"""
+    def _load_database_info(self, db_id: str, instruction: str = None) -> str:
+        """Load database schema information (pruned to the tables relevant to `instruction` if enabled)"""
         if not self.databases_path or not db_id or db_id == "GENERAL":
             return f"Connected to {self.database_type} database. Use execute_database_sql to query."
         
         try:
             db_file = os.path.join(self.databases_path, db_id, "database_description", "schema.sql")
-            if os.path.exists(db_file):
-                with open(db_file, 'r', encoding='utf-8') as f:
-                    return f.read().strip()
+            db_info = self.assets.read_text(db_file)
+            if db_info is not None:
+                if self.schema_pruner is not None and self.schema_pruner.enabled:
+                    return self.schema_pruner.prune(db_file, db_info, instruction)
+                return db_info
         except Exception as e:
             logger.warning(f"Could not load database info: {e}")
         
@@ -110,20 +139,21 @@ class UniversalAgentPromptBuilder:
         """Build initial prompt for the instance"""
         messages = []
         
-        # System message
-        system_content = self.system_prompt
+        # System message, layered from most to least shared so identical prefixes hit provider prompt caches:
+        # system prompt (all instances), database info (same db_id), external knowledge (same instance)
+        layers = [self.system_prompt]
         
         # Add database info
-        db_info = self._load_database_info(instance.get("db_id", ""))
+        db_info = self._load_database_info(instance.get("db_id", ""), instance.get("instruction", ""))
         if db_info:
-            system_content += f"\n\nDatabase Information:\n{db_info}"
+            layers.append(f"Database Information:\n{db_info}")
         
         # Add external knowledge
         external_knowledge = self._load_external_knowledge(instance)
         if external_knowledge:
-            system_content += f"\n\nExternal Knowledge:\n{external_knowledge}"
+            layers.append(f"External Knowledge:\n{external_knowledge}")
         
-        messages.append({"role": "system", "content": system_content})
+        messages.append({"role": "system", "content": LayeredText(layers)})
         
         # Add conversation history if in chat mode
         if conversation_history:
@@ -152,99 +182,124 @@ class LLMAgent:
         self.model_client = OpenAI(
             base_url=os.getenv("OPENAI_API_BASE"),
             api_key=os.getenv("OPENAI_API_KEY"),
+            # Retries are handled (and coordinated through the rate limiter) by call_llm
+            max_retries=0,
         )
         
+        # Shared by every rollout so 429s slow all of them down together instead of each backing off alone
+        self.rate_limiter = None
+        if getattr(args, 'llm_scheduler', 'aimd') == "aimd":
+            max_llm_concurrency = args.max_concurrent_llm if getattr(args, 'async_mode', False) else args.num_threads
+            self.rate_limiter = LLMRateLimiter(
+                max_concurrency=max_llm_concurrency,
+                rpm=getattr(args, 'rpm_limit', 0),
+                tpm=getattr(args, 'tpm_limit', 0)
+            )
+        
+        self.prompt_cache_stats = PromptCacheStats()
+        
         self.file_manager = FileManager(args)
         # Fix: MessageProcessor only takes args parameter
         self.message_processor = MessageProcessor(args)
         
+        # mtime-validated cache of the files prompts are built from, shared by the prompt builders
+        self.prompt_assets = PromptAssetCache(max_bytes=getattr(args, 'asset_cache_mb', 256) * 1024 * 1024)
+        if getattr(args, 'schema_index_dir', None):
+            set_schema_index_dir(args.schema_index_dir)
+        self.schema_pruner = SchemaPruner(top_k=getattr(args, 'schema_top_k', 0), assets=self.prompt_assets)
+        # Initial prompts built up front by --precompute_prompts or ahead of time by the prefetcher, by instance_id;
+        # an entry is dropped once the last pending rollout of its instance has taken it
+        self.initial_prompts = {}
+        self._prompt_uses = Counter()
+        self._prompts_lock = threading.Lock()
+        # random (default), db (grouped by database) or longest (longest expected first)
+        self.task_order = getattr(args, 'task_order', 'random')
+        # --prefetch_lookahead: prepares the next queued instances while earlier ones run (set up by run())
+        self.prefetcher = None
+        
         # Initialize prompt builder based on strategy
         if args.prompt_strategy == "universal-agent":
             self.prompt_builder = UniversalAgentPromptBuilder(
                 system_prompt_path=args.system_prompt_path,
                 databases_path=getattr(args, 'databases_path', None),
                 documents_path=getattr(args, 'documents_path', None),
-                database_type=getattr(args, 'database_type', 'mysql')
+                database_type=getattr(args, 'database_type', 'mysql'),
+                assets=self.prompt_assets,
+                schema_pruner=self.schema_pruner,
+                schema_search=getattr(args, 'schema_search', False),
+                context_recall=getattr(args, 'context_budget_tokens', 0) > 0
             )
         else:
             # Fallback to original spider-agent
             try:
                 from prompt_builders import get_prompt_builder
-                self.prompt_builder = get_prompt_builder(args.prompt_strategy)
+                self.prompt_builder = get_prompt_builder(args.prompt_strategy, args, self.prompt_assets)
             except ImportError:
                 # Use universal builder as fallback
                 self.prompt_builder = UniversalAgentPromptBuilder(
                     system_prompt_path=args.system_prompt_path,
                     databases_path=getattr(args, 'databases_path', None),
                     documents_path=getattr(args, 'documents_path', None),
-                    database_type=getattr(args, 'database_type', 'mysql')
+                    database_type=getattr(args, 'database_type', 'mysql'),
+                    assets=self.prompt_assets,
+                    schema_pruner=self.schema_pruner,
+                    schema_search=getattr(args, 'schema_search', False),
+                    context_recall=getattr(args, 'context_budget_tokens', 0) > 0
                 )
         
         self.processed_instances = defaultdict(int)
         
+        # Run all rollouts of an item together, sampling shared histories with one n=k request
+        self.fork_rollouts = getattr(args, 'fork_rollouts', False)
+        
+        # native: tools are sent as schemas and the model answers with structured (possibly parallel) tool calls
+        self.tool_protocol = getattr(args, 'tool_protocol', 'text')
+        self.tool_schemas = self._load_tool_schemas() if self.tool_protocol == "native" else None
+        
+        # Elides old tool observations from what is sent to the LLM once a rollout exceeds the token budget
+        self.context_manager = ContextManager(
+            budget_tokens=getattr(args, 'context_budget_tokens', 0),
+            keep_rounds=getattr(args, 'context_keep_rounds', 3),
+            stub_chars=getattr(args, 'context_stub_chars', 200)
+        )
+        if self.tool_schemas is not None and self.context_manager.enabled:
+            self.tool_schemas.append(recall_tool_schema())
+        
+        # Hints, forces a final answer or aborts when a rollout keeps repeating the same call or error
+        self.loop_detector = LoopDetector(
+            policy=getattr(args, 'loop_policy', 'none'),
+            threshold=getattr(args, 'loop_threshold', 3)
+        )
+        
+        # Per-round checkpoints of in-flight rollouts, so a restart continues them instead of starting over
+        self.checkpoints = CheckpointStore(args.output_folder, enabled=not getattr(args, 'disable_checkpoints', False))
+        self.resumable = {}
+        
+        # Cancels the remaining rollouts of an instance once --early_stop_quorum of them agree on the answer
+        self.early_stop = EarlyStopCoordinator(
+            quorum=getattr(args, 'early_stop_quorum', 0),
+            mode=getattr(args, 'early_stop_vote', 'sql')
+        )
+        
+        tracer.configure(getattr(args, 'trace_file', None))
+        
         logger.info(f"Initialized LLMAgent with model: {args.model}")
     
-    def call_llm(self, messages, instance_id=None, round_num=None, use_stream=True, debug=True):
-        """Call LLM with retry mechanism and optional streaming"""
+    def call_llm(self, messages, instance_id=None, round_num=None, use_stream=True, debug=True, n=1):
+        """Call LLM with retry mechanism and optional streaming; with n > 1 (non-streaming) returns a list of outputs"""
         max_retries = 500
         retry_count = 0
         
         while retry_count < max_retries:
+            estimate = self._acquire_llm_slot(messages)
             try:
-                if use_stream:
-                    # Streaming response with real-time printing
-                    response = self.model_client.chat.completions.create(
-                        model=self.args.model,
-                        messages=messages,
-                        temperature=self.args.temperature,
-                        top_p=self.args.top_p,
-                        max_tokens=self.args.max_new_tokens,
-                        stream=True,
-                    )
-
-                    full_message = ChatCompletionMessage(
-                        role="assistant",
-                        content=""
-                    )
-                    choice = Choice(
-                        index=0,
-                        message=full_message,
-                        finish_reason="stop"
-                    )
-                    first_token = True
-
-                    for chunk in response:
-                        if chunk.choices and chunk.choices[0].delta.content is not None:
-                            if first_token:
-                                debug_print(debug, "assistant :> ", end="")
-                                first_token = False
-                            full_message.content += chunk.choices[0].delta.content
-                            debug_print(debug, f"{chunk.choices[0].delta.content}", end="", include_timestamp=False)
-
-                        if chunk.choices and chunk.choices[0].finish_reason:
-                            choice.finish_reason = chunk.choices[0].finish_reason
-                            break
-                    
-                    # Print newline after streaming is complete
-                    if debug:
-                        print()
-                    
-                    content = full_message.content
-                else:
-                    # Non-streaming response
-                    response = self.model_client.chat.completions.create(
-                        model=self.args.model,
-                        messages=messages,
-                        temperature=self.args.temperature,
-                        top_p=self.args.top_p,
-                        max_tokens=self.args.max_new_tokens,
-                        stream=False,
-                    )
-                    content = response.choices[0].message.content
-                
+                with tracer.span("llm_call", round=round_num, attempt=retry_count + 1):
+                    content, usage, headers = self._request_completion(messages, use_stream, debug, n)
+                self._release_llm_slot(estimate, usage, headers)
                 return content
                 
             except Exception as e:
+                rate_limited = self._release_llm_slot_after_error(estimate, e)
                 retry_count += 1
                 wait_time = min(2 ** retry_count, 60)
                 logger.warning(f"LLM call failed (attempt {retry_count}/{max_retries}): {str(e)}")
@@ -252,7 +307,252 @@ class LLMAgent:
                 if retry_count >= max_retries:
                     return f"ERROR: Failed to get LLM response after {max_retries} attempts: {str(e)}"
                 
-                time.sleep(wait_time)
+                if rate_limited:
+                    # The shared limiter holds every caller until the provider's retry-after has passed
+                    continue
+                
+                with tracer.span("llm_retry_wait", attempt=retry_count):
+                    time.sleep(wait_time)
+    
+    def call_llm_n(self, messages, n, instance_id=None, round_num=None):
+        """n sampled completions of one prompt (list), or an ERROR string; providers that ignore n are topped up"""
+        outputs = self.call_llm(messages, instance_id, round_num, use_stream=False, debug=False, n=n)
+        if n == 1 and not self._is_llm_error(outputs):
+            outputs = [outputs]
+        while not self._is_llm_error(outputs) and len(outputs) < n:
+            extra = self.call_llm(messages, instance_id, round_num, use_stream=False, debug=False)
+            if self._is_llm_error(extra):
+                return extra
+            outputs.append(extra)
+        return outputs
+    
+    @staticmethod
+    def _is_llm_error(llm_response):
+        return isinstance(llm_response, str) and llm_response.startswith("ERROR:")
+    
+    def _acquire_llm_slot(self, messages):
+        if not self.rate_limiter:
+            return 0.0
+        with tracer.span("llm_rate_wait"):
+            return self.rate_limiter.acquire(self.rate_limiter.estimate_tokens(messages))
+    
+    def _release_llm_slot(self, estimate, usage=None, headers=None):
+        self.prompt_cache_stats.record(usage)
+        if self.rate_limiter:
+            self.rate_limiter.release(estimate, usage, headers)
+    
+    def _release_llm_slot_after_error(self, estimate, error):
+        """Release the limiter slot for a failed request; returns True if it was a 429 the shared limiter
+        now holds every caller back for, so the caller retries without its own backoff sleep"""
+        rate_limited = getattr(error, "status_code", None) == 429
+        if not self.rate_limiter:
+            # --llm_scheduler none: a 429 is retried with the plain per-call exponential backoff
+            return False
+        headers = getattr(getattr(error, "response", None), "headers", None)
+        self.rate_limiter.release(estimate, headers=headers, rate_limited=rate_limited, success=False)
+        return rate_limited
+    
+    def _load_tool_schemas(self):
+        """Tool schemas for native mode: the prompt's <tools> block if it has one, else the built-in set"""
+        try:
+            with open(self.args.system_prompt_path, 'r', encoding='utf-8') as f:
+                schemas = parse_xml_tool_schemas(f.read())
+        except OSError:
+            schemas = []
+        schemas = schemas or default_tool_schemas(getattr(self.args, 'database_type', 'sqlite'))
+        if getattr(self.args, 'schema_search', False) and all(
+                schema["function"]["name"] != SEARCH_SCHEMA_TOOL for schema in schemas):
+            schemas.append(search_schema_tool_schema())
+        return schemas
+    
+    def _initial_messages(self, item):
+        """Initial prompt of an item; precomputed prompts are shared, which is safe as RoundLogs never modify messages"""
+        instance_id = item["instance_id"]
+        if self.prefetcher is not None:
+            self.prefetcher.started(instance_id)
+        with self._prompts_lock:
+            precomputed = self.initial_prompts.get(instance_id)
+            self._prompt_uses[instance_id] -= 1
+            if self._prompt_uses[instance_id] <= 0:
+                self._drop_prompt(instance_id)
+        if precomputed is not None:
+            return list(precomputed)
+        return self._build_initial_messages(item)
+    
+    def _build_initial_messages(self, item):
+        messages = self.prompt_builder.build_initial_prompt(item)
+        if self.tool_protocol == "native" and messages and messages[0]["role"] == "system":
+            system_content = messages[0]["content"]
+            layers = getattr(system_content, "layers", None)
+            if layers:
+                messages[0]["content"] = LayeredText([native_system_prompt(layers[0])] + layers[1:])
+            else:
+                messages[0]["content"] = native_system_prompt(system_content)
+        return messages
+    
+    def _precompute_prompts(self, items):
+        """--precompute_prompts: build every item's initial prompt now, so starting a rollout is a lookup"""
+        start = time.time()
+        failed = 0
+        for item in items:
+            if item["instance_id"] in self.initial_prompts:
+                continue
+            try:
+                self.initial_prompts[item["instance_id"]] = self._build_initial_messages(item)
+            except Exception as e:
+                # Built (and reported) again when its rollouts start
+                failed += 1
+                logger.warning(f"Could not precompute prompt for {item['instance_id']}: {e}")
+        print(f"Precomputed {len(self.initial_prompts)} prompts in {time.time() - start:.2f}s"
+              + (f" ({failed} failed)" if failed else ""))
+    
+    def _prefetch_prompt(self, item):
+        instance_id = item["instance_id"]
+        with self._prompts_lock:
+            if instance_id in self.initial_prompts or self._prompt_uses[instance_id] <= 0:
+                return
+        messages = self._build_initial_messages(item)
+        with self._prompts_lock:
+            # Its last rollout may have started (and built its own prompt) meanwhile
+            if self._prompt_uses[instance_id] > 0:
+                self.initial_prompts.setdefault(instance_id, messages)
+    
+    def _drop_prompt(self, instance_id):
+        """Forget an instance's initial prompt once no rollout of it will start any more; needs _prompts_lock"""
+        self._prompt_uses.pop(instance_id, None)
+        self.initial_prompts.pop(instance_id, None)
+    
+    def _rollout_concurrency(self):
+        """Rollouts that run at once"""
+        return self.args.num_threads
+    
+    def _start_prefetcher(self, items):
+        """--prefetch_lookahead: prepare prompts and warm the tool server for the next instances in `items`"""
+        lookahead = getattr(self.args, 'prefetch_lookahead', 0)
+        if lookahead <= 0:
+            return None
+        prefetcher = InstancePrefetcher(
+            items, lookahead, self._prefetch_prompt,
+            warmup_url=f"http://{self.args.api_host}:{self.args.api_port}/warmup",
+            database_type=getattr(self.args, 'database_type', None),
+            connections=self._rollout_concurrency()
+        )
+        prefetcher.start()
+        return prefetcher
+    
+    def _assistant_output(self, content, tool_calls, finish_reason):
+        """What call_llm returns: the text in text mode, the assistant message with its tool calls in native mode"""
+        if self.tool_protocol == "native":
+            return {"role": "assistant", "content": content or "", "tool_calls": tool_calls or []}
+        return close_stopped_tool_call(content, finish_reason)
+    
+    def _choice_output(self, choice):
+        tool_calls = [tc.model_dump(exclude_none=True) for tc in (choice.message.tool_calls or [])]
+        return self._assistant_output(choice.message.content, tool_calls, choice.finish_reason)
+    
+    def _completion_kwargs(self, messages, stream, n=1):
+        """Request parameters shared by the sync and async clients"""
+        cache_hints = getattr(self.args, 'prompt_cache_hints', 'none')
+        kwargs = {
+            "model": self.args.model,
+            "messages": apply_cache_hints(messages, cache_hints),
+            "temperature": self.args.temperature,
+            "top_p": self.args.top_p,
+            "max_tokens": self.args.max_new_tokens,
+            "stream": stream,
+        }
+        if stream:
+            # The final chunk reports token usage, which the rate limiter charges against the TPM budget
+            kwargs["stream_options"] = {"include_usage": True}
+        if n > 1:
+            kwargs["n"] = n
+        if cache_hints == "openai":
+            # Requests sharing a prefix are routed to the same cache
+            kwargs["prompt_cache_key"] = prefix_key(messages)
+        if self.tool_protocol == "native":
+            kwargs["tools"] = self.tool_schemas
+            kwargs["parallel_tool_calls"] = True
+        elif not getattr(self.args, 'disable_stop_sequences', False):
+            # Only the first tool call of a turn is executed; anything generated after it is discarded
+            kwargs["stop"] = [TOOL_CALL_CLOSE]
+        return kwargs
+    
+    def _request_completion(self, messages, use_stream, debug, n=1):
+        """Send one chat completion request; returns (assistant output, usage dict or None, response headers)"""
+        if use_stream:
+            # Streaming response with real-time printing
+            raw_response = self.model_client.chat.completions.with_raw_response.create(
+                **self._completion_kwargs(messages, stream=True)
+            )
+            response = raw_response.parse()
+
+            full_message = ChatCompletionMessage(
+                role="assistant",
+                content=""
+            )
+            choice = Choice(
+                index=0,
+                message=full_message,
+                finish_reason="stop"
+            )
+            first_token = True
+            # Native tool calls arrive as fragments keyed by index; arguments are concatenated JSON text
+            streamed_tool_calls = {}
+            # Scan only the newly arrived text (plus enough overlap for a tag split across chunks)
+            scan_from = 0
+            usage = None
+
+            for chunk in response:
+                if getattr(chunk, "usage", None):
+                    usage = chunk.usage.model_dump()
+                if chunk.choices and chunk.choices[0].delta.content is not None:
+                    if first_token:
+                        debug_print(debug, "assistant :> ", end="")
+                        first_token = False
+                    full_message.content += chunk.choices[0].delta.content
+                    debug_print(debug, f"{chunk.choices[0].delta.content}", end="", include_timestamp=False)
+
+                    close_at = -1 if self.tool_protocol == "native" else full_message.content.find(TOOL_CALL_CLOSE, scan_from)
+                    if close_at != -1:
+                        # The tool call is complete: stop paying for tokens that would be discarded
+                        full_message.content = full_message.content[:close_at + len(TOOL_CALL_CLOSE)]
+                        response.close()
+                        break
+                    scan_from = max(len(full_message.content) - len(TOOL_CALL_CLOSE) + 1, 0)
+
+                if chunk.choices and chunk.choices[0].delta.tool_calls:
+                    for delta in chunk.choices[0].delta.tool_calls:
+                        call = streamed_tool_calls.setdefault(
+                            delta.index, {"id": "", "type": "function", "function": {"name": "", "arguments": ""}}
+                        )
+                        if delta.id:
+                            call["id"] = delta.id
+                        if delta.function and delta.function.name:
+                            call["function"]["name"] += delta.function.name
+                        if delta.function and delta.function.arguments:
+                            call["function"]["arguments"] += delta.function.arguments
+
+                if chunk.choices and chunk.choices[0].finish_reason:
+                    # Keep reading: the usage chunk (no choices) follows the last one
+                    choice.finish_reason = chunk.choices[0].finish_reason
+            
+            # Print newline after streaming is complete
+            if debug:
+                print()
+            
+            tool_calls = [streamed_tool_calls[index] for index in sorted(streamed_tool_calls)]
+            content = self._assistant_output(full_message.content, tool_calls, choice.finish_reason)
+        else:
+            # Non-streaming response
+            raw_response = self.model_client.chat.completions.with_raw_response.create(
+                **self._completion_kwargs(messages, stream=False, n=n)
+            )
+            response = raw_response.parse()
+            outputs = [self._choice_output(choice) for choice in response.choices]
+            content = outputs[0] if n == 1 else outputs
+            usage = response.usage.model_dump() if response.usage else None
+        
+        return content, usage, raw_response.headers
     
     def start_chat_mode(self):
         """Start interactive chat mode"""
@@ -335,37 +635,33 @@ class LLMAgent:
         """Process a single chat instance"""
         try:
             # Build initial prompt with conversation history
-            messages = self.prompt_builder.build_initial_prompt(
+            log = RoundLog(self.prompt_builder.build_initial_prompt(
                 instance, 
                 conversation_history=history
-            )
-            
-            conversation_history = deepcopy(messages)
+            ))
             terminated = False
             final_answer = ""
             
             for round_num in range(self.args.max_rounds):
                 # Use streaming for chat mode
                 llm_response = self.call_llm(
-                    messages, 
+                    log.messages, 
                     instance["instance_id"], 
                     round_num + 1, 
                     use_stream=True, 
                     debug=True
                 )
                 
-                if llm_response.startswith("ERROR:"):
+                if isinstance(llm_response, str) and llm_response.startswith("ERROR:"):
                     final_answer = f"Error: {llm_response}"
                     break
                 
-                result = self.message_processor.process_round(
-                    llm_response, instance, messages, conversation_history
-                )
+                result = self.message_processor.process_round(llm_response, instance, log)
                 
                 # Extract final answer from assistant response
                 if not final_answer:
                     # Get the last assistant message
-                    for msg in reversed(conversation_history):
+                    for msg in reversed(log.conversation()):
                         if msg.get("role") == "assistant":
                             final_answer = msg.get("content", "")
                             break
@@ -380,7 +676,7 @@ class LLMAgent:
             return {
                 "final_answer": final_answer or "No response generated",
                 "terminated": terminated,
-                "conversation": conversation_history
+                "conversation": log.conversation()
             }
             
         except Exception as e:
@@ -396,24 +692,94 @@ class LLMAgent:
             print(f"Skipping {instance_id} rollout {rollout_idx + 1} (already completed {self.processed_instances[instance_id]} valid rollouts)")
             return None
         
+        if self.early_stop.decided(instance_id):
+            print(f"Skipping {instance_id} rollout {rollout_idx + 1} (answer already decided by vote)")
+            self.early_stop.record("skipped")
+            return None
+        
+        with tracer.trace(instance_id, rollout_idx):
+            return self._run_rollout(item, rollout_idx)
+    
+    def _save_result(self, result):
+        with tracer.span("persist"):
+            self.file_manager.add_single_result(result)
+            self.checkpoints.finish(f"{result['instance_id']}#{result['rollout_idx']}")
+    
+    def _start_rollout(self, rollout_key, messages):
+        """(RoundLog, loop_state, start_round) of a rollout, continued from the checkpoint an earlier run
+        left for it if there is one"""
+        context_state = self.context_manager.new_state()
+        loop_state = self.loop_detector.new_state()
+        checkpoint = self.resumable.pop(rollout_key, None)
+        if checkpoint is None:
+            return RoundLog(messages, context_state), loop_state, 0
+        self.checkpoints.resume(rollout_key, checkpoint, len(messages))
+        print(f"Resuming {rollout_key} from round {checkpoint.rounds + 1}")
+        return (*checkpoint.restore(messages, context_state, loop_state), checkpoint.rounds)
+    
+    def _vote_answer(self, log):
+        """Answer of a terminated rollout to vote with, or None when early stopping is off"""
+        if not self.early_stop.enabled:
+            return None
+        return terminate_answer(log.conversation(-1))
+    
+    def _answer_call(self, answer, messages):
+        """--early_stop_vote result: run the answer through the SQL tool so equivalent queries vote together"""
+        return {"name": self.message_processor.sql_tool_name(messages), "arguments": {"sql": answer}}
+    
+    def _record_vote(self, instance_id, answer, exec_result=None):
+        fingerprint = result_fingerprint(exec_result.get("content")) if exec_result else None
+        key = vote_key(answer, fingerprint)
+        if self.early_stop.vote(instance_id, key):
+            print(f"Early stop: {instance_id} decided by {self.early_stop.quorum} agreeing rollouts")
+            # Its remaining rollouts are skipped without taking the prompt
+            with self._prompts_lock:
+                self._drop_prompt(instance_id)
+        return key
+    
+    def _cast_vote(self, item, log, rollout_key):
+        """Vote with a terminated rollout's answer; returns the vote key stored with the result"""
+        answer = self._vote_answer(log)
+        if answer is None:
+            return None
+        exec_result = None
+        if self.early_stop.mode == "result":
+            exec_result = self.message_processor.execute_tool_calls([self._answer_call(answer, log.messages)],
+                                                                    rollout_key)[0]
+        return self._record_vote(item["instance_id"], answer, exec_result)
+    
+    def _run_rollout(self, item, rollout_idx):
+        """Run one rollout of an item to termination, error or max_rounds and persist the result"""
+        instance_id = item["instance_id"]
+        rollout_key = f"{instance_id}#{rollout_idx}"
+        
         try:
-            messages = self.prompt_builder.build_initial_prompt(item)
-            conversation_history = deepcopy(messages)
+            with tracer.span("prompt_build"):
+                messages = self._initial_messages(item)
+            initial_count = len(messages)
+            log, loop_state, start_round = self._start_rollout(rollout_key, messages)
             terminated = False
+            cancelled = False
+            vote = None
             
-            for round_num in range(self.args.max_rounds):
+            for round_num in range(start_round, self.args.max_rounds):
+                if self.early_stop.decided(instance_id):
+                    cancelled = True
+                    self.early_stop.record("cancelled")
+                    break
+                
                 print(f"Processing {instance_id} rollout {rollout_idx + 1}, round {round_num + 1}")
 
                 # Use non-streaming for batch processing
                 llm_response = self.call_llm(
-                    messages, 
+                    log.compacted(self.context_manager), 
                     instance_id, 
                     round_num + 1, 
                     use_stream=False, 
                     debug=False
                 )
                 
-                if llm_response.startswith("ERROR:"):
+                if isinstance(llm_response, str) and llm_response.startswith("ERROR:"):
                     print(f"Failed to get valid LLM response for {instance_id}")
                     error_result = {
                         "instance_id": instance_id,
@@ -422,31 +788,42 @@ class LLMAgent:
                         "round_failed": round_num + 1,
                         "terminated": False
                     }
-                    self.file_manager.add_single_result(error_result)
+                    self._save_result(error_result)
                     return error_result
                 
-                result = self.message_processor.process_round(
-                    llm_response, item, messages, conversation_history
-                )
+                result = self.message_processor.process_round(llm_response, item, log, rollout_key=rollout_key)
                 
                 if result.get("terminated"):
                     terminated = True
+                    vote = self._cast_vote(item, log, rollout_key)
+                    break
+                
+                if self.loop_detector.check(loop_state, log):
+                    print(f"Stopping {instance_id} rollout {rollout_idx + 1}: stuck in a loop ({loop_state['stopped']})")
                     break
                 
+                self.checkpoints.save_round(rollout_key, round_num + 1, log, loop_state, initial_count)
+                
                 if result.get("continue"):
                     continue
             
             result = {
                 "instance_id": instance_id,
                 "rollout_idx": rollout_idx,
-                "conversation": conversation_history,
-                "final_messages": messages,
+                "conversation": log.conversation(),
+                "final_messages": log.messages,
                 "terminated": terminated
             }
+            if vote:
+                result["vote"] = vote
+            if cancelled:
+                result["cancelled"] = True
+            if self.loop_detector.enabled:
+                result["loop_detection"] = self.loop_detector.report(loop_state)
             
-            self.file_manager.add_single_result(result)
+            self._save_result(result)
             
-            status = "TERMINATED" if terminated else "INCOMPLETE"
+            status = "TERMINATED" if terminated else "CANCELLED" if cancelled else "INCOMPLETE"
             print(f"Completed: {instance_id} (rollout {rollout_idx + 1}/{self.args.rollout_number}) - {status}")
             
             return result
@@ -459,7 +836,7 @@ class LLMAgent:
                 "terminated": False
             }
             
-            self.file_manager.add_single_result(error_result)
+            self._save_result(error_result)
             print(f"Error processing {instance_id} rollout {rollout_idx + 1}: {str(e)}")
             return error_result
     
@@ -471,22 +848,34 @@ class LLMAgent:
             return
         
         # Original batch processing mode
-        existing_results = self.file_manager.load_existing_results()
+        existing_results = self.file_manager.load_existing_results(
+            rebuild_index=getattr(self.args, 'rebuild_index', False)
+        )
         self.processed_instances = self.file_manager.processed_instances
+        if self.early_stop.enabled:
+            self.early_stop.seed(existing_results)
+        self.resumable = self.checkpoints.load()
         os.makedirs(self.args.output_folder, exist_ok=True)
         
         with open(self.args.input_file, 'r', encoding='utf-8') as f:
             items = [json.loads(line) for line in f]
 
-        random.shuffle(items)
+        items = self._order_items(items, existing_results)
         
         tasks_to_process = []
         for item in items:
             instance_id = item["instance_id"]
             current_valid_rollouts = self.processed_instances[instance_id]
+            if self.early_stop.decided(instance_id):
+                continue
             
-            for rollout_idx in range(current_valid_rollouts, self.args.rollout_number):
+            for rollout_idx in self._rollout_indices(instance_id, current_valid_rollouts):
                 tasks_to_process.append((item, rollout_idx))
+        self._discard_unscheduled_checkpoints(items, tasks_to_process)
+        if self.resumable:
+            print(f"Unfinished rollouts with checkpoints: {len(self.resumable)}")
+        if getattr(self.args, 'interleave_rollouts', False):
+            tasks_to_process = interleave_rollouts(tasks_to_process, by_db=self.task_order == "db")
         
         total_expected = len(items) * self.args.rollout_number
         total_existing = sum(self.processed_instances.values())
@@ -496,28 +885,275 @@ class LLMAgent:
         print(f"Prompt strategy: {self.args.prompt_strategy}")
         print(f"Total expected tasks: {total_expected}")
         print(f"Valid completed tasks: {total_existing}")
+        if self.early_stop.enabled:
+            print(f"Instances decided by vote: {sum(self.early_stop.decided(item['instance_id']) for item in items)}")
         print(f"Tasks to process: {len(tasks_to_process)}")
         
+        # Initial prompts are taken once per rollout, or once per instance when its rollouts are forked
+        self._prompt_uses = Counter(item["instance_id"] for item, _ in (
+            self._group_tasks(tasks_to_process) if self.fork_rollouts else tasks_to_process))
+        if getattr(self.args, 'precompute_prompts', False) and tasks_to_process:
+            self._precompute_prompts([item for item, _ in self._group_tasks(tasks_to_process)])
+        
         if not tasks_to_process:
             print("All rollouts have been completed successfully!")
+            self.file_manager.close()
+            self.checkpoints.close()
             return
         
+        self.prefetcher = self._start_prefetcher([item for item, _ in self._group_tasks(tasks_to_process)])
+        try:
+            completed_count = self._execute_tasks(tasks_to_process)
+        finally:
+            if self.prefetcher is not None:
+                self.prefetcher.stop()
+            try:
+                self.file_manager.close()
+            finally:
+                self.checkpoints.close()
+        
+        print(f"All processing completed! Results saved to: {self.args.output_folder}")
+        print(f"Total processed in this run: {completed_count}")
+        if self.rate_limiter:
+            print(f"LLM scheduler: {self.rate_limiter.summary()}")
+        if self.message_processor.repairer:
+            print(f"Tool call repairs: {self.message_processor.repairer.summary()}")
+        if self.context_manager.enabled:
+            print(f"Context compaction: {self.context_manager.summary()}")
+        if self.early_stop.enabled:
+            print(f"Early stopping: {self.early_stop.summary()}")
+        if self.loop_detector.enabled:
+            print(f"Loop detection: {self.loop_detector.summary()}")
+        print(f"Prompt cache: {self.prompt_cache_stats.summary()}")
+        print(f"Prompt assets: {self.prompt_assets.summary()}")
+        if self.prefetcher is not None:
+            print(f"Prefetch: {self.prefetcher.summary()}")
+        if self.schema_pruner.enabled:
+            print(f"Schema pruning: {self.schema_pruner.summary()}")
+        
+        if tracer.enabled:
+            tracer.close()
+            print(f"Trace written to: {tracer.trace_file}")
+            print(format_summary(summarize([tracer.trace_file])))
+    
+    def _order_items(self, items, existing_results):
+        """--task_order: items in the order their rollouts are queued, by the round counts of earlier results
+        (this output folder and --task_history folders)"""
+        if self.task_order == "random":
+            return order_items(items, "random")
+        summaries = list(existing_results)
+        for folder in getattr(self.args, 'task_history', None) or []:
+            try:
+                summaries.extend(read_result_summaries(folder))
+            except Exception as e:
+                print(f"Could not read round history from {folder}: {e}")
+        history = round_history(summaries)
+        known = sum(1 for item in items if item["instance_id"] in history)
+        print(f"Task order: {self.task_order} ({known}/{len(items)} instances with round history)")
+        return order_items(items, self.task_order, expected_rounds(items, history))
+    
+    def _rollout_indices(self, instance_id, current_valid_rollouts):
+        """Rollouts still to run for an instance, those with a checkpoint to resume first"""
+        needed = self.args.rollout_number - current_valid_rollouts
+        if needed <= 0:
+            return []
+        resumable = sorted(int(key.rsplit("#", 1)[1]) for key in self.resumable if key.rsplit("#", 1)[0] == instance_id)
+        fresh = [i for i in range(current_valid_rollouts, self.args.rollout_number) if i not in resumable]
+        return (resumable + fresh)[:needed]
+    
+    def _discard_unscheduled_checkpoints(self, items, tasks_to_process):
+        """Drop the checkpoints of rollouts that won't run: another rollout completed their instance, or the
+        vote decided it. Checkpoints of instances not in this input file are kept"""
+        instance_ids = {item["instance_id"] for item in items}
+        scheduled = {f"{item['instance_id']}#{rollout_idx}" for item, rollout_idx in tasks_to_process}
+        stale = [key for key in self.resumable if key not in scheduled and key.rsplit("#", 1)[0] in instance_ids]
+        if stale:
+            self.checkpoints.discard(stale)
+            for key in stale:
+                del self.resumable[key]
+            print(f"Discarded checkpoints of rollouts that won't run: {len(stale)}")
+    
+    def _execute_tasks(self, tasks_to_process):
+        """Run (item, rollout_idx) tasks on a thread pool; returns the number completed"""
         completed_count = 0
         with ThreadPoolExecutor(max_workers=self.args.num_threads) as executor:
-            future_to_task = {
-                executor.submit(self.process_single_item, item, rollout_idx): (item, rollout_idx)
-                for item, rollout_idx in tasks_to_process
-            }
+            if self.fork_rollouts:
+                future_to_task = {
+                    executor.submit(self.process_rollout_group, item, rollout_indices): (item, rollout_indices[0])
+                    for item, rollout_indices in self._group_tasks(tasks_to_process)
+                }
+            else:
+                future_to_task = {
+                    executor.submit(self.process_single_item, item, rollout_idx): (item, rollout_idx)
+                    for item, rollout_idx in tasks_to_process
+                }
             
             for future in as_completed(future_to_task):
                 item, rollout_idx = future_to_task[future]
                 try:
                     result = future.result()
                     if result is not None:
-                        completed_count += 1
+                        completed_count += len(result) if isinstance(result, list) else 1
                         print(f"Progress: {completed_count}/{len(tasks_to_process)} completed")
                 except Exception as e:
                     print(f"Unexpected error processing {item['instance_id']} rollout {rollout_idx + 1}: {str(e)}")
         
-        print(f"All processing completed! Results saved to: {self.args.output_folder}")
-        print(f"Total processed in this run: {completed_count}")
\ No newline at end of file
+        return completed_count
+    
+    @staticmethod
+    def _group_tasks(tasks_to_process):
+        """(item, rollout_idx) tasks -> (item, [rollout_idx, ...]) per instance, in first-seen order"""
+        groups = {}
+        for item, rollout_idx in tasks_to_process:
+            groups.setdefault(item["instance_id"], (item, []))[1].append(rollout_idx)
+        return list(groups.values())
+    
+    def process_rollout_group(self, item, rollout_indices):
+        """--fork_rollouts counterpart of process_single_item; returns the list of rollout results"""
+        instance_id = item["instance_id"]
+        
+        if self.processed_instances[instance_id] >= self.args.rollout_number:
+            print(f"Skipping {instance_id} (already completed {self.processed_instances[instance_id]} valid rollouts)")
+            return None
+        
+        if self.early_stop.decided(instance_id):
+            print(f"Skipping {instance_id} (answer already decided by vote)")
+            self.early_stop.record("skipped", len(rollout_indices))
+            return None
+        
+        with tracer.trace(instance_id, rollout_indices[0]) as span:
+            if span is not None:
+                span.set(forks=len(rollout_indices))
+            return self._run_rollout_group(item, rollout_indices)
+    
+    def _run_rollout_group(self, item, rollout_indices):
+        """Run several rollouts of one item in lock-step rounds.
+        
+        Forks whose histories are still identical are sampled with one n=k
+        request (one prefill instead of k) and forked on its completions;
+        forks that end a round with identical histories made identical tool
+        calls, which are executed once and the observation shared.
+        """
+        instance_id = item["instance_id"]
+        
+        try:
+            with tracer.span("prompt_build"):
+                messages = self._initial_messages(item)
+        except Exception as e:
+            print(f"Error processing {instance_id}: {str(e)}")
+            forks = [Fork(rollout_idx, RoundLog()) for rollout_idx in rollout_indices]
+            for fork in forks:
+                fork.fail(str(e))
+            return self._finish_forks(instance_id, forks)
+        
+        forks = self._start_forks(instance_id, messages, rollout_indices)
+        
+        with ThreadPoolExecutor(max_workers=len(forks)) as pool:
+            for round_num in range(min(fork.rounds for fork in forks), self.args.max_rounds):
+                running = self._active_forks(instance_id, forks)
+                if not running:
+                    break
+                # Forks resumed at a later round wait for the others to catch up
+                active = [fork for fork in running if fork.rounds <= round_num]
+                print(f"Processing {instance_id} rollouts {[fork.rollout_idx + 1 for fork in active]}, round {round_num + 1}")
+                
+                clusters = cluster_forks(active)
+                futures = [
+                    self._submit_in_context(pool, self.call_llm_n, cluster[0].log.compacted(self.context_manager),
+                                            len(cluster), instance_id, round_num + 1)
+                    for cluster in clusters
+                ]
+                for cluster, future in zip(clusters, futures):
+                    share_context_state(cluster)
+                    self._apply_fork_outputs(item, cluster, future.result(), round_num + 1)
+                for fork in active:
+                    if fork.status == "terminated":
+                        fork.vote = self._cast_vote(item, fork.log, f"{instance_id}#{fork.rollout_idx}")
+                
+                waiting = [fork for fork in active if fork.pending_tool_calls]
+                groups = cluster_forks(waiting)
+                futures = [
+                    self._submit_in_context(pool, self.message_processor.execute_pending, group[0].pending_tool_calls,
+                                            group[0].log.messages, f"{instance_id}#{group[0].rollout_idx}")
+                    for group in groups
+                ]
+                for group, future in zip(groups, futures):
+                    self._apply_fork_observations(group, future.result())
+                self._check_fork_loops(instance_id, active)
+                self._checkpoint_forks(instance_id, active, round_num + 1, len(messages))
+        
+        return self._finish_forks(instance_id, forks)
+    
+    @staticmethod
+    def _submit_in_context(pool, fn, *args):
+        # Each task gets its own copy of the trace context so its spans land in this rollout group
+        return pool.submit(contextvars.copy_context().run, fn, *args)
+    
+    def _active_forks(self, instance_id, forks):
+        """Forks still running; once the instance is decided by vote they are cancelled instead"""
+        active = [fork for fork in forks if fork.status == "running"]
+        if active and self.early_stop.decided(instance_id):
+            for fork in active:
+                fork.status = "cancelled"
+            self.early_stop.record("cancelled", len(active))
+            return []
+        return active
+    
+    def _apply_fork_outputs(self, item, cluster, outputs, round_num):
+        if self._is_llm_error(outputs):
+            print(f"Failed to get valid LLM response for {item['instance_id']}")
+            for fork in cluster:
+                fork.fail(outputs, round_num)
+            return
+        for fork, output in zip(cluster, outputs):
+            try:
+                result = self.message_processor.apply_response(output, item, fork.log)
+            except Exception as e:
+                fork.fail(str(e))
+                continue
+            if result.get("terminated"):
+                fork.status = "terminated"
+            fork.pending_tool_calls = result.get("tool_calls")
+    
+    def _apply_fork_observations(self, group, exec_results):
+        # Observations are immutable once appended, so forks share the executed results instead of copying them
+        for fork in group:
+            self.message_processor.apply_tool_results(fork.pending_tool_calls, exec_results, fork.log)
+            fork.pending_tool_calls = None
+    
+    def _start_forks(self, instance_id, messages, rollout_indices):
+        forks = []
+        for rollout_idx in rollout_indices:
+            log, loop_state, rounds = self._start_rollout(f"{instance_id}#{rollout_idx}", messages)
+            fork = Fork(rollout_idx, log, loop_state)
+            fork.rounds = rounds
+            forks.append(fork)
+        return forks
+    
+    def _checkpoint_forks(self, instance_id, forks, rounds, initial_count):
+        for fork in forks:
+            if fork.status == "running":
+                fork.rounds = rounds
+                self.checkpoints.save_round(f"{instance_id}#{fork.rollout_idx}", rounds, fork.log, fork.loop_state,
+                                            initial_count)
+    
+    def _check_fork_loops(self, instance_id, forks):
+        for fork in forks:
+            if fork.status == "running" and self.loop_detector.check(fork.loop_state, fork.log):
+                fork.status = "stopped"
+                print(f"Stopping {instance_id} rollout {fork.rollout_idx + 1}: stuck in a loop ({fork.loop_state['stopped']})")
+    
+    def _finish_forks(self, instance_id, forks):
+        results = []
+        for fork in forks:
+            result = fork.result(instance_id)
+            if self.loop_detector.enabled and fork.status != "error":
+                result["loop_detection"] = self.loop_detector.report(fork.loop_state)
+            self._save_result(result)
+            if fork.status == "error":
+                print(f"Error processing {instance_id} rollout {fork.rollout_idx + 1}: {fork.error}")
+            else:
+                status = fork.status.upper() if fork.status in ("terminated", "cancelled") else "INCOMPLETE"
+                print(f"Completed: {instance_id} (rollout {fork.rollout_idx + 1}/{self.args.rollout_number}) - {status}")
+            results.append(result)
+        return results
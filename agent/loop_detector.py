@@ -0,0 +1,143 @@
+import hashlib
+import json
+import re
+import threading
+from collections import Counter
+from typing import Any, Dict, Optional
+
+from context_manager import observation_body, is_error_observation
+from early_stop import normalize_sql
+from round_log import RoundLog
+
+LOOP_POLICIES = ("none", "hint", "terminate", "abort")
+
+HINT_MESSAGE = ("You have repeated the same step {count} times without making progress ({kind}). "
+                "Do not repeat it: try a different query or approach, or call terminate with your best answer.")
+TERMINATE_MESSAGE = ("You are repeating the same step without making progress ({kind}). "
+                     "Call terminate now with your best answer; this is the last round.")
+
+
+def _digest(value: Any) -> str:
+    encoded = json.dumps(value, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+
+def _is_sql_tool(name: Any) -> bool:
+    return isinstance(name, str) and name.startswith("execute_") and name.endswith("_sql")
+
+
+def call_fingerprint(tool_call: Dict[str, Any]) -> str:
+    """Calls that differ only in work_dir, or SQL that differs only in case, whitespace or comments, count
+    as the same call; other arguments (bash commands, search queries) must match exactly"""
+    name = tool_call.get("name")
+    sql_tool = _is_sql_tool(name)
+    arguments = {key: normalize_sql(value) if sql_tool and key == "sql" and isinstance(value, str) else value
+                 for key, value in (tool_call.get("arguments") or {}).items() if key != "work_dir"}
+    return _digest([name, arguments])
+
+
+def error_signature(content: str) -> str:
+    """First line of an error with literals and numbers masked, so the same failure on other inputs matches"""
+    first_line = observation_body(content).split("\n", 1)[0]
+    first_line = re.sub(r"'[^']*'|\"[^\"]*\"|`[^`]*`", "?", first_line)
+    return re.sub(r"\d+", "N", first_line).strip().lower()
+
+
+def _latest_round(log: RoundLog):
+    """(assistant turn as saved, observation contents) of the last round in a rollout's log"""
+    for index in range(len(log) - 1, -1, -1):
+        if log.messages[index].get("role") == "assistant":
+            observations = [m.get("content") or "" for m in log.messages[index + 1:]
+                            if m.get("role") in ("tool", "user")]
+            return log.record(index), observations
+    return None, []
+
+
+class LoopDetector:
+    """Per-rollout detection of stuck loops: the same call with the same result
+    (`repeat`), or the same error over and over (`error_cycle`).
+
+    Every round is fingerprinted from the conversation: its normalized tool
+    calls plus their observations, and the signature of any error it got.
+    When a fingerprint reaches `threshold` occurrences the policy is applied:
+    `hint` tells the model to change course, `terminate` asks for the final
+    answer and stops the rollout after one more round, `abort` stops it now.
+    """
+
+    def __init__(self, policy: str = "none", threshold: int = 3):
+        self.policy = policy
+        self.threshold = threshold
+        self.stats = Counter()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.policy != "none" and self.threshold > 0
+
+    def new_state(self) -> Dict[str, Any]:
+        return {"rounds": Counter(), "errors": Counter(), "detections": Counter(), "hints": 0,
+                "final_round": False, "stopped": None}
+
+    def _detect(self, state: Dict[str, Any], log: RoundLog) -> Optional[str]:
+        assistant, observations = _latest_round(log)
+        if assistant is None:
+            return None
+        calls = [call_fingerprint(tc) for tc in assistant.get("tool_calls") or []]
+        if not calls:
+            # A reply without a usable call (answered by a format reminder) repeats by its text
+            calls = [_digest(re.sub(r"\s+", " ", assistant.get("content") or "").strip())]
+        round_key = _digest([calls, [re.sub(r"\s+", " ", o).strip() for o in observations]])
+        state["rounds"][round_key] += 1
+        if state["rounds"][round_key] >= self.threshold:
+            state["rounds"][round_key] = 0
+            return "repeat"
+
+        if observations and all(is_error_observation(o) for o in observations):
+            for signature in {error_signature(o) for o in observations}:
+                state["errors"][signature] += 1
+                if state["errors"][signature] >= self.threshold:
+                    state["errors"][signature] = 0
+                    return "error_cycle"
+        return None
+
+    def check(self, state: Dict[str, Any], log: RoundLog) -> bool:
+        """Inspect the round just completed; returns True if the rollout should stop"""
+        if not self.enabled:
+            return False
+        if state["final_round"]:
+            # Asked for the final answer last round and it still didn't terminate
+            state["stopped"] = "no_terminate"
+            self._count("stopped")
+            return True
+
+        kind = self._detect(state, log)
+        if kind is None:
+            return False
+        state["detections"][kind] += 1
+        self._count(kind)
+
+        if self.policy == "abort":
+            state["stopped"] = kind
+            self._count("stopped")
+            return True
+        if self.policy == "terminate":
+            state["final_round"] = True
+            log.append({"role": "user", "content": TERMINATE_MESSAGE.format(kind=kind.replace("_", " "))})
+            return False
+        state["hints"] += 1
+        self._count("hints")
+        log.append({"role": "user", "content": HINT_MESSAGE.format(count=self.threshold, kind=kind.replace("_", " "))})
+        return False
+
+    def report(self, state: Dict[str, Any]) -> Dict[str, Any]:
+        """Counts saved with the rollout result"""
+        return {"repeat": state["detections"]["repeat"], "error_cycle": state["detections"]["error_cycle"],
+                "hints": state["hints"], "stopped": state["stopped"]}
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def summary(self) -> Dict[str, int]:
+        with self._lock:
+            return {"repeat": 0, "error_cycle": 0, "hints": 0, "stopped": 0, **self.stats}
@@ -21,6 +21,38 @@ def main():
     parser.add_argument("--temperature", type=float, default=0.7, help="Temperature")
     parser.add_argument("--top_p", type=float, default=0.9, help="Top-p")
     parser.add_argument("--max_new_tokens", type=int, default=4096, help="Max new tokens")
+    parser.add_argument("--tool_protocol", default="text", choices=["text", "native"],
+                       help="text: <tool_call> blocks parsed from the reply, one per turn; "
+                            "native: API function calling, all calls of a turn run concurrently")
+    parser.add_argument("--disable_tool_call_repair", action="store_true",
+                       help="Answer malformed tool calls with a format reminder instead of repairing them locally")
+    parser.add_argument("--disable_stop_sequences", action="store_true",
+                       help="Don't stop generation at </tool_call> (for endpoints that reject the stop parameter)")
+    
+    # Context compaction
+    parser.add_argument("--context_budget_tokens", type=int, default=0,
+                       help="Elide old tool observations once the prompt exceeds this many tokens (0 = never)")
+    parser.add_argument("--context_keep_rounds", type=int, default=3, help="Most recent rounds always sent verbatim")
+    parser.add_argument("--context_stub_chars", type=int, default=200,
+                       help="Characters of an elided observation kept in its stub")
+    
+    # Loop detection
+    parser.add_argument("--loop_policy", default="none", choices=["none", "hint", "terminate", "abort"],
+                       help="What to do when a rollout repeats the same call and result, or the same error: "
+                            "hint the model, ask for its final answer, or stop the rollout")
+    parser.add_argument("--loop_threshold", type=int, default=3,
+                       help="Occurrences of the same round (or error) that count as a loop")
+    
+    # Prompt caching
+    parser.add_argument("--prompt_cache_hints", default="none", choices=["none", "openai", "anthropic"],
+                       help="openai: send prompt_cache_key for shared prefixes; anthropic: cache_control breakpoints "
+                            "after the system prompt, schema and knowledge layers and on the latest message")
+    
+    # LLM request scheduling
+    parser.add_argument("--llm_scheduler", default="aimd", choices=["aimd", "none"],
+                       help="aimd: shared RPM/TPM budgets, rate-limit headers and adaptive in-flight LLM concurrency")
+    parser.add_argument("--rpm_limit", type=float, default=0, help="Requests per minute budget (0 = learn from headers)")
+    parser.add_argument("--tpm_limit", type=float, default=0, help="Tokens per minute budget (0 = learn from headers)")
     
     # Execution settings
     parser.add_argument("--api_host", default="localhost", help="API host")
@@ -28,14 +60,70 @@ def main():
     parser.add_argument("--max_rounds", type=int, default=20, help="Max conversation rounds")
     parser.add_argument("--num_threads", type=int, default=4, help="Number of threads")
     parser.add_argument("--rollout_number", type=int, default=1, help="Number of rollouts per example")
+    parser.add_argument("--fork_rollouts", action="store_true",
+                       help="Run the rollouts of an example together: sample identical histories with one n=k request "
+                            "and execute identical tool calls once")
+    parser.add_argument("--early_stop_quorum", type=int, default=0,
+                       help="Cancel an example's remaining rollouts once this many agree on the answer (0 = off)")
+    parser.add_argument("--early_stop_vote", default="sql", choices=["sql", "result"],
+                       help="sql: rollouts agree when their normalized SQL matches; "
+                            "result: when executing the answers gives the same rows")
+    
+    # Result storage
+    parser.add_argument("--result_store", default="jsonl", choices=["jsonl", "json"],
+                       help="jsonl: append each result to <output_folder>/results.jsonl; "
+                            "json: rewrite <output_folder>/<instance_id>.json for every result")
+    parser.add_argument("--fsync_every", type=int, default=32, help="jsonl store: fsync after this many results")
+    parser.add_argument("--result_writer_thread", action="store_true",
+                       help="jsonl store: serialize and write results on a background thread")
+    parser.add_argument("--blob_min_chars", type=int, default=0,
+                       help="jsonl store: message contents this long are stored once, compressed, in "
+                            "<output_folder>/blobs.bin and referenced from results (default 0 = store inline)")
+    parser.add_argument("--disable_checkpoints", action="store_true",
+                       help="Don't checkpoint rollouts after every round (<output_folder>/checkpoints.jsonl)")
+    parser.add_argument("--rebuild_index", action="store_true",
+                       help="Rebuild the completion index (<output_folder>/index.sqlite) from the result files")
+    
+    # Async execution (replaces the thread pool; --num_threads is ignored)
+    parser.add_argument("--async_mode", action="store_true",
+                       help="Run all rollouts on one asyncio event loop with the async OpenAI and tool clients")
+    parser.add_argument("--max_concurrent_rollouts", type=int, default=1024, help="Async mode: rollouts in progress at once")
+    parser.add_argument("--max_concurrent_llm", type=int, default=64, help="Async mode: in-flight LLM requests")
+    parser.add_argument("--max_concurrent_tools", type=int, default=64, help="Async mode: in-flight tool-server requests")
+    
+    # Observability
+    parser.add_argument("--trace_file", default=None,
+                       help="Write per-rollout spans (LLM, tool queue/exec, prompt build) to this Chrome trace file")
     
     parser.add_argument("--prompt_strategy", default="universal-agent", 
                        choices=["universal-agent", "spider-agent"],
                        help="Prompt building strategy")
+    parser.add_argument("--asset_cache_mb", type=int, default=256,
+                       help="Size bound of the in-process cache of system prompt, schema, knowledge and listing files")
+    parser.add_argument("--schema_top_k", type=int, default=0,
+                       help="Put only the K tables of schema.sql most relevant to the instruction (BM25) in the prompt; 0 = whole schema")
+    parser.add_argument("--schema_index_dir", default=None,
+                       help="Where build_schema_index.py keeps the --schema_top_k indexes (default: $SCHEMA_INDEX_DIR or ~/.cache/spider-agent/schema_index)")
+    parser.add_argument("--schema_search", action="store_true",
+                       help="Offer the tool server's search_schema tool (ranked full-text search over the schema files) to the model")
+    parser.add_argument("--precompute_prompts", action="store_true",
+                       help="Build the initial prompt of every pending instance before starting rollouts")
+    parser.add_argument("--task_order", default="random", choices=["random", "db", "longest"],
+                       help="Queue order of instances: random, db (grouped by db_id, costliest databases first) or longest (most expected rounds first)")
+    parser.add_argument("--task_history", action="append", default=None,
+                       help="Output folder of an earlier run whose round counts inform --task_order (repeatable); this run's output folder is always used")
+    parser.add_argument("--interleave_rollouts", action="store_true",
+                       help="Queue every instance's first pending rollout before any second one (within each database under --task_order db)")
+    parser.add_argument("--prefetch_lookahead", type=int, default=0,
+                       help="Build prompts and warm the tool server's files and pool for the next N queued instances while earlier ones run; 0 = off")
     
     args = parser.parse_args()
     
-    agent = LLMAgent(args)
+    if args.async_mode and not args.chat_mode:
+        from async_agent import AsyncLLMAgent
+        agent = AsyncLLMAgent(args)
+    else:
+        agent = LLMAgent(args)
     
     if args.chat_mode:
         agent.start_chat_mode()
@@ -2,9 +2,28 @@ import re
 import os
 import requests
 import json
-from copy import deepcopy
+import time
 from datetime import datetime
 
+from tracing import tracer, parse_server_timing
+from tool_call_repair import ToolCallRepairer
+from context_manager import RECALL_TOOL, recall_observation
+
+TOOL_CALL_OPEN = "<tool_call>"
+TOOL_CALL_CLOSE = "</tool_call>"
+# Tools that run against the database directory (databases_path/<db_id>), passed to them as work_dir
+WORK_DIR_TOOLS = ("execute_bash", "search_schema")
+
+
+def close_stopped_tool_call(content, finish_reason):
+    """Restore the closing tag the API strips when generation stops on the TOOL_CALL_CLOSE stop sequence"""
+    if finish_reason != "stop" or not content:
+        return content
+    start = content.find(TOOL_CALL_OPEN)
+    if start != -1 and content.find(TOOL_CALL_CLOSE, start) == -1:
+        return content.rstrip() + "\n" + TOOL_CALL_CLOSE
+    return content
+
 def debug_print(debug: bool, *args: str, end="\n", include_timestamp=True) -> None:
     if not debug:
         return
@@ -18,54 +37,151 @@ def debug_print(debug: bool, *args: str, end="\n", include_timestamp=True) -> No
 class MessageProcessor:
     def __init__(self, args):
         self.args = args
+        self.repairer = None if getattr(args, 'disable_tool_call_repair', False) else ToolCallRepairer()
+    
+    def process_round(self, llm_response, item, log, rollout_key=None):
+        """Apply one LLM response to the rollout's RoundLog and run its tool calls"""
+        result = self.apply_response(llm_response, item, log)
+        
+        pending_tool_calls = result.pop("tool_calls", None)
+        if pending_tool_calls:
+            # 执行工具调用
+            exec_results = self.execute_pending(pending_tool_calls, log.messages, rollout_key)
+            self.apply_tool_results(pending_tool_calls, exec_results, log)
+        
+        return result
+    
+    async def process_round_async(self, llm_response, item, log, client, rollout_key=None):
+        """process_round for the asyncio runner; tool calls go through the shared httpx.AsyncClient"""
+        result = self.apply_response(llm_response, item, log)
+        
+        pending_tool_calls = result.pop("tool_calls", None)
+        if pending_tool_calls:
+            exec_results = await self.execute_pending_async(pending_tool_calls, log.messages, client, rollout_key)
+            self.apply_tool_results(pending_tool_calls, exec_results, log)
+        
+        return result
+    
+    def execute_pending(self, tool_calls, messages, rollout_key=None):
+        """Results for the tool calls returned by apply_response, in order (agent-local calls are answered here)"""
+        local_results = self._execute_local_calls(tool_calls, messages)
+        remote_calls = [tc for i, tc in enumerate(tool_calls) if i not in local_results]
+        remote_results = self.execute_tool_calls(remote_calls, rollout_key)
+        return self._merge_results(tool_calls, local_results, remote_results)
+    
+    async def execute_pending_async(self, tool_calls, messages, client, rollout_key=None):
+        local_results = self._execute_local_calls(tool_calls, messages)
+        remote_calls = [tc for i, tc in enumerate(tool_calls) if i not in local_results]
+        remote_results = await self.execute_tool_calls_async(remote_calls, client, rollout_key)
+        return self._merge_results(tool_calls, local_results, remote_results)
+    
+    def _execute_local_calls(self, tool_calls, messages):
+        """Calls answered by the agent itself (recall of an elided observation); returns {index: result}"""
+        return {i: recall_observation(messages, tc["arguments"])
+                for i, tc in enumerate(tool_calls) if tc["name"] == RECALL_TOOL}
     
-    def process_round(self, llm_response, item, messages, conversation_history):
+    def _merge_results(self, tool_calls, local_results, remote_results):
+        remote_results = iter(remote_results)
+        return [local_results[i] if i in local_results else next(remote_results, {"error": "No result returned"})
+                for i in range(len(tool_calls))]
+    
+    def apply_response(self, llm_response, item, log):
+        """Append the assistant turn; returns {"terminated": True} or {"continue": True, "tool_calls": [...]}"""
+        if isinstance(llm_response, dict):
+            return self.apply_native_response(llm_response, item, log)
+        
         assistant_content, tool_calls, preserved_content = self.parse_assistant_message(llm_response, item)
+        
+        if not tool_calls and self.repairer:
+            # Recover the call locally rather than spending a round on the format reminder below
+            repaired = self.repairer.repair(llm_response, self.sql_tool_name(log.messages))
+            if repaired:
+                llm_response = repaired
+                assistant_content, tool_calls, preserved_content = self.parse_assistant_message(repaired, item)
 
         if not tool_calls:
-            messages.append({"role": "assistant", "content": llm_response})
-            conversation_history.append({
-                "role": "assistant",
-                "content": assistant_content,
-                "tool_calls": []
-            })
+            record_fields = {"tool_calls": []}
+            if assistant_content != llm_response:
+                # A <tool_call> tag that didn't parse: the conversation keeps the text before it
+                record_fields["content"] = assistant_content
+            log.append({"role": "assistant", "content": llm_response}, **record_fields)
             
             format_prompt = "Please follow the <tool_call> tag format and return a <tool_call> tag containing function name and parameters."
-            user_msg = {"role": "user", "content": format_prompt}
-            messages.append(user_msg)
-            conversation_history.append(user_msg)
+            log.append({"role": "user", "content": format_prompt})
             return {"continue": True}
         
-        messages.append({"role": "assistant", "content": preserved_content})
-        conversation_history.append({
-            "role": "assistant",
-            "content": assistant_content,
-            "tool_calls": tool_calls
-        })
+        log.append({"role": "assistant", "content": preserved_content},
+                   content=assistant_content, tool_calls=tool_calls)
         
         if any(tc["name"] == "terminate" for tc in tool_calls):
             return {"terminated": True}
         
         non_terminate_tool_calls = [tc for tc in tool_calls if tc["name"] != "terminate"]
+        return {"continue": True, "tool_calls": non_terminate_tool_calls}
+    
+    def sql_tool_name(self, messages):
+        """SQL tool the system prompt offers, used when a bare ```sql block is repaired into a call"""
+        if messages and messages[0].get("role") == "system":
+            match = re.search(r"execute_\w+?_sql", messages[0].get("content") or "")
+            if match:
+                return match.group(0)
+        return f"execute_{getattr(self.args, 'database_type', 'sqlite')}_sql"
+    
+    def apply_native_response(self, assistant_message, item, log):
+        """apply_response for --tool_protocol native: every structured tool call of the turn is returned for execution"""
+        content = assistant_message.get("content") or ""
+        raw_tool_calls = assistant_message.get("tool_calls") or []
         
-        if non_terminate_tool_calls:
-            # 执行工具调用
-            exec_results = self.execute_tool_calls(non_terminate_tool_calls)
-            
-            for i, (tool_call, exec_result) in enumerate(zip(non_terminate_tool_calls, exec_results)):
-                result_content = exec_result.get("content", str(exec_result))
-                
-                conversation_history.append({
-                    "role": "tool",
-                    "content": result_content
-                })
-                
-                messages.append({
-                    "role": "user", 
-                    "content": result_content
-                })
+        tool_calls = []
+        invalid_tool_calls = []
+        invalid_results = []
+        for raw_call in raw_tool_calls:
+            function = raw_call.get("function", {})
+            tool_call = {"id": raw_call.get("id"), "name": function.get("name"), "arguments": {}}
+            try:
+                arguments = json.loads(function.get("arguments") or "{}")
+                if not isinstance(arguments, dict):
+                    raise ValueError("arguments must be a JSON object")
+            except ValueError as e:
+                invalid_tool_calls.append(tool_call)
+                invalid_results.append({"content": f"EXECUTION RESULT of [{tool_call['name']}]:\n"
+                                                   f"Invalid JSON arguments: {str(e)}"})
+                continue
+            if tool_call["name"] in WORK_DIR_TOOLS and "work_dir" not in arguments:
+                arguments["work_dir"] = os.path.join(self.args.databases_path, item['db_id'])
+            tool_call["arguments"] = arguments
+            tool_calls.append(tool_call)
+        
+        message = {"role": "assistant", "content": content}
+        if raw_tool_calls:
+            message["tool_calls"] = raw_tool_calls
+        # The conversation keeps the parsed calls, the LLM gets the raw ones back
+        log.append(message, tool_calls=tool_calls + invalid_tool_calls)
         
-        return {"continue": True}
+        if any(tc["name"] == "terminate" for tc in tool_calls):
+            return {"terminated": True}
+        
+        if invalid_tool_calls:
+            self.apply_tool_results(invalid_tool_calls, invalid_results, log)
+        
+        if not raw_tool_calls:
+            log.append({"role": "user", "content": "Continue by calling a function, or call terminate with your final answer."})
+            return {"continue": True}
+        
+        return {"continue": True, "tool_calls": tool_calls}
+    
+    def apply_tool_results(self, tool_calls, exec_results, log):
+        """Append tool observations for executed calls"""
+        for i, (tool_call, exec_result) in enumerate(zip(tool_calls, exec_results)):
+            result_content = exec_result.get("content", str(exec_result))
+            
+            if tool_call.get("id"):
+                # Native tool calls are answered by id, one tool message per call
+                log.append({"role": "tool", "tool_call_id": tool_call["id"], "content": result_content})
+                continue
+            
+            # Text-mode observations reach the LLM as user messages; the conversation records them as tool output
+            log.append({"role": "user", "content": result_content}, role="tool")
     
     def parse_assistant_message(self, content, item):
         """Parse assistant message, separate content and tool_calls"""
@@ -85,7 +201,7 @@ class MessageProcessor:
         return pre_tool_call_content, tool_calls, preserved_content
     
     def parse_tool_calls(self, content, item):
-        """Parse tool calls and add work_dir parameter for execute_bash"""
+        """Parse tool calls and add the work_dir parameter for WORK_DIR_TOOLS"""
         tool_calls = []
         pattern = r'<tool_call>(.*?)</tool_call>'
         matches = re.findall(pattern, content, re.DOTALL)
@@ -105,7 +221,7 @@ class MessageProcessor:
                 for param_name, param_value in param_matches:
                     arguments[param_name] = param_value.strip()
                 
-                if function_name == "execute_bash" and "work_dir" not in arguments:
+                if function_name in WORK_DIR_TOOLS and "work_dir" not in arguments:
                     arguments["work_dir"] = os.path.join(self.args.databases_path, item['db_id'])
                 
                 tool_calls.append({
@@ -132,7 +248,7 @@ class MessageProcessor:
                             function_name = tool_data["function"]
                             arguments = tool_data["parameters"]
                             
-                            if function_name == "execute_bash" and "work_dir" not in arguments:
+                            if function_name in WORK_DIR_TOOLS and "work_dir" not in arguments:
                                 arguments["work_dir"] = os.path.join(self.args.databases_path, item['db_id'])
                             
                             tool_calls.append({
@@ -144,8 +260,14 @@ class MessageProcessor:
         
         return tool_calls
     
-    def execute_tool_calls(self, tool_calls):
-        """Execute tool calls via API"""
+    def _request_headers(self, rollout_key=None):
+        headers = {"Content-Type": "application/json", **tracer.propagation_headers()}
+        if rollout_key:
+            headers["X-Rollout-Key"] = rollout_key
+        return headers
+    
+    def execute_tool_calls(self, tool_calls, rollout_key=None):
+        """Execute tool calls via API; rollout_key lets the server schedule rollouts fairly"""
         if not tool_calls:
             return []
         
@@ -157,13 +279,22 @@ class MessageProcessor:
         request_body = {"tool_calls": tool_calls}
         
         try:
-            response = requests.post(
-                url, 
-                json=request_body, 
-                timeout=30,
-                headers={"Content-Type": "application/json"}
-            )
-            response.raise_for_status()
+            with tracer.span("tool_request", tools=[tc["name"] for tc in tool_calls]):
+                request_start_us = time.time_ns() // 1000
+                response = requests.post(
+                    url, 
+                    json=request_body, 
+                    timeout=30,
+                    headers=self._request_headers(rollout_key)
+                )
+                response.raise_for_status()
+                
+                # Split the request into server queue wait and execution using the Server-Timing header
+                server_timing = parse_server_timing(response.headers.get("Server-Timing"))
+                if server_timing:
+                    queue_us = int(server_timing.get("queue", 0.0) * 1000)
+                    tracer.record("tool_queue", request_start_us, queue_us)
+                    tracer.record("tool_exec", request_start_us + queue_us, int(server_timing.get("exec", 0.0) * 1000))
             
             api_response = response.json()
             
@@ -185,4 +316,40 @@ class MessageProcessor:
         except Exception as e:
             error_result = {"error": f"API error: {str(e)}"}
             debug_print(True, f"工具调用失败: {str(e)}")
-            return [error_result] * len(tool_calls)
\ No newline at end of file
+            return [error_result] * len(tool_calls)
+    
+    async def execute_tool_calls_async(self, tool_calls, client, rollout_key=None):
+        """Execute tool calls via API without blocking the event loop"""
+        if not tool_calls:
+            return []
+        
+        url = f"http://{self.args.api_host}:{self.args.api_port}/execute"
+        request_body = {"tool_calls": tool_calls}
+        
+        try:
+            with tracer.span("tool_request", tools=[tc["name"] for tc in tool_calls]):
+                request_start_us = time.time_ns() // 1000
+                response = await client.post(
+                    url,
+                    json=request_body,
+                    timeout=30,
+                    headers=self._request_headers(rollout_key)
+                )
+                response.raise_for_status()
+                
+                server_timing = parse_server_timing(response.headers.get("Server-Timing"))
+                if server_timing:
+                    queue_us = int(server_timing.get("queue", 0.0) * 1000)
+                    tracer.record("tool_queue", request_start_us, queue_us)
+                    tracer.record("tool_exec", request_start_us + queue_us, int(server_timing.get("exec", 0.0) * 1000))
+            
+            api_response = response.json()
+            
+            if isinstance(api_response, list):
+                return api_response
+            if isinstance(api_response, dict):
+                return [api_response]
+            return [{"error": f"Unexpected API response format: {api_response}"}]
+        
+        except Exception as e:
+            return [{"error": f"API error: {str(e)}"}] * len(tool_calls)
@@ -0,0 +1,153 @@
+import logging
+import queue
+import threading
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+WARMUP_TIMEOUT = 120
+
+
+class InstancePrefetcher:
+    """Prepares the next `lookahead` instances of the queue while earlier ones run.
+
+    Instances start in the order they were queued, so a background thread
+    stays up to `lookahead` instances ahead of the last one started: it
+    builds their initial prompts with `prepare(item)` (which reads their
+    schema, knowledge and listing files into the prompt asset cache) and
+    asks the tool server to warm the files of their databases. The first
+    call also warms the connection pool of `database_type`. Warm-up requests
+    are sent from a second thread, so a slow one doesn't hold up the prompts.
+    A rollout that starts before its instance was prepared just does the
+    work itself.
+    """
+
+    def __init__(self, items: List[Dict[str, Any]], lookahead: int, prepare: Callable[[Dict[str, Any]], None],
+                 warmup_url: Optional[str] = None, database_type: Optional[str] = None, connections: int = 1):
+        self.items = items
+        self.lookahead = lookahead
+        self.prepare = prepare
+        self.warmup_url = warmup_url
+        self.database_type = database_type
+        self.connections = connections
+        self.stats = Counter()
+        self._position = {item["instance_id"]: i for i, item in enumerate(items)}
+        self._prepared = set()
+        self._warmed = set()
+        self._frontier = 0  # Index of the first instance not started yet
+        self._next = 0  # Index of the next instance to prepare
+        self._stopped = False
+        self._condition = threading.Condition()
+        self._thread = None
+        self._warm_queue = queue.Queue()
+        self._warm_thread = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.lookahead > 0 and bool(self.items)
+
+    def start(self):
+        if self.enabled and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="prefetcher", daemon=True)
+            self._thread.start()
+            if self.warmup_url:
+                self._warm_thread = threading.Thread(target=self._warm_loop, name="prefetcher-warmup", daemon=True)
+                self._warm_thread.start()
+
+    def started(self, instance_id: str):
+        """Called when a rollout of the instance starts; moves the lookahead window"""
+        position = self._position.get(instance_id)
+        if position is None:
+            return
+        with self._condition:
+            if position >= self._frontier:
+                # Each instance is counted once, at its first rollout
+                self.stats["ready" if instance_id in self._prepared else "cold"] += 1
+                self._frontier = position + 1
+                self._condition.notify()
+
+    def _batch(self) -> List[Dict[str, Any]]:
+        """Instances to prepare next, waiting until the window has room; [] once stopped or done"""
+        with self._condition:
+            while not self._stopped:
+                # Instances that already started are left to their rollouts
+                self._next = max(self._next, self._frontier)
+                end = min(self._frontier + self.lookahead, len(self.items))
+                if self._next < end:
+                    batch = self.items[self._next:end]
+                    self._next = end
+                    return batch
+                if self._next >= len(self.items):
+                    return []
+                self._condition.wait()
+            return []
+
+    def _run(self):
+        while True:
+            batch = self._batch()
+            if not batch:
+                return
+            if self._warm_thread is not None:
+                self._warm_queue.put(batch)
+            for item in batch:
+                try:
+                    self.prepare(item)
+                except Exception as e:
+                    # Built (and reported) again when its rollouts start
+                    self._count(failed=1)
+                    logger.warning(f"Could not prefetch {item['instance_id']}: {e}")
+                    continue
+                with self._condition:
+                    self._prepared.add(item["instance_id"])
+                    self.stats["prepared"] += 1
+
+    def _warm_loop(self):
+        while True:
+            batch = self._warm_queue.get()
+            if batch is None or self._stopped:
+                return
+            self._warm(batch)
+
+    def _warm(self, batch: List[Dict[str, Any]]):
+        """POST the databases of `batch` not warmed yet to the tool server's /warmup"""
+        if not self.warmup_url:
+            return
+        targets = []
+        if self.database_type and self.database_type not in self._warmed:
+            self._warmed.add(self.database_type)
+            targets.append(self.database_type)
+        for item in batch:
+            db_id = item.get("db_id")
+            if db_id and db_id not in self._warmed:
+                self._warmed.add(db_id)
+                targets.append(db_id)
+        if not targets:
+            return
+        try:
+            # db_ids are read under the server's own --databases_path; connections are capped by its --warmup_connections
+            body = {"targets": targets, "connections": self.connections}
+            response = requests.post(self.warmup_url, json=body, timeout=WARMUP_TIMEOUT)
+            response.raise_for_status()
+            report = response.json()
+            self._count(warmed=report.get("targets", 0) - report.get("failed", 0), warm_failed=report.get("failed", 0))
+        except Exception as e:
+            self._count(warm_failed=len(targets))
+            logger.warning(f"Tool server warm-up failed for {targets}: {e}")
+
+    def _count(self, **counts):
+        with self._condition:
+            self.stats.update(counts)
+
+    def stop(self):
+        """Stop preparing instances; a warm-up request in flight is not waited for"""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._warm_queue.put(None)
+
+    def summary(self) -> Dict[str, int]:
+        with self._condition:
+            return {"prepared": 0, "failed": 0, "warmed": 0, "warm_failed": 0, "ready": 0, "cold": 0, **self.stats}
@@ -0,0 +1,101 @@
+import os
+import threading
+from collections import OrderedDict, Counter
+from typing import Any, Callable, Optional
+
+
+class PromptAssetCache:
+    """In-process cache of the files prompts are built from: system prompts,
+    schema.sql files, external knowledge documents and database directory
+    listings.
+
+    Every lookup stats the path and reuses the cached value only if its
+    mtime and size are unchanged, so edited files are picked up without a
+    restart. Entries are evicted least recently used once their total
+    length (in characters) exceeds `max_bytes`. Shared by all rollouts and
+    both prompt builders, so hundreds of instances on a few dozen databases
+    read each file once.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.stats = Counter()
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def _lookup(self, key, stamp):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == stamp:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry[1]
+            self.stats["stale" if entry is not None else "misses"] += 1
+            return None
+
+    def _store(self, key, stamp, value, size: int = None):
+        size = len(value) if size is None else size
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= previous[2]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (stamp, value, size)
+            self._size += size
+            while self._size > self.max_bytes:
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._size -= evicted_size
+                self.stats["evictions"] += 1
+
+    @staticmethod
+    def _stamp(path: str):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def read_text(self, path: str) -> Optional[str]:
+        """Stripped contents of a text file, or None if it doesn't exist"""
+        stamp = self._stamp(path)
+        if stamp is None:
+            return None
+        key = ("file", path)
+        text = self._lookup(key, stamp)
+        if text is None:
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read().strip()
+            self._store(key, stamp, text)
+        return text
+
+    def list_dir(self, path: str) -> str:
+        """Entries of a directory one per line, sorted and without dotfiles like `ls`; "" if it doesn't exist"""
+        stamp = self._stamp(path)
+        if stamp is None:
+            return ""
+        key = ("dir", path)
+        listing = self._lookup(key, stamp)
+        if listing is None:
+            listing = "\n".join(sorted(name for name in os.listdir(path) if not name.startswith(".")))
+            self._store(key, stamp, listing)
+        return listing
+
+    def load(self, path: str, build: Callable[[str], Any], kind: str = "derived"):
+        """Value `build(path)` derives from a file (e.g. a parsed index), cached and validated like
+        read_text and counted at the file's size; None if the file doesn't exist"""
+        stamp = self._stamp(path)
+        if stamp is None:
+            return None
+        key = (kind, path)
+        value = self._lookup(key, stamp)
+        if value is None:
+            value = build(path)
+            self._store(key, stamp, value, stamp[1])
+        return value
+
+    def summary(self):
+        with self._lock:
+            return {"hits": 0, "misses": 0, "stale": 0, "evictions": 0, **self.stats,
+                    "entries": len(self._entries), "bytes": self._size}
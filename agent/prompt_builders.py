@@ -1,12 +1,27 @@
 import os
-import subprocess
+
+from prompt_cache import LayeredText
+from prompt_assets import PromptAssetCache
+from tool_schemas import with_search_schema_tool, with_recall_tool
 
 class BasePromptBuilder:
     
+    def __init__(self, args, assets: PromptAssetCache = None):
+        self.args = args
+        # System prompt, knowledge and listings are read through the shared cache instead of from disk per item
+        self.assets = assets or PromptAssetCache()
+    
     def load_system_prompt(self, args):
         """Load system prompt from file"""
-        with open(args.system_prompt_path, 'r', encoding='utf-8') as f:
-            return f.read().strip()
+        system_prompt = self.assets.read_text(args.system_prompt_path)
+        if system_prompt is None:
+            raise FileNotFoundError(f"System prompt not found: {args.system_prompt_path}")
+        if getattr(args, 'schema_search', False):
+            system_prompt = with_search_schema_tool(system_prompt)
+        if getattr(args, 'context_budget_tokens', 0) > 0:
+            # Compacted observations point the model at recall_observation
+            system_prompt = with_recall_tool(system_prompt)
+        return system_prompt
     
     def load_external_knowledge(self, external_knowledge_file, args):
         """Load external knowledge from file"""
@@ -14,13 +29,10 @@ class BasePromptBuilder:
             return None
         
         knowledge_path = os.path.join(args.documents_path, external_knowledge_file)
-        if os.path.exists(knowledge_path):
-            with open(knowledge_path, 'r', encoding='utf-8') as f:
-                return f.read().strip()
-        return None
+        return self.assets.read_text(knowledge_path)
     
     
-    def build_initial_prompt(self, item, args):
+    def build_initial_prompt(self, item, conversation_history=None):
         raise NotImplementedError
 
 class SpiderAgentPromptBuilder(BasePromptBuilder):
@@ -29,43 +41,44 @@ class SpiderAgentPromptBuilder(BasePromptBuilder):
         """Get database directory listing"""
         db_path = os.path.join(args.databases_path, db_id)
         try:
-            result = subprocess.run(['ls', db_path], capture_output=True, text=True)
-            return result.stdout.strip()
+            return self.assets.list_dir(db_path)
         except Exception as e:
             return f"Error listing database: {str(e)}"
 
     
-    def build_initial_prompt(self, item, args):
+    def build_initial_prompt(self, item, conversation_history=None):
+        args = self.args
         system_prompt = self.load_system_prompt(args)
         external_knowledge_content = self.load_external_knowledge(item.get('external_knowledge'), args)
         db_info = self.get_database_info(item['db_id'], args)
         
-        user_content = f"""Question: {item['instruction']}
-External Knowledge: {external_knowledge_content if external_knowledge_content else 'None'}
-
-You are in the folder contains schema, the database name is {item['db_id']}, the database contains schema_name:
+        # Layers run from most to least shared (database, knowledge, question) so rollouts and instances
+        # on the same database send an identical prefix that provider prompt caches can reuse
+        database_layer = f"""You are in the folder contains schema, the database name is {item['db_id']}, the database contains schema_name:
 ```bash
 ls {os.path.join(args.databases_path, item['db_id'])}
 ```
 ```output
 {db_info}
-```
+```"""
+        knowledge_layer = f"External Knowledge: {external_knowledge_content if external_knowledge_content else 'None'}"
+        task_layer = f"""Question: {item['instruction']}
 
 When referencing tables, you must use the fully qualified three-part naming convention: database_name.schema_name.table_name. Now help me write the SQL query to answer the question. """
 
         return [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_content}
+            {"role": "system", "content": LayeredText([system_prompt])},
+            {"role": "user", "content": LayeredText([database_layer, knowledge_layer, task_layer])}
         ]
 
 
 
-def get_prompt_builder(strategy):
+def get_prompt_builder(strategy, args, assets=None):
     builders = {
-        "spider-agent": SpiderAgentPromptBuilder(),
-        # "database": DatabasePromptBuilder(),
-        # "multi_step": MultiStepPromptBuilder(),
-        # "reasoning": ReasoningPromptBuilder(),
+        "spider-agent": SpiderAgentPromptBuilder,
+        # "database": DatabasePromptBuilder,
+        # "multi_step": MultiStepPromptBuilder,
+        # "reasoning": ReasoningPromptBuilder,
     }
     
-    return builders.get(strategy, SpiderAgentPromptBuilder())
\ No newline at end of file
+    return builders.get(strategy, SpiderAgentPromptBuilder)(args, assets)
\ No newline at end of file
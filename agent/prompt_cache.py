@@ -0,0 +1,108 @@
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional
+
+CACHE_HINT_MODES = ("none", "openai", "anthropic")
+# Anthropic accepts at most four cache_control breakpoints per request
+MAX_BREAKPOINTS = 4
+
+
+class LayeredText(str):
+    """Message text built from layers ordered from most to least shared
+    (system prompt, database schema, knowledge, task).
+
+    It is a plain string to everything else; apply_cache_hints() uses the
+    layer boundaries to place provider cache breakpoints.
+    """
+
+    def __new__(cls, layers: List[str], separator: str = "\n\n"):
+        layers = [layer for layer in layers if layer]
+        text = super().__new__(cls, separator.join(layers))
+        text.layers = layers
+        text.separator = separator
+        return text
+
+    def __reduce__(self):
+        return LayeredText, (self.layers, self.separator)
+
+    def blocks(self) -> List[Dict[str, Any]]:
+        last = len(self.layers) - 1
+        return [{"type": "text", "text": layer if i == last else layer + self.separator}
+                for i, layer in enumerate(self.layers)]
+
+
+def prefix_key(messages: List[Dict[str, Any]], layers: int = 2) -> str:
+    """Routing key shared by requests with the same cacheable prefix (by default system prompt and schema layers)"""
+    digest = hashlib.sha1()
+    remaining = layers
+    for message in messages:
+        for layer in getattr(message.get("content"), "layers", [])[:remaining]:
+            digest.update(layer.encode("utf-8"))
+            remaining -= 1
+        if remaining <= 0:
+            break
+    return digest.hexdigest()[:32]
+
+
+def _with_cache_control(block: Dict[str, Any]) -> Dict[str, Any]:
+    return {**block, "cache_control": {"type": "ephemeral"}}
+
+
+def apply_cache_hints(messages: List[Dict[str, Any]], mode: str) -> List[Dict[str, Any]]:
+    """Return the messages annotated with Anthropic-style cache_control breakpoints.
+
+    Breakpoints go after each layer in order, most shared first (the task
+    layer usually falls past the limit), and one on the last message so the
+    conversation so far is cached for the next round.
+    """
+    if mode != "anthropic" or not messages:
+        return messages
+    budget = MAX_BREAKPOINTS - 1
+    annotated = []
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, LayeredText):
+            blocks = content.blocks()
+            for j in range(min(budget, len(blocks))):
+                blocks[j] = _with_cache_control(blocks[j])
+            budget -= min(budget, len(blocks))
+            message = {**message, "content": blocks}
+        annotated.append(message)
+
+    last = annotated[-1]
+    content = last.get("content")
+    if isinstance(content, str):
+        annotated[-1] = {**last, "content": [_with_cache_control({"type": "text", "text": content})]}
+    elif isinstance(content, list) and content:
+        annotated[-1] = {**last, "content": content[:-1] + [_with_cache_control(content[-1])]}
+    return annotated
+
+
+class PromptCacheStats:
+    """Prompt-cache accounting from response usage (OpenAI prompt_tokens_details.cached_tokens,
+    Anthropic cache_read_input_tokens / cache_creation_input_tokens)"""
+
+    def __init__(self):
+        self.stats = {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0, "cache_write_tokens": 0,
+                      "hits": 0, "misses": 0}
+        self._lock = threading.Lock()
+
+    def record(self, usage: Optional[Dict[str, Any]]):
+        if not usage:
+            return
+        details = usage.get("prompt_tokens_details") or {}
+        cached = details.get("cached_tokens") or usage.get("cache_read_input_tokens") or 0
+        written = usage.get("cache_creation_input_tokens") or 0
+        prompt = usage.get("prompt_tokens") or usage.get("input_tokens") or 0
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["prompt_tokens"] += prompt
+            self.stats["cached_tokens"] += cached
+            self.stats["cache_write_tokens"] += written
+            self.stats["hits" if cached else "misses"] += 1
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            prompt = self.stats["prompt_tokens"]
+            ratio = self.stats["cached_tokens"] / prompt if prompt else 0.0
+            return {**self.stats, "cached_ratio": round(ratio, 3)}
@@ -0,0 +1,208 @@
+import asyncio
+import re
+import threading
+import time
+import logging
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+
+
+def parse_reset_duration(value: Optional[str]) -> Optional[float]:
+    """Parse OpenAI-style reset durations ("1s", "6m0s", "20ms", "0.5") into seconds"""
+    if value is None:
+        return None
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    scale = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+    return sum(float(amount) * scale[unit] for amount, unit in parts)
+
+
+def _header(headers, *names) -> Optional[str]:
+    if not headers:
+        return None
+    for name in names:
+        value = headers.get(name)
+        if value is not None:
+            return value
+    return None
+
+
+def _to_float(value: Optional[str]) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class _TokenBucket:
+    """Per-minute budget refilled continuously; capacity 0 means unlimited"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        if self.capacity > 0:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60.0)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        if self.capacity <= 0 or self.level >= min(amount, self.capacity):
+            return 0.0
+        return (min(amount, self.capacity) - self.level) * 60.0 / self.capacity
+
+    def set_limit(self, per_minute: float):
+        if per_minute > 0 and per_minute != self.capacity:
+            if self.capacity <= 0:
+                self.level = per_minute
+            self.capacity = per_minute
+            self.level = min(self.level, per_minute)
+
+
+class LLMRateLimiter:
+    """Shared admission control for LLM calls from every rollout thread or task.
+
+    Tracks requests-per-minute and tokens-per-minute budgets (configured, or
+    learned from x-ratelimit-* headers), honors retry-after with one shared
+    cooldown instead of per-thread backoff, and adapts the number of in-flight
+    requests with AIMD: +1/limit per success, halved on a 429 (at most once
+    per cooldown window).
+    """
+
+    def __init__(self, max_concurrency: int, rpm: float = 0, tpm: float = 0, min_concurrency: int = 1,
+                 initial_concurrency: Optional[int] = None, cooldown: float = 1.0):
+        self.max_concurrency = max(max_concurrency, 1)
+        self.min_concurrency = max(min(min_concurrency, self.max_concurrency), 1)
+        self.limit = float(initial_concurrency or self.max_concurrency)
+        self.requests = _TokenBucket(rpm)
+        self.tokens = _TokenBucket(tpm)
+        self.default_cooldown = cooldown
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self.last_decrease = 0.0
+        # Running estimate of completion tokens, charged up front and corrected on release
+        self.completion_tokens_estimate = 500.0
+        self.stats = {"requests": 0, "rate_limited": 0, "wait_seconds": 0.0, "decreases": 0}
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+
+    def _try_acquire(self, estimated_tokens: float) -> float:
+        """Admit the request and return 0, or return how long to wait before trying again"""
+        now = time.monotonic()
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.in_flight >= int(self.limit):
+            return -1.0  # wait for a release
+        wait = max(self.requests.wait_time(1), self.tokens.wait_time(estimated_tokens))
+        if wait > 0:
+            return wait
+        self.requests.level -= 1
+        self.tokens.level -= estimated_tokens
+        self.in_flight += 1
+        self.stats["requests"] += 1
+        return 0.0
+
+    def estimate_tokens(self, messages) -> float:
+        chars = 0
+        for message in messages:
+            content = message.get("content") if isinstance(message, dict) else getattr(message, "content", None)
+            if isinstance(content, str):
+                chars += len(content)
+            elif isinstance(content, list):
+                chars += sum(len(part.get("text", "")) for part in content if isinstance(part, dict))
+        return chars / 4.0 + self.completion_tokens_estimate
+
+    def acquire(self, estimated_tokens: float = 0.0) -> float:
+        """Block until a request may be sent; returns the estimate to pass to release()"""
+        start = time.monotonic()
+        with self._cond:
+            while True:
+                wait = self._try_acquire(estimated_tokens)
+                if wait == 0.0:
+                    break
+                self._cond.wait(None if wait < 0 else wait)
+            self.stats["wait_seconds"] += time.monotonic() - start
+        return estimated_tokens
+
+    async def acquire_async(self, estimated_tokens: float = 0.0) -> float:
+        start = time.monotonic()
+        while True:
+            with self._lock:
+                wait = self._try_acquire(estimated_tokens)
+                if wait == 0.0:
+                    self.stats["wait_seconds"] += time.monotonic() - start
+                    return estimated_tokens
+            # Releases notify threads only; poll briefly while waiting for a slot
+            await asyncio.sleep(0.05 if wait < 0 else wait)
+
+    def release(self, estimated_tokens: float = 0.0, usage: Optional[Dict[str, Any]] = None, headers=None,
+                rate_limited: bool = False, success: bool = True):
+        """Report the outcome of an admitted request; `success` is False for a request that failed"""
+        with self._cond:
+            self.in_flight = max(self.in_flight - 1, 0)
+            now = time.monotonic()
+            if not success:
+                if self.tokens.capacity > 0:
+                    # Failed request: nothing was generated, so give the up-front charge back
+                    self.tokens.level = min(self.tokens.capacity, self.tokens.level + estimated_tokens)
+            elif usage:
+                total = usage.get("total_tokens") or 0
+                completion = usage.get("completion_tokens") or 0
+                # Correct the up-front charge with what the request really used
+                self.tokens.level += estimated_tokens - total
+                self.completion_tokens_estimate = 0.9 * self.completion_tokens_estimate + 0.1 * completion
+            # A successful request that reported no usage keeps its up-front charge
+            self._apply_headers(headers, now)
+            if rate_limited:
+                self.stats["rate_limited"] += 1
+                retry_after = self._retry_after(headers)
+                self.blocked_until = max(self.blocked_until, now + (retry_after or self.default_cooldown))
+                if now - self.last_decrease >= max(retry_after or 0.0, self.default_cooldown):
+                    self.limit = max(self.min_concurrency, self.limit / 2)
+                    self.last_decrease = now
+                    self.stats["decreases"] += 1
+                    logger.warning(f"LLM rate limited; concurrency limit lowered to {int(self.limit)}")
+            else:
+                self.limit = min(self.max_concurrency, self.limit + 1.0 / max(self.limit, 1.0))
+            self._cond.notify_all()
+
+    def _retry_after(self, headers) -> Optional[float]:
+        retry_ms = _to_float(_header(headers, "retry-after-ms"))
+        if retry_ms is not None:
+            return retry_ms / 1000.0
+        return parse_reset_duration(_header(headers, "retry-after"))
+
+    def _apply_headers(self, headers, now: float):
+        """Sync budgets with the provider's view (OpenAI x-ratelimit-*, Anthropic anthropic-ratelimit-*)"""
+        if not headers:
+            return
+        for bucket, kind in ((self.requests, "requests"), (self.tokens, "tokens")):
+            limit = _to_float(_header(headers, f"x-ratelimit-limit-{kind}", f"anthropic-ratelimit-{kind}-limit"))
+            remaining = _to_float(_header(headers, f"x-ratelimit-remaining-{kind}",
+                                          f"anthropic-ratelimit-{kind}-remaining"))
+            if limit:
+                bucket.refill(now)
+                bucket.set_limit(limit)
+            if remaining is not None and bucket.capacity > 0:
+                bucket.level = min(bucket.level, remaining)
+                if remaining <= 0:
+                    reset = parse_reset_duration(_header(headers, f"x-ratelimit-reset-{kind}"))
+                    if reset:
+                        self.blocked_until = max(self.blocked_until, now + reset)
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, "concurrency_limit": int(self.limit), "rpm": self.requests.capacity,
+                    "tpm": self.tokens.capacity}
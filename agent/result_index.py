@@ -0,0 +1,233 @@
+import glob
+import json
+import os
+import sqlite3
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+from early_stop import terminate_answer, vote_key
+
+INDEX_FILE = "index.sqlite"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    source TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    instance_id TEXT NOT NULL,
+    rollout_idx INTEGER,
+    terminated INTEGER NOT NULL,
+    cancelled INTEGER NOT NULL,
+    vote TEXT,
+    rounds INTEGER
+);
+CREATE INDEX IF NOT EXISTS results_by_source ON results (source);
+CREATE TABLE IF NOT EXISTS sources (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    ident INTEGER NOT NULL
+);
+"""
+
+
+def count_rounds(conversation: Optional[List[Dict[str, Any]]]) -> int:
+    """LLM rounds a rollout took: the assistant messages of its conversation"""
+    return sum(1 for message in conversation or [] if isinstance(message, dict) and message.get("role") == "assistant")
+
+
+def summarize_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    """What resume needs from a result: its rollout, whether it terminated, its answer's vote, and how
+    many rounds it took (for --task_order)"""
+    vote = result.get("vote")
+    if vote is None and result.get("terminated"):
+        answer = terminate_answer(result.get("conversation"))
+        vote = vote_key(answer) if answer else None
+    return {
+        "instance_id": result["instance_id"],
+        "rollout_idx": result.get("rollout_idx"),
+        "terminated": bool(result.get("terminated", False)),
+        "cancelled": bool(result.get("cancelled", False)),
+        "vote": vote,
+        "rounds": count_rounds(result.get("conversation")),
+    }
+
+
+def _summaries(conn: sqlite3.Connection) -> List[Dict[str, Any]]:
+    rows = conn.execute(
+        "SELECT instance_id, rollout_idx, terminated, cancelled, vote, rounds FROM results ORDER BY source, offset"
+    ).fetchall()
+    return [{"instance_id": instance_id, "rollout_idx": rollout_idx, "terminated": bool(terminated),
+             "cancelled": bool(cancelled), "vote": vote, "rounds": rounds}
+            for instance_id, rollout_idx, terminated, cancelled, vote, rounds in rows]
+
+
+def read_index_summaries(output_folder: str) -> Optional[List[Dict[str, Any]]]:
+    """Summaries from another run's index, opened read-only and left exactly as it is; None when there
+    is no index, or it predates round counts, so the caller reads the result files instead"""
+    path = os.path.join(output_folder, INDEX_FILE)
+    if not os.path.exists(path):
+        return None
+    uri = f"file:{quote(os.path.abspath(path))}?mode=ro"
+    if not os.path.exists(path + "-wal"):
+        # No writer has it open: read it as a plain file, or SQLite would leave -wal/-shm files behind
+        uri += "&immutable=1"
+    try:
+        conn = sqlite3.connect(uri, uri=True)
+    except sqlite3.Error:
+        return None
+    try:
+        if "rounds" not in {row[1] for row in conn.execute("PRAGMA table_info(results)")}:
+            return None
+        return _summaries(conn)
+    except sqlite3.Error:
+        return None
+    finally:
+        conn.close()
+
+
+class ResultIndex:
+    """Completion index of an output folder, kept in <output_folder>/index.sqlite.
+
+    Holds one small row per saved result, written together with the result,
+    so resuming reads the index instead of parsing every conversation. The
+    result files stay the source of truth: sync() indexes whatever the index
+    hasn't seen (the tail of results.jsonl past the indexed offset, and
+    per-instance JSON files whose size or mtime changed), and rebuild()
+    re-derives the whole index from the files.
+    """
+
+    def __init__(self, output_folder: str, results_file: str):
+        os.makedirs(output_folder, exist_ok=True)
+        self.output_folder = output_folder
+        self.results_file = results_file
+        self.path = os.path.join(output_folder, INDEX_FILE)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # The index can always be caught up from the result files, so it doesn't need a full fsync per commit
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        if "rounds" not in {row[1] for row in self._conn.execute("PRAGMA table_info(results)")}:
+            # Index written before round counts were recorded: emptied, so the next sync() re-derives it
+            with self._conn:
+                self._conn.execute("ALTER TABLE results ADD COLUMN rounds INTEGER")
+                self._conn.execute("DELETE FROM results")
+                self._conn.execute("DELETE FROM sources")
+
+    def _insert(self, source: str, offset: int, summary: Dict[str, Any]):
+        self._conn.execute(
+            "INSERT INTO results (source, offset, instance_id, rollout_idx, terminated, cancelled, vote, rounds) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (source, offset, summary["instance_id"], summary["rollout_idx"], int(summary["terminated"]),
+             int(summary["cancelled"]), summary["vote"], summary["rounds"])
+        )
+
+    def _set_source(self, source: str, size: int, ident: int):
+        self._conn.execute("INSERT OR REPLACE INTO sources (path, size, ident) VALUES (?, ?, ?)", (source, size, ident))
+
+    def _drop_source(self, source: str):
+        self._conn.execute("DELETE FROM results WHERE source = ?", (source,))
+        self._conn.execute("DELETE FROM sources WHERE path = ?", (source,))
+
+    def record_appended(self, entries: List[Tuple[int, Dict[str, Any]]], end: int, ident: int):
+        """Index results just appended to results.jsonl at the given byte offsets"""
+        with self._lock, self._conn:
+            for offset, result in entries:
+                self._insert(self.results_file, offset, summarize_result(result))
+            self._set_source(self.results_file, end, ident)
+
+    def record_file(self, file_name: str, results: List[Dict[str, Any]]):
+        """Re-index a per-instance JSON file that was just rewritten"""
+        stat = os.stat(os.path.join(self.output_folder, file_name))
+        with self._lock, self._conn:
+            self._drop_source(file_name)
+            for position, result in enumerate(results):
+                self._insert(file_name, position, summarize_result(result))
+            self._set_source(file_name, stat.st_size, stat.st_mtime_ns)
+
+    def _indexed_sources(self) -> Dict[str, Tuple[int, int]]:
+        return {path: (size, ident) for path, size, ident in self._conn.execute("SELECT path, size, ident FROM sources")}
+
+    def _sync_log(self, indexed: Optional[Tuple[int, int]]) -> int:
+        path = os.path.join(self.output_folder, self.results_file)
+        if not os.path.exists(path):
+            if indexed:
+                self._drop_source(self.results_file)
+            return 0
+        stat = os.stat(path)
+        start = indexed[0] if indexed else 0
+        if indexed and (indexed[1] != stat.st_ino or stat.st_size < indexed[0]):
+            # Replaced or truncated (e.g. compacted): index it from scratch
+            self._drop_source(self.results_file)
+            start = 0
+        if start == stat.st_size and indexed:
+            return 0
+
+        added = 0
+        offset = start
+        with open(path, "rb") as f:
+            f.seek(start)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Still being written, or torn; picked up (or skipped) once a newline follows
+                    break
+                try:
+                    result = json.loads(line)
+                except ValueError:
+                    result = None
+                if isinstance(result, dict) and "instance_id" in result:
+                    self._insert(self.results_file, offset, summarize_result(result))
+                    added += 1
+                offset += len(line)
+        self._set_source(self.results_file, offset, stat.st_ino)
+        return added
+
+    def _sync_file(self, file_name: str, indexed: Optional[Tuple[int, int]]) -> int:
+        path = os.path.join(self.output_folder, file_name)
+        stat = os.stat(path)
+        if indexed == (stat.st_size, stat.st_mtime_ns):
+            return 0
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"Error loading {path}: {e}")
+            return 0
+        results = [r for r in (data if isinstance(data, list) else [data]) if isinstance(r, dict) and "instance_id" in r]
+        self._drop_source(file_name)
+        for position, result in enumerate(results):
+            self._insert(file_name, position, summarize_result(result))
+        self._set_source(file_name, stat.st_size, stat.st_mtime_ns)
+        return len(results)
+
+    def sync(self) -> int:
+        """Index results the index hasn't seen; returns how many were parsed"""
+        with self._lock, self._conn:
+            indexed = self._indexed_sources()
+            added = self._sync_log(indexed.pop(self.results_file, None))
+            for file_path in sorted(glob.glob(os.path.join(self.output_folder, "*.json"))):
+                file_name = os.path.basename(file_path)
+                added += self._sync_file(file_name, indexed.pop(file_name, None))
+            for stale in indexed:
+                self._drop_source(stale)
+            return added
+
+    def rebuild(self) -> int:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM results")
+            self._conn.execute("DELETE FROM sources")
+        return self.sync()
+
+    def terminated_counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT instance_id, SUM(terminated) FROM results GROUP BY instance_id")
+            return defaultdict(int, {instance_id: count for instance_id, count in rows})
+
+    def summaries(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return _summaries(self._conn)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,66 @@
+import hashlib
+import json
+from collections import OrderedDict
+from copy import deepcopy
+from typing import Any, Dict, List
+
+from round_log import RoundLog
+
+
+class Fork:
+    """Conversation state of one rollout inside a --fork_rollouts group"""
+
+    def __init__(self, rollout_idx: int, log: RoundLog, loop_state: Dict[str, Any] = None):
+        self.rollout_idx = rollout_idx
+        self.log = log
+        self.loop_state = loop_state
+        self.rounds = 0
+        self.status = "running"
+        self.error = None
+        self.round_failed = None
+        self.pending_tool_calls = None
+        self.vote = None
+
+    def fail(self, error: str, round_num: int = None):
+        self.status = "error"
+        self.error = error
+        self.round_failed = round_num
+
+    def result(self, instance_id: str) -> Dict[str, Any]:
+        if self.status == "error":
+            result = {"instance_id": instance_id, "rollout_idx": self.rollout_idx, "error": self.error,
+                      "terminated": False}
+            if self.round_failed is not None:
+                result["round_failed"] = self.round_failed
+            return result
+        result = {
+            "instance_id": instance_id,
+            "rollout_idx": self.rollout_idx,
+            "conversation": self.log.conversation(),
+            "final_messages": self.log.messages,
+            "terminated": self.status == "terminated",
+        }
+        if self.vote:
+            result["vote"] = self.vote
+        if self.status == "cancelled":
+            result["cancelled"] = True
+        return result
+
+
+def history_key(messages: List[Dict[str, Any]]) -> str:
+    encoded = json.dumps(messages, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(encoded.encode("utf-8")).hexdigest()
+
+
+def cluster_forks(forks: List[Fork]) -> List[List[Fork]]:
+    """Group forks whose message histories are identical, keeping first-seen order"""
+    clusters = OrderedDict()
+    for fork in forks:
+        clusters.setdefault(history_key(fork.log.messages), []).append(fork)
+    return list(clusters.values())
+
+
+def share_context_state(cluster: List[Fork]):
+    """Forks sampled from one view must keep eliding identically until their histories diverge"""
+    for fork in cluster[1:]:
+        fork.log.context_state = deepcopy(cluster[0].log.context_state)
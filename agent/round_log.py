@@ -0,0 +1,53 @@
+from typing import Any, Dict, List, Optional
+
+
+class RoundLog:
+    """Append-only log of one rollout's messages, read through views.
+
+    Every message is stored once, in the form sent to the LLM (`messages`).
+    Where the saved conversation records a message differently (parsed tool
+    calls, the reasoning before a text-mode tool call, `tool` instead of
+    `user` for a text-mode observation) only the differing fields are kept
+    alongside it. conversation() is the saved view and compacted() the view
+    after context compaction. Appended messages are never modified, so forks
+    share their common prefix and views are lists of references, not copies.
+    """
+
+    def __init__(self, messages: List[Dict[str, Any]] = (), context_state: Optional[Dict[str, Any]] = None):
+        self.messages = list(messages)
+        self.context_state = context_state
+        self._overrides = {}
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def append(self, message: Dict[str, Any], **record_fields):
+        """Append a message; `record_fields` are the fields the saved conversation has instead"""
+        if record_fields:
+            self._overrides[len(self.messages)] = record_fields
+        self.messages.append(message)
+
+    def record(self, index: int) -> Dict[str, Any]:
+        """The message at `index` as saved in the conversation"""
+        if index < 0:
+            index += len(self.messages)
+        override = self._overrides.get(index)
+        return {**self.messages[index], **override} if override else self.messages[index]
+
+    def conversation(self, start: int = 0) -> List[Dict[str, Any]]:
+        """The saved conversation from `start` (negative counts from the end)"""
+        if start < 0:
+            start = max(len(self.messages) + start, 0)
+        return [self.record(i) for i in range(start, len(self.messages))]
+
+    def compacted(self, context_manager) -> List[Dict[str, Any]]:
+        """What is sent to the LLM: `messages` with old observations elided by the context manager"""
+        return context_manager.view(self.messages, self.context_state)
+
+    def entries(self, start: int = 0) -> List[List[Any]]:
+        """[message, record fields or None] pairs from `start`, for checkpoints"""
+        return [[self.messages[i], self._overrides.get(i)] for i in range(start, len(self.messages))]
+
+    def extend(self, entries: List[List[Any]]):
+        for message, record_fields in entries:
+            self.append(message, **(record_fields or {}))
@@ -0,0 +1,217 @@
+import hashlib
+import json
+import math
+import os
+import re
+import sys
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+# The CREATE-statement splitter is shared with the tool server's search_schema index
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, _PROJECT_ROOT)
+from servers.utils.schema_ddl import split_schema  # noqa: E402
+
+SCHEMA_FILE = os.path.join("database_description", "schema.sql")
+# Indexes live outside the database directories (they are the agent's work_dir), one file per database;
+# SCHEMA_INDEX_DIR or main.py --schema_index_dir moves them
+DEFAULT_INDEX_DIR = os.path.join(os.path.expanduser("~"), ".cache", "spider-agent", "schema_index")
+INDEX_VERSION = 1
+
+# Table-name tokens count this many times, so a table named after a word in the question ranks first
+NAME_BOOST = 3
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_SQL_WORDS = {
+    "create", "table", "view", "if", "not", "exists", "primary", "key", "foreign", "references", "null",
+    "default", "unique", "constraint", "check", "int", "integer", "bigint", "smallint", "tinyint", "text",
+    "varchar", "char", "nvarchar", "real", "float", "double", "decimal", "numeric", "number", "boolean",
+    "bool", "date", "datetime", "timestamp", "time", "blob", "string", "variant", "as", "on", "and", "or",
+    "the", "of", "to", "in", "is", "for", "with", "by", "an", "a", "comment", "autoincrement", "collate",
+}
+
+_index_dir = os.environ.get("SCHEMA_INDEX_DIR") or DEFAULT_INDEX_DIR
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased words of identifiers and prose; snake_case and camelCase are split, plurals folded"""
+    tokens = []
+    for word in re.findall(r"[A-Za-z0-9]+", text or ""):
+        for part in re.findall(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+", word):
+            part = part.lower()
+            if len(part) < 2 or part in _SQL_WORDS:
+                continue
+            if len(part) > 4 and part.endswith("ies"):
+                part = part[:-3] + "y"
+            elif len(part) > 3 and part.endswith("s") and not part.endswith("ss"):
+                part = part[:-1]
+            tokens.append(part)
+    return tokens
+
+
+class SchemaIndex:
+    """BM25 index over the tables of one database's schema.sql.
+
+    Each table is a document of its name (boosted), column names and
+    comments. Built from the schema text alone, offline
+    (build_schema_index.py writes it to index_path) or on first use.
+    """
+
+    def __init__(self, preamble: str, tables: List[Dict[str, Any]], digest: str):
+        self.preamble = preamble
+        self.tables = tables
+        self.digest = digest
+        self.avg_length = sum(t["length"] for t in tables) / len(tables) if tables else 0.0
+        frequencies = Counter(term for t in tables for term in t["tf"])
+        self.idf = {term: math.log(1 + (len(tables) - n + 0.5) / (n + 0.5)) for term, n in frequencies.items()}
+
+    @classmethod
+    def build(cls, schema: str) -> "SchemaIndex":
+        preamble, definitions = split_schema(schema)
+        tables = []
+        for name, definition in definitions:
+            terms = tokenize(name) * NAME_BOOST + tokenize(definition)
+            tables.append({"name": name, "definition": definition, "tf": dict(Counter(terms)), "length": len(terms)})
+        return cls(preamble, tables, schema_digest(schema))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"version": INDEX_VERSION, "digest": self.digest, "preamble": self.preamble, "tables": self.tables}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "SchemaIndex":
+        return cls(data["preamble"], data["tables"], data["digest"])
+
+    def scores(self, query: str) -> List[float]:
+        terms = set(tokenize(query))
+        scores = []
+        for table in self.tables:
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * table["length"] / (self.avg_length or 1))
+            score = 0.0
+            for term in terms:
+                tf = table["tf"].get(term)
+                if tf:
+                    score += self.idf[term] * tf * (BM25_K1 + 1) / (tf + norm)
+            scores.append(score)
+        return scores
+
+    def top_k(self, query: str, k: int) -> List[int]:
+        """Indices of the k best matching tables, best first; empty if nothing in the query matches"""
+        scores = self.scores(query)
+        ranked = sorted((i for i, score in enumerate(scores) if score > 0), key=lambda i: (-scores[i], i))
+        return ranked[:k]
+
+
+def schema_digest(schema: str) -> str:
+    return hashlib.sha1(schema.encode("utf-8")).hexdigest()
+
+
+def set_index_dir(path: str):
+    """Keep the indexes of all databases under `path` from now on"""
+    global _index_dir
+    _index_dir = path
+
+
+def index_path(db_dir: str) -> str:
+    """Index file of a database directory: named after its db_id, plus a hash of its absolute path so
+    databases of the same name under different databases_paths don't share an index"""
+    db_dir = os.path.abspath(db_dir)
+    digest = hashlib.sha1(db_dir.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(_index_dir, f"{os.path.basename(db_dir)}-{digest}.json")
+
+
+def _db_dir(schema_path: str) -> str:
+    """<db_dir> of <db_dir>/database_description/schema.sql"""
+    return os.path.dirname(os.path.dirname(os.path.abspath(schema_path)))
+
+
+def load_schema_index(schema_path: str) -> SchemaIndex:
+    """The index built offline for this database if it matches the schema's contents, else one built now"""
+    with open(schema_path, 'r', encoding='utf-8') as f:
+        schema = f.read()
+    path = index_path(_db_dir(schema_path))
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") == INDEX_VERSION and data.get("digest") == schema_digest(schema):
+                return SchemaIndex.from_dict(data)
+        except (OSError, ValueError, KeyError):
+            pass
+    return SchemaIndex.build(schema)
+
+
+def write_schema_index(db_dir: str) -> Optional[SchemaIndex]:
+    """Build the index of <db_dir>/database_description/schema.sql into index_path(db_dir); None if there is
+    no schema. The database directory itself is only read"""
+    schema_path = os.path.join(db_dir, SCHEMA_FILE)
+    if not os.path.exists(schema_path):
+        return None
+    with open(schema_path, 'r', encoding='utf-8') as f:
+        index = SchemaIndex.build(f.read())
+    path = index_path(db_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(index.to_dict(), f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return index
+
+
+class SchemaPruner:
+    """Puts only the `top_k` tables most relevant to the instruction into the prompt.
+
+    Tables are ranked by BM25 against the instruction; the rest are listed
+    by name with a pointer to schema.sql, which the model can read with
+    execute_bash. Databases with at most `top_k` tables, and instructions
+    that match no table, get the full schema.
+    """
+
+    def __init__(self, top_k: int = 0, assets=None):
+        self.top_k = top_k
+        self.assets = assets
+        self.stats = Counter()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.top_k > 0
+
+    def _index(self, schema_path: str) -> SchemaIndex:
+        if self.assets is not None:
+            return self.assets.load(schema_path, load_schema_index, kind="schema_index")
+        return load_schema_index(schema_path)
+
+    def prune(self, schema_path: str, schema: str, instruction: str) -> str:
+        """The schema text to put in the prompt for `instruction` (the full `schema` when not pruned)"""
+        index = self._index(schema_path)
+        selected = index.top_k(instruction or "", self.top_k) if len(index.tables) > self.top_k else []
+        if not selected:
+            self._count(full=1)
+            return schema
+
+        kept = sorted(selected)
+        omitted = [t["name"] for i, t in enumerate(index.tables) if i not in selected]
+        parts = [index.preamble] if index.preamble else []
+        parts.extend(index.tables[i]["definition"] for i in kept)
+        parts.append(f"-- {len(omitted)} more tables, not shown: {', '.join(omitted)}\n"
+                     f"-- Their definitions are in {SCHEMA_FILE} in your working directory; read them with "
+                     f"execute_bash (e.g. grep -n -i -A 30 'CREATE.*<name>' {SCHEMA_FILE}) when you need them.")
+        pruned = "\n\n".join(parts)
+        if len(pruned) >= len(schema):
+            # Only small tables were left out: the note listing them costs more than it saves
+            self._count(full=1)
+            return schema
+        self._count(pruned=1, tables_kept=len(kept), tables_omitted=len(omitted),
+                    chars_saved=len(schema) - len(pruned))
+        return pruned
+
+    def _count(self, **counts):
+        with self._lock:
+            self.stats.update(counts)
+
+    def summary(self) -> Dict[str, int]:
+        with self._lock:
+            return {"pruned": 0, "full": 0, "tables_kept": 0, "tables_omitted": 0, "chars_saved": 0, **self.stats}
@@ -0,0 +1,95 @@
+import random
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# random: shuffled (default); db: grouped by db_id, costliest groups and instances first;
+# longest: longest expected instances first
+TASK_ORDERS = ("random", "db", "longest")
+
+
+def round_history(summaries: Iterable[Dict[str, Any]]) -> Dict[str, List[int]]:
+    """{instance_id: [rounds of each saved rollout]} from result summaries; results without a round count are skipped"""
+    history = defaultdict(list)
+    for summary in summaries:
+        if summary.get("rounds"):
+            history[summary["instance_id"]].append(summary["rounds"])
+    return history
+
+
+def expected_rounds(items: List[Dict[str, Any]], history: Dict[str, List[int]]) -> Dict[str, float]:
+    """Expected rounds per instance: the mean of its earlier rollouts, else the mean over instances of the
+    same database that have history, else the mean over all of them (1.0 without any history)"""
+    means = {instance_id: sum(rounds) / len(rounds) for instance_id, rounds in history.items() if rounds}
+    by_db = defaultdict(list)
+    for item in items:
+        if item["instance_id"] in means:
+            by_db[item.get("db_id")].append(means[item["instance_id"]])
+    overall = sum(means.values()) / len(means) if means else 1.0
+    expected = {}
+    for item in items:
+        instance_id = item["instance_id"]
+        if instance_id in means:
+            expected[instance_id] = means[instance_id]
+        elif by_db.get(item.get("db_id")):
+            known = by_db[item.get("db_id")]
+            expected[instance_id] = sum(known) / len(known)
+        else:
+            expected[instance_id] = overall
+    return expected
+
+
+def order_items(items: List[Dict[str, Any]], policy: str,
+                expected: Optional[Dict[str, float]] = None) -> List[Dict[str, Any]]:
+    """Items in the order their rollouts are queued.
+
+    Sorting is stable, so ties keep input order. Under `db` each database's
+    instances run back to back (its files, connections and the provider's
+    prompt cache stay warm), databases with the most expected work first;
+    under both `db` and `longest` long instances go first, so the batch
+    doesn't end waiting on one straggler.
+    """
+    if policy == "random":
+        items = list(items)
+        random.shuffle(items)
+        return items
+    expected = expected or {}
+
+    def cost(item):
+        return expected.get(item["instance_id"], 1.0)
+
+    by_length = sorted(items, key=cost, reverse=True)
+    if policy == "longest":
+        return by_length
+    if policy == "db":
+        groups = defaultdict(list)
+        for item in by_length:
+            groups[item.get("db_id")].append(item)
+        ordered = sorted(groups.values(), key=lambda group: sum(cost(item) for item in group), reverse=True)
+        return [item for group in ordered for item in group]
+    raise ValueError(f"Unknown task order: {policy}")
+
+
+def interleave_rollouts(tasks: List[Tuple[Dict[str, Any], int]], by_db: bool = False) -> List[Tuple[Dict[str, Any], int]]:
+    """Queue the first pending rollout of every instance before the second of any, and so on.
+
+    With `by_db` this is done within each run of consecutive same-database
+    instances, so the database grouping is kept. Spreading an instance's
+    rollouts over the batch lets early stopping cancel the later ones
+    before they start.
+    """
+    blocks = []
+    for task in tasks:
+        db_id = task[0].get("db_id") if by_db else None
+        if not blocks or blocks[-1][0] != db_id:
+            blocks.append((db_id, []))
+        blocks[-1][1].append(task)
+    interleaved = []
+    for _, block in blocks:
+        passes = defaultdict(list)
+        seen = defaultdict(int)
+        for item, rollout_idx in block:
+            passes[seen[item["instance_id"]]].append((item, rollout_idx))
+            seen[item["instance_id"]] += 1
+        for position in sorted(passes):
+            interleaved.extend(passes[position])
+    return interleaved
@@ -0,0 +1,112 @@
+import json
+import re
+import threading
+from collections import Counter
+from typing import Any, Dict, Optional, Tuple
+
+_FUNCTION_OPEN = re.compile(r"<function\s*=\s*([^>\s]+)\s*>")
+_PARAMETER = re.compile(
+    r"<parameter\s*=\s*([^>\s]+)\s*>(.*?)(?=</parameter>|<parameter\s*=|</function>|</tool_call>|$)", re.DOTALL
+)
+_FENCED_BLOCK = re.compile(r"```([\w+-]*)[ \t]*\n(.*?)(?:```|$)", re.DOTALL)
+_NAME_KEYS = ("name", "function", "tool", "tool_name")
+_ARGUMENT_KEYS = ("arguments", "parameters", "params", "args", "input")
+_SQL_LANGUAGES = ("sql", "sqlite", "mysql", "postgresql", "postgres", "snowflake")
+_BASH_LANGUAGES = ("bash", "sh", "shell", "console")
+
+
+def format_tool_call(name: str, arguments: Dict[str, Any]) -> str:
+    """Render a call in the <tool_call> format the prompts ask for"""
+    params = "".join(f"<parameter={key}>\n{value}\n</parameter>\n" for key, value in arguments.items())
+    return f"<tool_call>\n<function={name}>\n{params}</function>\n</tool_call>"
+
+
+def _repair_tags(content: str) -> Optional[Tuple[str, str]]:
+    """<function=...> blocks with missing closing tags or no <tool_call> wrapper"""
+    function_match = _FUNCTION_OPEN.search(content)
+    if not function_match:
+        return None
+    body = content[function_match.end():]
+    arguments = {name: value.strip() for name, value in _PARAMETER.findall(body)}
+    kind = "unclosed_tags" if "<tool_call>" in content[:function_match.start()] else "missing_wrapper"
+    prefix = content[:function_match.start()].replace("<tool_call>", "").rstrip()
+    return f"{prefix}\n{format_tool_call(function_match.group(1), arguments)}".lstrip(), kind
+
+
+def _json_objects(content: str):
+    """Yield every top-level JSON object embedded in the text, in order"""
+    decoder = json.JSONDecoder()
+    index = content.find("{")
+    while index != -1:
+        try:
+            value, end = decoder.raw_decode(content, index)
+        except ValueError:
+            index = content.find("{", index + 1)
+            continue
+        if isinstance(value, dict):
+            yield value, index
+        index = content.find("{", end)
+
+
+def _repair_json(content: str) -> Optional[Tuple[str, str]]:
+    """{"name": ..., "arguments": {...}} objects, fenced or bare, instead of the XML format"""
+    for value, start in _json_objects(content):
+        name = next((value[k] for k in _NAME_KEYS if isinstance(value.get(k), str)), None)
+        if isinstance(value.get("function"), dict):
+            # OpenAI-style {"function": {"name": ..., "arguments": "..."}}
+            value = value["function"]
+            name = value.get("name")
+        if not name:
+            continue
+        arguments = next((value[k] for k in _ARGUMENT_KEYS if k in value), {})
+        if isinstance(arguments, str):
+            try:
+                arguments = json.loads(arguments)
+            except ValueError:
+                continue
+        if not isinstance(arguments, dict):
+            continue
+        prefix = content[:start]
+        fence = prefix.rfind("```")
+        if fence != -1 and prefix.count("```") % 2 == 1:
+            prefix = prefix[:fence]
+        prefix = prefix.replace("<tool_call>", "").rstrip()
+        return f"{prefix}\n{format_tool_call(name, arguments)}".lstrip(), "json"
+    return None
+
+
+def _repair_code_block(content: str, sql_tool: str) -> Optional[Tuple[str, str]]:
+    """A fenced ```sql or ```bash block with no call at all: run the last one"""
+    blocks = [(lang.lower(), code.strip(), match.start()) for match in _FENCED_BLOCK.finditer(content)
+              for lang, code in [match.groups()]]
+    for lang, code, start in reversed(blocks):
+        if not code:
+            continue
+        prefix = content[:start].rstrip()
+        if lang in _SQL_LANGUAGES:
+            return f"{prefix}\n{format_tool_call(sql_tool, {'sql': code})}".lstrip(), "sql_block"
+        if lang in _BASH_LANGUAGES:
+            return f"{prefix}\n{format_tool_call('execute_bash', {'command': code})}".lstrip(), "bash_block"
+    return None
+
+
+class ToolCallRepairer:
+    """Recover a tool call from a reply the strict parser rejected, so the round
+    isn't spent on a "please follow the format" retry. Counts each repair kind."""
+
+    def __init__(self):
+        self.stats = Counter()
+        self._lock = threading.Lock()
+
+    def repair(self, content: str, sql_tool: str) -> Optional[str]:
+        """Return the reply rewritten with one well-formed <tool_call>, or None if nothing is recoverable"""
+        repaired = None
+        if content:
+            repaired = _repair_tags(content) or _repair_json(content) or _repair_code_block(content, sql_tool)
+        with self._lock:
+            self.stats[repaired[1] if repaired else "unrepaired"] += 1
+        return repaired[0] if repaired else None
+
+    def summary(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.stats)
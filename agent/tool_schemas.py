@@ -0,0 +1,183 @@
+import re
+from typing import Any, Dict, List
+
+from context_manager import RECALL_TOOL
+
+_TOOLS_BLOCK = re.compile(r"<tools>(.*?)</tools>", re.DOTALL)
+_FUNCTION_BLOCK = re.compile(r"<function>(.*?)</function>", re.DOTALL)
+_PARAMETER_BLOCK = re.compile(r"<parameter>(.*?)</parameter>", re.DOTALL)
+# The format example: an introducing line followed by a <tool_call> block on lines of its own
+_TOOL_CALL_EXAMPLE = re.compile(r"[^\n]*\n+<tool_call>\n.*?\n</tool_call>[ \t]*(?=\n|$)", re.DOTALL)
+_JSON_TYPES = {"string": "string", "str": "string", "integer": "integer", "int": "integer", "number": "number",
+               "float": "number", "boolean": "boolean", "bool": "boolean", "array": "array", "object": "object"}
+
+NATIVE_PROTOCOL_NOTE = (
+    "Call functions through the tool-calling interface. When several calls are independent "
+    "(e.g. reading a few schema files, or trying alternative queries), issue them together in one turn; "
+    "they run concurrently; this replaces any instruction to make one call at a time. "
+    "Call `terminate` with your final answer when you are done."
+)
+
+
+def _tag(block: str, name: str) -> str:
+    match = re.search(rf"<{name}>(.*?)</{name}>", block, re.DOTALL)
+    return match.group(1).strip() if match else ""
+
+
+def function_schema(name: str, description: str, parameters: Dict[str, Dict[str, Any]],
+                    required: List[str]) -> Dict[str, Any]:
+    return {
+        "type": "function",
+        "function": {
+            "name": name,
+            "description": description,
+            "parameters": {"type": "object", "properties": parameters, "required": required},
+        },
+    }
+
+
+def parse_xml_tool_schemas(system_prompt: str) -> List[Dict[str, Any]]:
+    """Convert the <tools><function>...</function></tools> block of a text-protocol prompt to OpenAI tool schemas"""
+    tools_block = _TOOLS_BLOCK.search(system_prompt or "")
+    if not tools_block:
+        return []
+    schemas = []
+    for function in _FUNCTION_BLOCK.findall(tools_block.group(1)):
+        name = _tag(function, "name")
+        if not name:
+            continue
+        properties = {}
+        required = []
+        for parameter in _PARAMETER_BLOCK.findall(function):
+            param_name = _tag(parameter, "name")
+            if not param_name:
+                continue
+            properties[param_name] = {
+                "type": _JSON_TYPES.get(_tag(parameter, "type").lower(), "string"),
+                "description": _tag(parameter, "description"),
+            }
+            if _tag(parameter, "required").lower() == "true":
+                required.append(param_name)
+        schemas.append(function_schema(name, _tag(function, "description"), properties, required))
+    return schemas
+
+
+def default_tool_schemas(database_type: str = "sqlite") -> List[Dict[str, Any]]:
+    """Schemas for prompts that describe their tools in prose rather than a <tools> block"""
+    return [
+        function_schema(
+            f"execute_{database_type}_sql",
+            f"Execute a SQL query on the {database_type} database and return the result as CSV.",
+            {"sql": {"type": "string", "description": "The SQL query to execute."}},
+            ["sql"],
+        ),
+        function_schema(
+            "execute_bash",
+            "Execute a bash command in the database schema folder, e.g. to list or read schema files.",
+            {"command": {"type": "string", "description": "The bash command to execute."}},
+            ["command"],
+        ),
+        function_schema(
+            "terminate",
+            "Submit the final answer and end the task.",
+            {"answer": {"type": "string", "description": "The final SQL query or answer."}},
+            ["answer"],
+        ),
+    ]
+
+
+SEARCH_SCHEMA_TOOL = "search_schema"
+SEARCH_SCHEMA_DESCRIPTION = (
+    "Search the schema documents of the database (table names, column names, descriptions and sample values) "
+    "and return the best matching tables with the file describing each. Faster than grepping the schema folder."
+)
+_SEARCH_SCHEMA_FUNCTION = f"""<function>
+<name>{SEARCH_SCHEMA_TOOL}</name>
+<description>{SEARCH_SCHEMA_DESCRIPTION}</description>
+<parameters>
+<parameter>
+<name>query</name>
+<type>string</type>
+<required>true</required>
+<description>Words to look for, e.g. the entities and attributes the question is about.</description>
+</parameter>
+<parameter>
+<name>limit</name>
+<type>integer</type>
+<required>false</required>
+<description>Maximum number of tables to return (default 10).</description>
+</parameter>
+</parameters>
+</function>"""
+
+
+def search_schema_tool_schema() -> Dict[str, Any]:
+    """Schema for the tool server's ranked schema search"""
+    return function_schema(
+        SEARCH_SCHEMA_TOOL,
+        SEARCH_SCHEMA_DESCRIPTION,
+        {"query": {"type": "string", "description": "Words to look for, e.g. the entities and attributes the question is about."},
+         "limit": {"type": "integer", "description": "Maximum number of tables to return (default 10)."}},
+        ["query"],
+    )
+
+
+def _with_tool(system_prompt: str, name: str, function_block: str, prose: str) -> str:
+    """Add a <function> block to a system prompt's <tools> block, or `prose` after the prompt if it has none"""
+    if f"<name>{name}</name>" in system_prompt or prose in system_prompt:
+        return system_prompt
+    if "</tools>" in system_prompt:
+        return system_prompt.replace("</tools>", f"{function_block}\n</tools>", 1)
+    return f"{system_prompt}\n\n{prose}"
+
+
+def with_search_schema_tool(system_prompt: str) -> str:
+    """Add search_schema to a system prompt's <tools> block, or describe it after the prompt if it has none"""
+    return _with_tool(system_prompt, SEARCH_SCHEMA_TOOL, _SEARCH_SCHEMA_FUNCTION,
+                      f"You can also call `{SEARCH_SCHEMA_TOOL}` with a `query` parameter: {SEARCH_SCHEMA_DESCRIPTION}")
+
+
+RECALL_DESCRIPTION = "Show the full text of an earlier tool result that was shortened to save context."
+_RECALL_ID_DESCRIPTION = "The observation id given in the shortened result."
+_RECALL_FUNCTION = f"""<function>
+<name>{RECALL_TOOL}</name>
+<description>{RECALL_DESCRIPTION}</description>
+<parameters>
+<parameter>
+<name>id</name>
+<type>integer</type>
+<required>true</required>
+<description>{_RECALL_ID_DESCRIPTION}</description>
+</parameter>
+</parameters>
+</function>"""
+
+
+def recall_tool_schema() -> Dict[str, Any]:
+    """Schema for the agent-local tool that re-expands an observation elided by context compaction"""
+    return function_schema(
+        RECALL_TOOL,
+        RECALL_DESCRIPTION,
+        {"id": {"type": "integer", "description": _RECALL_ID_DESCRIPTION}},
+        ["id"],
+    )
+
+
+def with_recall_tool(system_prompt: str) -> str:
+    """Add recall_observation to a system prompt's <tools> block, or describe it after the prompt if it has none"""
+    return _with_tool(system_prompt, RECALL_TOOL, _RECALL_FUNCTION,
+                      f"You can also call `{RECALL_TOOL}` with an `id` parameter: {RECALL_DESCRIPTION}")
+
+
+def native_system_prompt(system_prompt: str) -> str:
+    """Drop the text tool-call protocol (tool list, <tool_call> example, format reminders) from a system prompt.
+
+    The tool list is sent as schemas instead, and the reminders (one call per
+    turn, XML nesting rules) don't apply to native calls.
+    """
+    prompt = _TOOLS_BLOCK.sub("", system_prompt)
+    prompt = _TOOL_CALL_EXAMPLE.sub("", prompt)
+    lines = [line for line in prompt.split("\n")
+             if not (line.lstrip().startswith("-") and ("tool_call" in line or "<function=" in line))]
+    prompt = re.sub(r"\n{3,}", "\n\n", "\n".join(lines)).strip()
+    return f"{prompt}\n\n{NATIVE_PROTOCOL_NOTE}"
@@ -0,0 +1,256 @@
+import argparse
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional
+
+TRACE_ID_HEADER = "X-Trace-Id"
+PARENT_SPAN_HEADER = "X-Parent-Span-Id"
+
+# Phases reported by the summary; anything else inside a rollout counts as "other"
+PHASES = ["prompt_build", "llm_rate_wait", "llm_call", "llm_retry_wait", "tool_request", "tool_queue", "tool_exec", "persist"]
+
+# Active trace context, carried across threads by explicit propagation and across asyncio tasks by contextvars
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+
+
+def _now_us() -> int:
+    return time.time_ns() // 1000
+
+
+class Span:
+    __slots__ = ("tracer", "name", "trace_id", "span_id", "parent_id", "instance_id", "attrs", "start_us")
+
+    def __init__(self, tracer, name, trace_id, parent_id, instance_id, attrs):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.instance_id = instance_id
+        self.attrs = attrs
+        self.start_us = _now_us()
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+
+class Tracer:
+    """Span tracer writing Chrome trace events (chrome://tracing, Perfetto).
+
+    Disabled until configure() is given a path; spans are then no-ops apart
+    from a contextvar lookup, so call sites don't need to check.
+    """
+
+    def __init__(self):
+        self.trace_file = None
+        self._fh = None
+        self._lock = threading.Lock()
+        self._buffer: List[str] = []
+        self._pid = os.getpid()
+
+    @property
+    def enabled(self) -> bool:
+        return self._fh is not None
+
+    def configure(self, trace_file: Optional[str]):
+        if not trace_file:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(trace_file)), exist_ok=True)
+        self.trace_file = trace_file
+        # JSON Array Format: the closing bracket is optional, so appending events keeps the file loadable
+        self._fh = open(trace_file, "w", encoding="utf-8")
+        self._fh.write("[\n")
+
+    def _emit(self, event: Dict[str, Any]):
+        line = json.dumps(event, ensure_ascii=False) + ",\n"
+        with self._lock:
+            if self._fh is None:
+                return
+            self._buffer.append(line)
+            if len(self._buffer) >= 256:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if self._buffer and self._fh is not None:
+            self._fh.write("".join(self._buffer))
+            self._fh.flush()
+            self._buffer = []
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        with self._lock:
+            self._flush_locked()
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+    @contextmanager
+    def trace(self, instance_id: str, rollout_idx: Optional[int] = None, trace_id: Optional[str] = None):
+        """Start a new trace (one per rollout) and make it current for the enclosed block"""
+        trace_id = trace_id or uuid.uuid4().hex
+        token = _current_trace.set({"trace_id": trace_id, "span_id": None, "instance_id": instance_id})
+        try:
+            with self.span("rollout", rollout_idx=rollout_idx) as span:
+                yield span
+        finally:
+            _current_trace.reset(token)
+
+    @contextmanager
+    def span(self, name: str, **attrs):
+        ctx = _current_trace.get()
+        if not self.enabled or ctx is None:
+            yield None
+            return
+        span = Span(self, name, ctx["trace_id"], ctx["span_id"], ctx["instance_id"], attrs)
+        token = _current_trace.set({**ctx, "span_id": span.span_id})
+        try:
+            yield span
+        finally:
+            _current_trace.reset(token)
+            self._finish(span, _now_us() - span.start_us)
+
+    def record(self, name: str, start_us: int, duration_us: int, **attrs):
+        """Record an already-measured child span of the current span (e.g. server-reported timings)"""
+        ctx = _current_trace.get()
+        if not self.enabled or ctx is None:
+            return
+        span = Span(self, name, ctx["trace_id"], ctx["span_id"], ctx["instance_id"], attrs)
+        span.start_us = start_us
+        self._finish(span, duration_us)
+
+    def _finish(self, span: Span, duration_us: int):
+        args = {"trace_id": span.trace_id, "span_id": span.span_id, "parent_id": span.parent_id,
+                "instance_id": span.instance_id}
+        args.update(span.attrs)
+        self._emit({
+            "name": span.name,
+            "cat": "agent",
+            "ph": "X",
+            "ts": span.start_us,
+            "dur": max(duration_us, 0),
+            "pid": self._pid,
+            "tid": threading.get_ident(),
+            "args": args,
+        })
+
+    def propagation_headers(self) -> Dict[str, str]:
+        """HTTP headers linking a downstream call to the current span"""
+        ctx = _current_trace.get()
+        if not self.enabled or ctx is None:
+            return {}
+        headers = {TRACE_ID_HEADER: ctx["trace_id"]}
+        if ctx["span_id"]:
+            headers[PARENT_SPAN_HEADER] = ctx["span_id"]
+        return headers
+
+
+def parse_server_timing(header: Optional[str]) -> Dict[str, float]:
+    """Parse a Server-Timing header ("queue;dur=1.2, exec;dur=30.5") into milliseconds per metric"""
+    timings = {}
+    if not header:
+        return timings
+    for entry in header.split(","):
+        parts = [p.strip() for p in entry.split(";")]
+        if not parts[0]:
+            continue
+        for param in parts[1:]:
+            if param.startswith("dur="):
+                try:
+                    timings[parts[0]] = float(param[4:])
+                except ValueError:
+                    pass
+    return timings
+
+
+def load_events(trace_files: List[str]) -> List[Dict[str, Any]]:
+    events = []
+    for path in trace_files:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip().rstrip(",")
+                if not line or line in ("[", "]"):
+                    continue
+                try:
+                    events.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    return events
+
+
+def summarize(trace_files: List[str]) -> Dict[str, Any]:
+    """Time spent per phase per instance, in seconds. "other" is rollout time not covered by a phase."""
+    per_instance = defaultdict(lambda: defaultdict(float))
+    for event in load_events(trace_files):
+        if event.get("ph") != "X":
+            continue
+        args = event.get("args", {})
+        instance_id = args.get("instance_id") or "unknown"
+        name = event.get("name")
+        seconds = event.get("dur", 0) / 1e6
+        if name == "rollout":
+            per_instance[instance_id]["rollout"] += seconds
+            per_instance[instance_id]["rollouts"] += 1
+        elif name in PHASES:
+            per_instance[instance_id][name] += seconds
+
+    totals = defaultdict(float)
+    instances = {}
+    for instance_id, phases in per_instance.items():
+        # tool_queue/tool_exec are nested inside tool_request, so they don't count against "other"
+        covered = sum(phases.get(p, 0.0) for p in PHASES if p not in ("tool_queue", "tool_exec"))
+        phases["other"] = max(phases.get("rollout", 0.0) - covered, 0.0)
+        instances[instance_id] = dict(phases)
+        for key, value in phases.items():
+            totals[key] += value
+
+    return {"totals": dict(totals), "instances": instances}
+
+
+def format_summary(summary: Dict[str, Any], top: int = 20) -> str:
+    columns = ["rollout"] + PHASES + ["other"]
+    lines = []
+    totals = summary["totals"]
+    rollout_total = totals.get("rollout", 0.0) or 1.0
+    lines.append("Time per phase (all instances):")
+    for phase in columns:
+        value = totals.get(phase, 0.0)
+        lines.append(f"  {phase:<16}{value:>12.2f}s  {100 * value / rollout_total:6.1f}%")
+
+    lines.append("")
+    lines.append(f"Slowest {top} instances (seconds):")
+    lines.append("  " + f"{'instance_id':<32}" + "".join(f"{c:>15}" for c in columns))
+    ranked = sorted(summary["instances"].items(), key=lambda kv: kv[1].get("rollout", 0.0), reverse=True)
+    for instance_id, phases in ranked[:top]:
+        lines.append("  " + f"{instance_id[:31]:<32}" + "".join(f"{phases.get(c, 0.0):>15.2f}" for c in columns))
+    return "\n".join(lines)
+
+
+# Global tracer shared by the agent, the message processor and the LLM client
+tracer = Tracer()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize agent trace files")
+    parser.add_argument("trace_files", nargs="+", help="Chrome trace files written with --trace_file")
+    parser.add_argument("--top", type=int, default=20, help="Number of slowest instances to list")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON")
+    args = parser.parse_args()
+
+    summary = summarize(args.trace_files)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print(format_summary(summary, args.top))
+
+
+if __name__ == "__main__":
+    main()
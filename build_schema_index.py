@@ -0,0 +1,53 @@
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "agent"))
+import schema_index
+from schema_index import write_schema_index
+from servers.tools.schema_search_tool import index_path, set_index_dir, update_index
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the BM25 schema index used by --schema_top_k for each database')
+    parser.add_argument('databases_path', help='Databases directory (one <db_id>/database_description/schema.sql each)')
+    parser.add_argument('--db_id', action='append', default=None, help='Only index this database (repeatable)')
+    parser.add_argument('--index_dir', default=None,
+                        help="Where to keep the --schema_top_k indexes; must match the agent's --schema_index_dir "
+                             "(default: $SCHEMA_INDEX_DIR or ~/.cache/spider-agent/schema_index)")
+    parser.add_argument('--search', action='store_true',
+                        help='Also build the full-text index of the search_schema tool over all schema files (DDL.csv, *.json, *.sql)')
+    parser.add_argument('--search_index_dir', default=None,
+                        help="Where to keep the search_schema indexes; must match the tool server's --schema_search_index_dir "
+                             "(default: $SCHEMA_SEARCH_INDEX_DIR or ~/.cache/spider-agent/schema_search)")
+
+    args = parser.parse_args()
+
+    databases_path = Path(args.databases_path)
+    if not databases_path.is_dir():
+        print(f"Error: Invalid databases path: {args.databases_path}")
+        return 1
+
+    if args.index_dir:
+        schema_index.set_index_dir(args.index_dir)
+    if args.search_index_dir:
+        set_index_dir(args.search_index_dir)
+    db_dirs = [databases_path / db_id for db_id in args.db_id] if args.db_id else sorted(
+        path for path in databases_path.iterdir() if path.is_dir()
+    )
+    indexed = 0
+    for db_dir in db_dirs:
+        if args.search:
+            counts = update_index(str(db_dir), force=True)
+            print(f"{db_dir.name}: {counts['files']} schema files ({counts['indexed']} reindexed, "
+                  f"{counts['removed']} removed) -> {index_path(str(db_dir))}")
+        index = write_schema_index(str(db_dir))
+        if index is None:
+            continue
+        indexed += 1
+        print(f"{db_dir.name}: {len(index.tables)} tables -> {schema_index.index_path(str(db_dir))}")
+    print(f"Indexed {indexed} databases")
+    return 0
+
+if __name__ == '__main__':
+    exit(main())
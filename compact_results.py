@@ -0,0 +1,26 @@
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "agent"))
+from file_manager import compact_results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rewrite an output folder\'s results.jsonl as one <instance_id>.json per instance')
+    parser.add_argument('output_folder', help='Agent output folder')
+    parser.add_argument('--dest', default=None, help='Folder for the per-instance JSON files (default: in place)')
+    
+    args = parser.parse_args()
+    
+    if not Path(args.output_folder).is_dir():
+        print(f"Error: Invalid output folder: {args.output_folder}")
+        return 1
+    
+    by_instance = compact_results(args.output_folder, args.dest)
+    total = sum(len(results) for results in by_instance.values())
+    print(f"Compacted {total} results for {len(by_instance)} instances into {args.dest or args.output_folder}")
+    return 0
+
+if __name__ == '__main__':
+    exit(main())
@@ -1,30 +1,42 @@
-import json
 import argparse
-import random
+import sys
+from collections import Counter
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent / "agent"))
+from early_stop import terminate_answer, vote_key
+from file_manager import load_results_by_instance
+
+
+def select_majority_answer(records):
+    """Answer most terminated records agree on (their saved vote, else the normalized SQL);
+    ties go to the answer reached first. Returns (record, answer, votes) or None."""
+    candidates = []
+    for record in records:
+        answer = terminate_answer(record.get('conversation'))
+        if answer:
+            candidates.append((record, answer, record.get('vote') or vote_key(answer)))
+    if not candidates:
+        return None
+    counts = Counter(key for _, _, key in candidates)
+    winner = max(counts, key=counts.get)
+    record, answer, _ = next(candidate for candidate in candidates if candidate[2] == winner)
+    return record, answer, counts[winner]
+
 def extract_sql_answers(input_dir, output_folder):
     """
-    Extract SQL answers from terminated records in JSON files
+    Extract SQL answers from terminated records in per-instance JSON files or results.jsonl
     """
-    input_path = Path(input_dir)
     output_path = Path(output_folder)
     output_path.mkdir(parents=True, exist_ok=True)
     
-    json_files = list(input_path.glob("*.json"))
+    results_by_instance = load_results_by_instance(input_dir)
     
     processed_count = 0
     skipped_count = 0
     
-    for json_file in json_files:
+    for source_id, data in results_by_instance.items():
         try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            if not isinstance(data, list):
-                skipped_count += 1
-                continue
-            
             # Find terminated records
             terminated_records = [record for record in data if record.get('terminated', False)]
             
@@ -32,41 +44,19 @@ def extract_sql_answers(input_dir, output_folder):
                 skipped_count += 1
                 continue
             
-            # Randomly select one terminated record
-            selected_record = random.choice(terminated_records)
-            
-            # Extract instance_id or id
-            instance_id = selected_record.get('instance_id') or selected_record.get('id')
-            conversation = selected_record.get('conversation')
-
+            # Majority vote over the terminate answers of all terminated records
+            selected = select_majority_answer(terminated_records)
             
-            if not instance_id or not conversation:
+            if not selected:
                 skipped_count += 1
                 continue
             
-            # Extract SQL answer from last conversation item
-            last_item = conversation[-1]
-            tool_calls = last_item.get('tool_calls', [])
+            selected_record, answer, votes = selected
             
-            if not tool_calls or len(tool_calls) == 0:
-                skipped_count += 1
-                continue
-            
-            first_tool_call = tool_calls[0]
-            
-            # Check if it's a terminate call
-            if first_tool_call.get('name') != 'terminate':
-                skipped_count += 1
-                continue
-            
-            # Extract answer
-            arguments = first_tool_call.get('arguments', {})
-            if isinstance(arguments, str):
-                arguments = json.loads(arguments)
-            
-            answer = arguments.get('answer')
+            # Extract instance_id or id
+            instance_id = selected_record.get('instance_id') or selected_record.get('id')
             
-            if not answer:
+            if not instance_id:
                 skipped_count += 1
                 continue
             
@@ -76,14 +66,14 @@ def extract_sql_answers(input_dir, output_folder):
                 f.write(answer)
             
             processed_count += 1
-            print(f"Extracted SQL from {json_file.name} -> {instance_id}.sql")
+            print(f"Extracted SQL for {source_id} -> {instance_id}.sql ({votes}/{len(terminated_records)} votes)")
             
         except Exception as e:
-            print(f"Error processing {json_file.name}: {e}")
+            print(f"Error processing {source_id}: {e}")
             skipped_count += 1
     
-    print(f"\nProcessed: {processed_count} files")
-    print(f"Skipped: {skipped_count} files")
+    print(f"\nProcessed: {processed_count} instances")
+    print(f"Skipped: {skipped_count} instances")
 
 def main():
     parser = argparse.ArgumentParser(description='Extract SQL answers from terminated JSON records')
@@ -26,12 +26,42 @@ echo "Output file will be: $OUTPUT_FOLDER"
 host=$(hostname -I | awk '{print $1}')
 port=$(shuf -i 30000-31000 -n 1)
 tool_server_url=http://$host:$port/get_observation
-python -m servers.serve --workers_per_tool 32 --host $host --port $port  &
+# Opt-in warm-up before the server reports ready, e.g. WARMUP_TARGETS="snowflake $INPUT_FILE"
+# (database types need their credentials); empty = no warm-up
+WARMUP_TARGETS=${WARMUP_TARGETS:-}
+WARMUP_CONNECTIONS=${WARMUP_CONNECTIONS:-4}
+warmup_args=()
+if [ -n "$WARMUP_TARGETS" ]; then
+    read -r -a warmup_targets <<< "$WARMUP_TARGETS"
+    warmup_args=(--warmup "${warmup_targets[@]}")
+fi
+python -m servers.serve --workers_per_tool 32 --host $host --port $port \
+    --databases_path "$DATABASES_PATH" --warmup_connections "$WARMUP_CONNECTIONS" "${warmup_args[@]}" &
 server_pid=$!
 
 echo "Server (pid=$server_pid) started at $tool_server_url"
 
-sleep 3
+# Wait until the server reports ready (pools opened, warehouse resumed, database files read)
+READY_TIMEOUT=${READY_TIMEOUT:-600}  # seconds
+ready=0
+deadline=$((SECONDS + READY_TIMEOUT))
+while [ $SECONDS -lt $deadline ]; do
+    if curl -sf "http://$host:$port/ready" > /dev/null; then
+        ready=1
+        break
+    fi
+    if ! kill -0 $server_pid 2> /dev/null; then
+        echo "Server (pid=$server_pid) exited before becoming ready"
+        exit 1
+    fi
+    sleep 0.1
+done
+if [ $ready -ne 1 ]; then
+    echo "ERROR: server not ready after ${READY_TIMEOUT}s (status: $(curl -s "http://$host:$port/ready")); raise READY_TIMEOUT or shrink WARMUP_TARGETS"
+    kill $server_pid 2> /dev/null
+    exit 1
+fi
+echo "Server is ready"
 
 python agent/main.py \
     --input_file "$INPUT_FILE" \
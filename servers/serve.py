@@ -1,10 +1,13 @@
 import argparse
 import asyncio
+import time
 import uvicorn
 import sys
 import os
+from contextlib import asynccontextmanager
+from functools import partial
 from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from typing import Dict, Any, List
 import logging
 
@@ -16,17 +19,119 @@ sys.path.insert(0, project_root)
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from servers.utils.tool_registry import ToolRegistry
+from servers.utils.metrics import metrics
+from servers.utils.tracing import TraceWriter, TRACE_ID_HEADER, PARENT_SPAN_HEADER, now_us
+from servers.utils.warmup import parse_warmup_targets, run_warmup
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Tools Server API")
+# /execute headers: the rollout a call belongs to (the agent sends it) and an optional fair-share weight
+ROLLOUT_KEY_HEADER = "X-Rollout-Key"
+ROLLOUT_WEIGHT_HEADER = "X-Rollout-Weight"
+
 tool_registry = ToolRegistry()
+trace_writer = TraceWriter()
+server_state = {"ready": False, "started_at": time.time(), "ready_at": None,
+                "warmup_targets": [], "warmup_connections": 1, "warmup_progress": {}, "warmup": None}
 
+# Registers tools from the manifest without importing their modules
 tool_registry.load_tools()
 
+def _mark_ready():
+    server_state["ready"] = True
+    server_state["ready_at"] = time.time()
+    logger.info(f"Server ready in {server_state['ready_at'] - server_state['started_at']:.2f}s")
+
+async def _warm_then_mark_ready():
+    """Warm pools, warehouses and database files before reporting ready"""
+    loop = asyncio.get_running_loop()
+    # Import tool modules and drivers now rather than on the first tool call
+    await loop.run_in_executor(None, tool_registry.preload_tools)
+    server_state["warmup"] = await loop.run_in_executor(None, partial(
+        run_warmup,
+        server_state["warmup_targets"],
+        connections=server_state["warmup_connections"],
+        progress=server_state["warmup_progress"]
+    ))
+    _mark_ready()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warmup_task = None
+    if server_state["warmup_targets"]:
+        # Serve /ready (503 while warming) and /metrics during warm-up
+        warmup_task = asyncio.create_task(_warm_then_mark_ready())
+    else:
+        _mark_ready()
+    yield
+    if warmup_task and not warmup_task.done():
+        warmup_task.cancel()
+
+app = FastAPI(title="Tools Server API", lifespan=lifespan)
+
+@app.get("/health")
+async def health() -> JSONResponse:
+    return JSONResponse(content={"status": "ok"})
+
+@app.get("/ready")
+async def ready() -> JSONResponse:
+    """Readiness probe for launchers: 200 once the server accepts tool calls, 503 before"""
+    if not server_state["ready"]:
+        status = "warming" if server_state["warmup_targets"] else "starting"
+        return JSONResponse(status_code=503, content={"status": status, "warmup": server_state["warmup_progress"]})
+    warmup = server_state["warmup"]
+    return JSONResponse(content={
+        "status": "ready",
+        "startup_seconds": server_state["ready_at"] - server_state["started_at"],
+        "tools": list(tool_registry.tools.keys()),
+        "warmup": {k: warmup[k] for k in ("targets", "failed", "seconds")} if warmup else None
+    })
+
+@app.post("/warmup")
+async def warmup(request: Request) -> JSONResponse:
+    """Warm additional targets on demand, e.g. {"targets": ["snowflake", "GA360"], "connections": 4}.
+
+    Only database types and db_ids under the server's --databases_path are
+    accepted, and `connections` is capped at --warmup_connections.
+    """
+    data = await request.json()
+    targets = data.get("targets", [])
+    if not isinstance(targets, list):
+        return JSONResponse(status_code=400, content={"error": "targets must be a list"})
+    try:
+        connections = int(data.get("connections", 1))
+    except (TypeError, ValueError):
+        connections = 1
+    connections = min(max(connections, 1), server_state["warmup_connections"])
+    targets = parse_warmup_targets(targets, server_state.get("databases_path"), allow_paths=False)
+    report = await asyncio.get_running_loop().run_in_executor(
+        None, partial(run_warmup, targets, connections=connections)
+    )
+    return JSONResponse(content=report)
+
+REQUESTS = metrics.counter("http_requests_total", "Requests to /execute by status code")
+REQUEST_LATENCY = metrics.histogram("http_request_seconds", "End-to-end /execute handling time")
+
+@app.get("/metrics")
+async def get_metrics() -> PlainTextResponse:
+    return PlainTextResponse(
+        metrics.render_prometheus(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+@app.get("/metrics/json")
+async def get_metrics_json() -> JSONResponse:
+    return JSONResponse(content=metrics.snapshot())
+
 @app.post("/execute")
 async def execute_tool(request: Request) -> JSONResponse:
+    with REQUEST_LATENCY.time():
+        response = await _execute_tool(request)
+    REQUESTS.inc(labels={"status": str(response.status_code)})
+    return response
+
+async def _execute_tool(request: Request) -> JSONResponse:
     try:
         data = await request.json()
         tool_calls = data.get("tool_calls", [])
@@ -37,21 +142,34 @@ async def execute_tool(request: Request) -> JSONResponse:
                 content={"error": "No tool_calls provided"}
             )
         
-        tool_call = tool_calls[0]
-        tool_name = tool_call.get("name")
-        arguments = tool_call.get("arguments", {})
-        
-        logger.info(f"Executing tool: {tool_name} with arguments: {arguments}")
+        trace_id = request.headers.get(TRACE_ID_HEADER)
+        parent_id = request.headers.get(PARENT_SPAN_HEADER)
+        try:
+            weight = float(request.headers.get(ROLLOUT_WEIGHT_HEADER, 1.0))
+        except ValueError:
+            weight = 1.0
         
-        if not tool_registry.has_tool(tool_name):
-            return JSONResponse(
-                status_code=404,
-                content={"error": f"Tool {tool_name} not found"}
-            )
+        if len(tool_calls) == 1:
+            tool_name = tool_calls[0].get("name")
+            if not tool_registry.has_tool(tool_name):
+                return JSONResponse(
+                    status_code=404,
+                    content={"error": f"Tool {tool_name} not found"}
+                )
         
-        result = await tool_registry.execute_tool(tool_name, **arguments)
+        # Calls from one turn are independent: run them concurrently and answer in request order
+        outcomes = await asyncio.gather(*[
+            _execute_one(tool_call, request, trace_id, parent_id, weight) for tool_call in tool_calls
+        ])
+        results = [result for result, _ in outcomes]
         
-        return JSONResponse(content=result)
+        # Queue wait and execution time go back to the client so its trace can split tool latency;
+        # for several concurrent calls the slowest one bounds the request
+        queue = max(timing["queue"] for _, timing in outcomes)
+        exec_time = max(timing["exec"] for _, timing in outcomes)
+        server_timing = f"queue;dur={queue * 1000:.3f}, exec;dur={exec_time * 1000:.3f}"
+        content = results[0] if len(results) == 1 else results
+        return JSONResponse(content=content, headers={"Server-Timing": server_timing})
     
     except Exception as e:
         logger.error(f"Error processing request: {str(e)}", exc_info=True)
@@ -60,19 +178,72 @@ async def execute_tool(request: Request) -> JSONResponse:
             content={"error": f"Internal server error: {str(e)}"}
         )
 
+async def _execute_one(tool_call: Dict[str, Any], request: Request, trace_id, parent_id, weight: float):
+    """Run one tool call through the registry; returns (result, {"queue", "exec"})"""
+    tool_name = tool_call.get("name")
+    arguments = tool_call.get("arguments", {})
+    # Calls without a rollout key share one fair-scheduling queue
+    rollout_key = tool_call.get("rollout_key") or request.headers.get(ROLLOUT_KEY_HEADER)
+    
+    logger.info(f"Executing tool: {tool_name} with arguments: {arguments}" + (f" [trace {trace_id}]" if trace_id else ""))
+    
+    if not tool_registry.has_tool(tool_name):
+        return {"error": f"Tool {tool_name} not found"}, {"queue": 0.0, "exec": 0.0}
+    
+    start_us = now_us()
+    result, timing = await tool_registry.execute_tool_timed(tool_name, arguments, rollout_key, weight)
+    
+    if trace_writer.enabled:
+        request_span = trace_writer.record("server_request", start_us, now_us() - start_us,
+                                           trace_id, parent_id, tool=tool_name)
+        queue_us = int(timing["queue"] * 1e6)
+        trace_writer.record("server_queue", start_us, queue_us, trace_id, request_span, tool=tool_name)
+        trace_writer.record("server_exec", start_us + queue_us, int(timing["exec"] * 1e6),
+                            trace_id, request_span, tool=tool_name)
+    return result, timing
+
 def parse_args():
     parser = argparse.ArgumentParser(description="Tools Server")
     parser.add_argument("--workers_per_tool", type=int, default=8, help="Number of workers per tool")
+    parser.add_argument("--max_concurrent_per_key", type=int, default=4,
+                        help="Max tool calls running at once for one rollout key (0 = no cap)")
     parser.add_argument("--port", type=int, default=5000, help="Server port")
     parser.add_argument("--host", type=str, default="0.0.0.0", help="Server host")
+    parser.add_argument("--warmup", nargs="*", default=None,
+                        help="Targets to warm before reporting ready: database types (snowflake), credential files, "
+                             "input .jsonl files (their db_ids) or db_ids")
+    parser.add_argument("--databases_path", type=str, default=None, help="Databases directory used to warm db_id files")
+    parser.add_argument("--warmup_connections", type=int, default=4, help="Connections to pre-open per database type")
+    parser.add_argument("--trace_file", type=str, default=None, help="Write server-side spans to this Chrome trace file")
+    parser.add_argument("--schema_search_index_dir", type=str, default=None,
+                        help="Directory of the search_schema indexes (default: $SCHEMA_SEARCH_INDEX_DIR or "
+                             "~/.cache/spider-agent/schema_search)")
+    parser.add_argument("--schema_search_rescan_seconds", type=float, default=None,
+                        help="Rescan an indexed database for changed schema files at most this often on search "
+                             "(default: $SCHEMA_SEARCH_RESCAN_SECONDS or 0 = never; --warmup builds the indexes)")
     return parser.parse_args()
 
 def main():
     args = parse_args()
     
-    tool_registry.set_workers_per_tool(args.workers_per_tool)
+    global trace_writer
+    tool_registry.set_workers_per_tool(args.workers_per_tool, args.max_concurrent_per_key)
+    trace_writer = TraceWriter(args.trace_file)
+    
+    server_state["databases_path"] = args.databases_path
+    server_state["warmup_connections"] = max(args.warmup_connections, 1)
+    if args.schema_search_index_dir:
+        from servers.tools.schema_search_tool import set_index_dir
+        set_index_dir(args.schema_search_index_dir)
+    if args.schema_search_rescan_seconds is not None:
+        from servers.tools.schema_search_tool import set_rescan_seconds
+        set_rescan_seconds(args.schema_search_rescan_seconds)
+    if args.warmup:
+        server_state["warmup_targets"] = parse_warmup_targets(args.warmup, args.databases_path)
+        logger.info(f"Warming up {len(server_state['warmup_targets'])} targets before reporting ready")
     
-    logger.info(f"Starting server on port {args.port} with {args.workers_per_tool} workers per tool")
+    logger.info(f"Starting server on port {args.port} with {args.workers_per_tool} workers per tool, "
+                f"at most {args.max_concurrent_per_key or args.workers_per_tool} per rollout")
     uvicorn.run(app, host=args.host, port=args.port, log_level="info")
 
 if __name__ == "__main__":
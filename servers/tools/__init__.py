@@ -0,0 +1,18 @@
+# Tool manifest: tool name -> "module:function".
+#
+# ToolRegistry.load_tools registers these names without importing anything;
+# a module (and its drivers: pandas, snowflake-connector, mysql-connector,
+# psycopg2) is imported on the first call of one of its tools. Modules in
+# this package that are not listed here are still discovered and imported
+# eagerly through their register_tools(registry) hook.
+TOOL_MANIFEST = {
+    "execute_bash": "servers.tools.bash_tool:execute_bash",
+    "execute_database_sql": "servers.tools.database_tool:execute_database_sql",
+    "execute_mysql_sql": "servers.tools.database_tool:execute_mysql_sql",
+    "execute_postgresql_sql": "servers.tools.database_tool:execute_postgresql_sql",
+    "execute_sqlite_sql": "servers.tools.database_tool:execute_sqlite_sql",
+    "execute_snowflake_sql": "servers.tools.snowflake_tool:execute_snowflake_sql",
+    "search_schema": "servers.tools.schema_search_tool:search_schema",
+    "terminate": "servers.tools.terminator_tool:terminate",
+    "finish": "servers.tools.terminator_tool:terminate",
+}
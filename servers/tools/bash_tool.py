@@ -1,14 +1,20 @@
 import subprocess
 import os
+import time
 from typing import Dict, Any, Tuple
 import logging
 
+from servers.utils.metrics import metrics
+
 logger = logging.getLogger(__name__)
 
 # Default timeout value
 TIMEOUT = 30  # 30 seconds timeout
 MAX_CHARS = 2000  # Maximum characters to display
 
+COMMAND_LATENCY = metrics.histogram("bash_command_seconds", "Bash command wall time by outcome")
+TRUNCATED_OUTPUTS = metrics.counter("bash_truncated_outputs_total", "Bash outputs truncated to MAX_CHARS")
+
 def execute_bash(command: str, work_dir: str = None, **kwargs) -> Dict[str, Any]:
     """
     Execute a Bash command
@@ -23,6 +29,8 @@ def execute_bash(command: str, work_dir: str = None, **kwargs) -> Dict[str, Any]
     """
     logger.info(f"Executing bash command: {command}")
     logger.info(f"Working directory: {work_dir}")
+    start_time = time.perf_counter()
+    outcome = "ok"
     
     try:
         # Use the provided work_dir or current directory if not specified
@@ -41,6 +49,8 @@ def execute_bash(command: str, work_dir: str = None, **kwargs) -> Dict[str, Any]
         stderr = proc.stderr
         return_code = proc.returncode
         success = return_code == 0
+        if not success:
+            outcome = "nonzero_exit"
         
         # Construct the return content
         if success:
@@ -50,6 +60,7 @@ def execute_bash(command: str, work_dir: str = None, **kwargs) -> Dict[str, Any]
         
         # Check if output is too long and truncate if necessary
         if len(content) > MAX_CHARS:
+            TRUNCATED_OUTPUTS.inc()
             truncated_content = content[:MAX_CHARS]
             total_chars = len(content)
             content = f"{truncated_content}\n\n[OUTPUT TRUNCATED]\nThe output has been truncated due to length ({total_chars} characters total, showing first {MAX_CHARS} characters)."
@@ -59,12 +70,16 @@ def execute_bash(command: str, work_dir: str = None, **kwargs) -> Dict[str, Any]
     except subprocess.TimeoutExpired:
         content = f"Command timed out after {kwargs.get('timeout', TIMEOUT)} seconds"
         success = False
+        outcome = "timeout"
         logger.warning(f"Command timed out: {command}")
     except Exception as e:
         content = f"Error executing command: {str(e)}"
         success = False
+        outcome = "error"
         logger.error(f"Error executing command: {str(e)}")
     
+    COMMAND_LATENCY.observe(time.perf_counter() - start_time, {"outcome": outcome})
+    
     return {
         "content": f"EXECUTION RESULT of [execute_bash]:\n{content}"
     }
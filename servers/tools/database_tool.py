@@ -2,41 +2,43 @@ import json
 import logging
 import time
 import os
+import threading
 from typing import Dict, Any, Optional
-import pandas as pd
-
-# Import database connectors
-try:
-    import mysql.connector
-    from mysql.connector import Error as MySQLError
-    MYSQL_AVAILABLE = True
-except ImportError:
-    MYSQL_AVAILABLE = False
-
-try:
-    import psycopg2
-    from psycopg2 import Error as PostgreSQLError
-    POSTGRESQL_AVAILABLE = True
-except ImportError:
-    POSTGRESQL_AVAILABLE = False
-
-try:
-    import sqlite3
-    SQLITE_AVAILABLE = True
-except ImportError:
-    SQLITE_AVAILABLE = False
-
-try:
-    import snowflake.connector
-    from snowflake.connector.errors import ProgrammingError, DatabaseError
-    SNOWFLAKE_AVAILABLE = True
-except ImportError:
-    SNOWFLAKE_AVAILABLE = False
+import sqlite3
+
+from servers.utils.metrics import metrics
+from servers.utils.connection_pool import ConnectionPool
 
 logger = logging.getLogger(__name__)
 
 TIMEOUT = 60
 MAX_CSV_CHARS = 2000
+MAX_POOL_SIZE = 32
+
+QUERY_LATENCY = metrics.histogram("db_query_seconds", "SQL execution time by database type and outcome")
+QUERY_ROWS = metrics.counter("db_rows_returned_total", "Rows fetched by database type")
+TRUNCATED_RESULTS = metrics.counter("db_truncated_results_total", "Query results truncated to MAX_CSV_CHARS")
+CONNECTIONS_OPENED = metrics.counter("db_connections_opened_total", "Database connections opened by database type")
+CONNECT_LATENCY = metrics.histogram("db_connect_seconds", "Time to open a database connection")
+OPEN_CONNECTIONS = metrics.gauge("db_open_connections", "Currently open database connections by database type")
+
+def _load_driver(db_type: str):
+    """Import the driver for a database type on first use; returns None if it is not installed"""
+    try:
+        if db_type == "mysql":
+            import mysql.connector
+            return mysql.connector
+        if db_type == "postgresql":
+            import psycopg2
+            return psycopg2
+        if db_type == "sqlite":
+            return sqlite3
+        if db_type == "snowflake":
+            import snowflake.connector
+            return snowflake.connector
+    except ImportError:
+        return None
+    return None
 
 class DatabaseConnector:
     def __init__(self, db_type: str = "mysql"):
@@ -81,18 +83,21 @@ class DatabaseConnector:
     def connect(self):
         """Establish database connection"""
         credentials = self.get_credentials()
+        labels = {"db_type": self.db_type}
+        connect_start = time.perf_counter()
         
         try:
-            if self.db_type == "mysql" and MYSQL_AVAILABLE:
-                self.connection = mysql.connector.connect(**credentials)
-            elif self.db_type == "postgresql" and POSTGRESQL_AVAILABLE:
-                self.connection = psycopg2.connect(**credentials)
-            elif self.db_type == "sqlite" and SQLITE_AVAILABLE:
-                self.connection = sqlite3.connect(credentials["database"])
-            elif self.db_type == "snowflake" and SNOWFLAKE_AVAILABLE:
-                self.connection = snowflake.connector.connect(**credentials)
-            else:
+            driver = _load_driver(self.db_type)
+            if driver is None:
                 raise Exception(f"Database type '{self.db_type}' not supported or driver not available")
+            if self.db_type == "sqlite":
+                # Pooled connections move between executor threads, but only one uses them at a time
+                self.connection = driver.connect(credentials["database"], check_same_thread=False)
+            else:
+                self.connection = driver.connect(**credentials)
+            CONNECT_LATENCY.observe(time.perf_counter() - connect_start, labels)
+            CONNECTIONS_OPENED.inc(labels=labels)
+            OPEN_CONNECTIONS.inc(labels=labels)
                 
         except Exception as e:
             logger.error(f"Failed to connect to {self.db_type}: {str(e)}")
@@ -105,6 +110,7 @@ class DatabaseConnector:
         
         start_time = time.time()
         content = ""
+        outcome = "ok"
         
         try:
             cursor = self.connection.cursor()
@@ -119,14 +125,17 @@ class DatabaseConnector:
                     headers = [desc[0] for desc in cursor.description]
                 
                 rows = cursor.fetchall()
+                QUERY_ROWS.inc(len(rows), {"db_type": self.db_type})
                 
                 if rows:
+                    import pandas as pd
                     df = pd.DataFrame(rows, columns=headers)
                     full_csv_data = df.to_csv(index=False)
                     total_rows = len(df)
                     
                     # Truncate if too long
                     if len(full_csv_data) > MAX_CSV_CHARS:
+                        TRUNCATED_RESULTS.inc(labels={"db_type": self.db_type})
                         truncated_csv = full_csv_data[:MAX_CSV_CHARS]
                         last_newline = truncated_csv.rfind('\n')
                         if last_newline > 0:
@@ -155,9 +164,20 @@ Note: Result truncated to {MAX_CSV_CHARS} characters. Complete result has {total
                 
         except Exception as e:
             content = f"Database Error: {str(e)}"
+            outcome = "error"
             logger.error(f"Database query error: {str(e)}")
+            # Clear the failed transaction so the pooled connection stays usable (PostgreSQL aborts it)
+            try:
+                self.connection.rollback()
+            except Exception:
+                # Connection is unusable; drop it and reconnect on the next query
+                try:
+                    self.close()
+                except Exception:
+                    self.connection = None
         finally:
             execution_time = time.time() - start_time
+            QUERY_LATENCY.observe(execution_time, {"db_type": self.db_type, "outcome": outcome})
             logger.info(f"Query execution completed in {execution_time:.2f} seconds")
         
         return {
@@ -169,16 +189,46 @@ Note: Result truncated to {MAX_CSV_CHARS} characters. Complete result has {total
         if self.connection:
             self.connection.close()
             self.connection = None
+            OPEN_CONNECTIONS.dec(labels={"db_type": self.db_type})
 
-# Global database connector instance
-_db_connector = None
+# Connection pools, one per database type
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
 
-def get_database_connector(db_type: str = "mysql") -> DatabaseConnector:
-    """Get or create database connector instance"""
-    global _db_connector
-    if _db_connector is None or _db_connector.db_type != db_type:
-        _db_connector = DatabaseConnector(db_type)
-    return _db_connector
+def _open_connector(db_type: str) -> DatabaseConnector:
+    connector = DatabaseConnector(db_type)
+    connector.connect()
+    return connector
+
+def get_connection_pool(db_type: str = "mysql") -> ConnectionPool:
+    """Get or create the connection pool for a database type"""
+    db_type = db_type.lower()
+    pool = _pools.get(db_type)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(db_type)
+            if pool is None:
+                pool = ConnectionPool(
+                    db_type,
+                    factory=lambda: _open_connector(db_type),
+                    closer=lambda connector: connector.close(),
+                    max_size=MAX_POOL_SIZE
+                )
+                _pools[db_type] = pool
+    return pool
+
+def warmup(db_type: str = "mysql", connections: int = 1) -> Dict[str, Any]:
+    """Open pooled connections ahead of the first query and check them with a trivial query"""
+    if db_type.lower() == "sqlite":
+        database = DatabaseConnector("sqlite").get_credentials()["database"]
+        if database != ":memory:" and not os.path.exists(database):
+            # Connecting would create an empty database file; there is nothing to warm yet
+            return {"db_type": db_type, "skipped": f"database not found: {os.path.abspath(database)}"}
+    pool = get_connection_pool(db_type)
+    opened = pool.prefill(connections)
+    with pool.connection() as connector:
+        connector.execute_query("SELECT 1")
+    return {"db_type": db_type, "opened": opened, "pool_size": pool.size}
 
 def execute_database_sql(sql: str, db_type: str = "mysql", **kwargs) -> Dict[str, Any]:
     """Execute SQL query on the specified database type"""
@@ -187,8 +237,8 @@ def execute_database_sql(sql: str, db_type: str = "mysql", **kwargs) -> Dict[str
     timeout = kwargs.get('timeout', TIMEOUT)
     
     try:
-        connector = get_database_connector(db_type)
-        result = connector.execute_query(sql, timeout)
+        with get_connection_pool(db_type).connection(timeout=timeout) as connector:
+            result = connector.execute_query(sql, timeout)
         return result
     except Exception as e:
         error_msg = f"Failed to execute query: {str(e)}"
@@ -197,11 +247,19 @@ def execute_database_sql(sql: str, db_type: str = "mysql", **kwargs) -> Dict[str
             "content": f"EXECUTION RESULT of [execute_database_sql]:\n{error_msg}"
         }
 
+# Specific database tools for backward compatibility
+def execute_mysql_sql(sql: str, **kwargs) -> Dict[str, Any]:
+    return execute_database_sql(sql, "mysql", **kwargs)
+
+def execute_postgresql_sql(sql: str, **kwargs) -> Dict[str, Any]:
+    return execute_database_sql(sql, "postgresql", **kwargs)
+
+def execute_sqlite_sql(sql: str, **kwargs) -> Dict[str, Any]:
+    return execute_database_sql(sql, "sqlite", **kwargs)
+
 def register_tools(registry):
     """Register database tools with the tool registry"""
     registry.register_tool("execute_database_sql", execute_database_sql)
-    
-    # Also register specific database tools for backward compatibility
-    registry.register_tool("execute_mysql_sql", lambda sql, **kwargs: execute_database_sql(sql, "mysql", **kwargs))
-    registry.register_tool("execute_postgresql_sql", lambda sql, **kwargs: execute_database_sql(sql, "postgresql", **kwargs))
-    registry.register_tool("execute_sqlite_sql", lambda sql, **kwargs: execute_database_sql(sql, "sqlite", **kwargs))
+    registry.register_tool("execute_mysql_sql", execute_mysql_sql)
+    registry.register_tool("execute_postgresql_sql", execute_postgresql_sql)
+    registry.register_tool("execute_sqlite_sql", execute_sqlite_sql)
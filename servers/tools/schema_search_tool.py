@@ -0,0 +1,321 @@
+import csv
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Any, List, Tuple
+
+from servers.utils.metrics import metrics
+from servers.utils.schema_ddl import split_schema
+
+logger = logging.getLogger(__name__)
+
+# Indexes live outside the database directories, one file per database; SCHEMA_SEARCH_INDEX_DIR or
+# serve.py --schema_search_index_dir moves them
+DEFAULT_INDEX_DIR = os.path.join(os.path.expanduser("~"), ".cache", "spider-agent", "schema_search")
+INDEX_VERSION = 1
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+MAX_CHARS = 2000  # Maximum characters to display
+# How often queries rescan an indexed database for changed files; 0 = never, a query is one FTS5 lookup.
+# SCHEMA_SEARCH_RESCAN_SECONDS or serve.py --schema_search_rescan_seconds turn rescans on
+DEFAULT_RESCAN_SECONDS = 0.0
+# Sample values indexed per document
+MAX_SAMPLE_CHARS = 4000
+
+# bm25() weights of the indexed columns: a hit in a table name outranks one in a column name,
+# which outranks descriptions and sample values
+BM25_WEIGHTS = (10.0, 4.0, 2.0, 1.0)
+
+SEARCH_LATENCY = metrics.histogram("schema_search_seconds", "search_schema wall time by outcome")
+FILES_INDEXED = metrics.counter("schema_search_files_indexed_total", "Schema files (re)indexed for search_schema")
+
+_QUERY_TERM = re.compile(r"\w+", re.UNICODE)
+
+_db_locks = defaultdict(threading.Lock)
+_db_locks_lock = threading.Lock()
+_last_scan: Dict[str, float] = {}
+_index_dir = os.environ.get("SCHEMA_SEARCH_INDEX_DIR") or DEFAULT_INDEX_DIR
+_rescan_seconds = float(os.environ.get("SCHEMA_SEARCH_RESCAN_SECONDS") or DEFAULT_RESCAN_SECONDS)
+
+csv.field_size_limit(1 << 30)
+
+
+def _db_lock(db_dir: str) -> threading.Lock:
+    with _db_locks_lock:
+        return _db_locks[db_dir]
+
+
+def _text(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (list, tuple)):
+        return "\n".join(_text(v) for v in value if v is not None)
+    if isinstance(value, dict):
+        return "\n".join(f"{k}: {_text(v)}" for k, v in value.items())
+    return str(value)
+
+
+def _sample_values(rows) -> str:
+    values = []
+    for row in rows if isinstance(rows, list) else []:
+        values.extend(row.values() if isinstance(row, dict) else row if isinstance(row, list) else [row])
+    return " | ".join(str(v) for v in values if v not in (None, ""))[:MAX_SAMPLE_CHARS]
+
+
+def _documents_from_json(text: str) -> List[Tuple[str, str, str, str]]:
+    """One table described by a JSON file (table_name, column_names, column_types, description, sample_rows)"""
+    data = json.loads(text)
+    if not isinstance(data, dict):
+        return []
+    name = data.get("table_fullname") or data.get("table_name")
+    if not name:
+        return []
+    names = data.get("column_names") or []
+    types = data.get("column_types") or []
+    columns = [f"{column} {types[i]}" if i < len(types) else str(column) for i, column in enumerate(names)]
+    return [(str(name), "\n".join(columns), _text(data.get("description")), _sample_values(data.get("sample_rows")))]
+
+
+def _documents_from_ddl_csv(text: str) -> List[Tuple[str, str, str, str]]:
+    """One table per row of a DDL.csv (table_name, description, DDL)"""
+    documents = []
+    for row in csv.DictReader(text.splitlines()):
+        row = {(key or "").strip().lower(): value for key, value in row.items()}
+        name = row.get("table_name") or ""
+        if name:
+            documents.append((name, row.get("ddl") or "", row.get("description") or "", ""))
+    return documents
+
+
+def _documents_from_sql(text: str) -> List[Tuple[str, str, str, str]]:
+    """One table per CREATE statement of a schema.sql; its `--` comments, including those on the
+    lines just above it, go in the description"""
+    documents = []
+    for name, definition in split_schema(text)[1]:
+        comments = "\n".join(line.strip()[2:].strip() for line in definition.splitlines()
+                             if line.strip().startswith("--"))
+        documents.append((name, definition, comments, ""))
+    return documents
+
+
+_PARSERS = {
+    ".json": _documents_from_json,
+    ".csv": _documents_from_ddl_csv,
+    ".sql": _documents_from_sql,
+}
+
+
+def _indexable(filename: str) -> bool:
+    if filename.startswith("."):
+        return False
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == ".csv":
+        return filename.upper() == "DDL.CSV"
+    return extension in _PARSERS
+
+
+def _scan(db_dir: str) -> Dict[str, Tuple[int, int]]:
+    """{relative path: (mtime_ns, size)} of the schema documents under db_dir"""
+    files = {}
+    for dirpath, dirnames, filenames in os.walk(db_dir):
+        dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+        for filename in filenames:
+            if not _indexable(filename):
+                continue
+            path = os.path.join(dirpath, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files[os.path.relpath(path, db_dir)] = (stat.st_mtime_ns, stat.st_size)
+    return files
+
+
+def set_index_dir(path: str):
+    """Keep the indexes of all databases under `path` from now on"""
+    global _index_dir
+    _index_dir = path
+
+
+def set_rescan_seconds(seconds: float):
+    """Let queries rescan an indexed database for changed files at most every `seconds` (0 = never)"""
+    global _rescan_seconds
+    _rescan_seconds = max(float(seconds), 0.0)
+
+
+def index_path(db_dir: str) -> str:
+    """Index file of a database directory: named after its db_id, plus a hash of its absolute path so
+    databases of the same name under different databases_paths don't share an index"""
+    db_dir = os.path.abspath(db_dir)
+    digest = hashlib.sha1(db_dir.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(_index_dir, f"{os.path.basename(db_dir)}-{digest}.sqlite")
+
+
+def _connect(db_dir: str) -> sqlite3.Connection:
+    path = index_path(db_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version != INDEX_VERSION:
+        conn.executescript("""
+            DROP TABLE IF EXISTS files;
+            DROP TABLE IF EXISTS docs;
+            CREATE TABLE files (path TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, size INTEGER NOT NULL);
+            CREATE VIRTUAL TABLE docs USING fts5(
+                path UNINDEXED, table_name, columns, description, samples,
+                tokenize = 'porter unicode61 remove_diacritics 2'
+            );
+        """)
+        conn.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+        conn.commit()
+    return conn
+
+
+def _is_indexed(db_dir: str) -> bool:
+    """Whether db_dir has an index (built by an earlier process, the warm-up or build_schema_index.py)"""
+    if not os.path.exists(index_path(db_dir)):
+        return False
+    conn = _connect(db_dir)
+    try:
+        return conn.execute("SELECT 1 FROM files LIMIT 1").fetchone() is not None
+    finally:
+        conn.close()
+
+
+def _needs_scan(db_dir: str) -> bool:
+    last_scan = _last_scan.get(db_dir)
+    if last_scan is None:
+        return True
+    return _rescan_seconds > 0 and time.monotonic() - last_scan >= _rescan_seconds
+
+
+def update_index(db_dir: str, force: bool = False) -> Dict[str, int]:
+    """Bring the index of db_dir (see index_path) up to date with the schema documents under it.
+
+    Only files whose mtime or size changed since they were indexed are
+    parsed again; files that disappeared are dropped. Unless `force`, an
+    existing index is used as it is, and rescanned only every
+    `_rescan_seconds` if that is set (see set_rescan_seconds): build indexes
+    ahead with the server's --warmup or build_schema_index.py --search, so
+    no query waits for one.
+    """
+    db_dir = os.path.abspath(db_dir)
+    if not os.path.isdir(db_dir):
+        raise FileNotFoundError(f"Database directory not found: {db_dir}")
+    if not force and not _needs_scan(db_dir):
+        return {"indexed": 0, "removed": 0}
+    with _db_lock(db_dir):
+        if not force:
+            if not _needs_scan(db_dir):
+                # Another query scanned it while this one waited for the lock
+                return {"indexed": 0, "removed": 0}
+            if db_dir not in _last_scan and _rescan_seconds <= 0 and _is_indexed(db_dir):
+                _last_scan[db_dir] = time.monotonic()
+                return {"indexed": 0, "removed": 0}
+        current = _scan(db_dir)
+        conn = _connect(db_dir)
+        try:
+            indexed = {path: (mtime_ns, size) for path, mtime_ns, size in conn.execute("SELECT * FROM files")}
+            changed = [path for path, stamp in current.items() if indexed.get(path) != stamp]
+            removed = [path for path in indexed if path not in current]
+            with conn:
+                for path in removed + changed:
+                    conn.execute("DELETE FROM docs WHERE path = ?", (path,))
+                    conn.execute("DELETE FROM files WHERE path = ?", (path,))
+                for path in changed:
+                    try:
+                        with open(os.path.join(db_dir, path), "r", encoding="utf-8", errors="replace") as f:
+                            documents = _PARSERS[os.path.splitext(path)[1].lower()](f.read())
+                    except (OSError, ValueError) as e:
+                        logger.warning(f"Skipping unreadable schema file {path} in {db_dir}: {str(e)}")
+                        documents = []
+                    conn.executemany("INSERT INTO docs VALUES (?, ?, ?, ?, ?)",
+                                     [(path, *document) for document in documents])
+                    conn.execute("INSERT INTO files VALUES (?, ?, ?)", (path, *current[path]))
+        finally:
+            conn.close()
+        _last_scan[db_dir] = time.monotonic()
+    if changed:
+        FILES_INDEXED.inc(len(changed))
+        logger.info(f"Indexed {len(changed)} schema files in {db_dir} ({len(removed)} removed)")
+    return {"indexed": len(changed), "removed": len(removed), "files": len(current)}
+
+
+def _match_expression(query: str) -> str:
+    """FTS5 query matching documents with any of the words of `query`"""
+    terms = dict.fromkeys(term.lower() for term in _QUERY_TERM.findall(query.replace("_", " ")))
+    return " OR ".join(f'"{term}"' for term in terms)
+
+
+def search_index(db_dir: str, query: str, limit: int = DEFAULT_LIMIT) -> List[Dict[str, Any]]:
+    """Best matching tables for `query`, best first"""
+    expression = _match_expression(query)
+    if not expression:
+        return []
+    update_index(db_dir)
+    conn = _connect(os.path.abspath(db_dir))
+    try:
+        rows = conn.execute(
+            f"SELECT path, table_name, snippet(docs, -1, '[', ']', '...', 16), bm25(docs, 0, {', '.join(map(str, BM25_WEIGHTS))}) "
+            "FROM docs WHERE docs MATCH ? ORDER BY 4 LIMIT ?",
+            (expression, limit),
+        ).fetchall()
+    finally:
+        conn.close()
+    return [{"path": path, "table": table, "snippet": " ".join(snippet.split()), "score": -score}
+            for path, table, snippet, score in rows]
+
+
+def search_schema(query: str, work_dir: str = None, limit: int = DEFAULT_LIMIT, **kwargs) -> Dict[str, Any]:
+    """
+    Ranked full-text search over the schema documents of a database
+
+    Args:
+        query: Words to look for in table names, column names, descriptions and sample values
+        work_dir: The database directory (databases_path/<db_id>), set by the agent
+        limit: Maximum number of tables to return
+        **kwargs: Additional parameters
+
+    Returns:
+        Dictionary containing the matching tables with the file describing each
+    """
+    start_time = time.perf_counter()
+    outcome = "ok"
+    try:
+        if not work_dir:
+            raise ValueError("work_dir (the database directory) is required")
+        try:
+            limit = min(max(int(limit), 1), MAX_LIMIT)
+        except (TypeError, ValueError):
+            limit = DEFAULT_LIMIT
+        hits = search_index(work_dir, query or "", limit)
+        if hits:
+            content = "\n".join(f"{i}. {hit['table']} ({hit['path']})\n   {hit['snippet']}"
+                                for i, hit in enumerate(hits, 1))
+        else:
+            outcome = "no_match"
+            content = f"No tables match: {query}"
+        if len(content) > MAX_CHARS:
+            content = f"{content[:MAX_CHARS]}\n\n[OUTPUT TRUNCATED]"
+    except Exception as e:
+        outcome = "error"
+        content = f"Error searching schema: {str(e)}"
+        logger.error(content)
+    SEARCH_LATENCY.observe(time.perf_counter() - start_time, {"outcome": outcome})
+    return {
+        "content": f"EXECUTION RESULT of [search_schema]:\n{content}"
+    }
+
+
+def register_tools(registry):
+    """
+    Register tools with the tool registry
+    """
+    registry.register_tool("search_schema", search_schema)
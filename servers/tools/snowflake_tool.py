@@ -1,16 +1,25 @@
-import snowflake.connector
-from snowflake.connector.errors import ProgrammingError, DatabaseError
-import pandas as pd
 from typing import Dict, Any, Tuple
 import logging
 import time
 import json
 import os
 
+from servers.utils.metrics import metrics
+from servers.utils.connection_pool import ConnectionPool
+
 logger = logging.getLogger(__name__)
 
 TIMEOUT = 60
 MAX_CSV_CHARS = 2000
+MAX_POOL_SIZE = 32
+
+QUERY_LATENCY = metrics.histogram("db_query_seconds", "SQL execution time by database type and outcome")
+QUERY_ROWS = metrics.counter("db_rows_returned_total", "Rows fetched by database type")
+TRUNCATED_RESULTS = metrics.counter("db_truncated_results_total", "Query results truncated to MAX_CSV_CHARS")
+CONNECTIONS_OPENED = metrics.counter("db_connections_opened_total", "Database connections opened by database type")
+CONNECT_LATENCY = metrics.histogram("db_connect_seconds", "Time to open a database connection")
+OPEN_CONNECTIONS = metrics.gauge("db_open_connections", "Currently open database connections by database type")
+LABELS = {"db_type": "snowflake"}
 
 def get_snowflake_credentials() -> Dict[str, str]:
     credentials_path = "credentials/snowflake_credential.json"
@@ -27,29 +36,73 @@ def get_snowflake_credentials() -> Dict[str, str]:
         logger.error(f"Error loading credentials: {str(e)}")
         raise
 
+def _open_connection():
+    import snowflake.connector
+    
+    # Get Snowflake credentials from file
+    snowflake_credential = get_snowflake_credentials()
+    
+    # Connect to Snowflake using credentials
+    connect_start = time.perf_counter()
+    conn = snowflake.connector.connect(
+        **snowflake_credential,
+        login_timeout=TIMEOUT,
+        network_timeout=TIMEOUT
+    )
+    CONNECT_LATENCY.observe(time.perf_counter() - connect_start, LABELS)
+    CONNECTIONS_OPENED.inc(labels=LABELS)
+    OPEN_CONNECTIONS.inc(labels=LABELS)
+    return conn
+
+def _close_connection(conn):
+    conn.close()
+    OPEN_CONNECTIONS.dec(labels=LABELS)
+
+# Logged-in sessions are reused across queries instead of reconnecting per call
+_pool = ConnectionPool("snowflake", factory=_open_connection, closer=_close_connection, max_size=MAX_POOL_SIZE)
+
+def warmup(connections: int = 1, **kwargs) -> Dict[str, Any]:
+    """Log in ahead of the first query and resume the configured warehouse"""
+    opened = _pool.prefill(connections)
+    warehouse = get_snowflake_credentials().get("warehouse")
+    with _pool.connection() as conn:
+        cursor = conn.cursor()
+        if warehouse:
+            try:
+                cursor.execute(f'ALTER WAREHOUSE "{warehouse}" RESUME IF SUSPENDED')
+            except Exception as e:
+                # Resuming needs OPERATE privilege; a query on the warehouse auto-resumes it as well
+                logger.info(f"Could not resume warehouse {warehouse} explicitly: {str(e)}")
+        cursor.execute("SELECT 1")
+        cursor.fetchall()
+    return {"db_type": "snowflake", "opened": opened, "pool_size": _pool.size, "warehouse": warehouse}
+
 def execute_snowflake_sql(sql: str, **kwargs) -> Dict[str, Any]:
     logger.info(f"Executing Snowflake SQL: {sql}")
     
+    # Imported on first use so the server starts (and other tools work) without the connector installed
+    try:
+        import snowflake.connector
+        from snowflake.connector.errors import ProgrammingError, DatabaseError
+    except ImportError:
+        return {
+            "content": "EXECUTION RESULT of [execute_snowflake_sql]:\nUnexpected error: snowflake-connector-python is not installed"
+        }
+    
     timeout = kwargs.get('timeout', TIMEOUT)
     start_time = time.time()
     
     content = ""
+    outcome = "ok"
     
     conn = None
+    discard = False
     try:
-        # Get Snowflake credentials from file
-        snowflake_credential = get_snowflake_credentials()
-        
-        # Connect to Snowflake using credentials
-        conn = snowflake.connector.connect(
-            **snowflake_credential,
-            login_timeout=timeout,
-            network_timeout=timeout
-        )
+        conn = _pool.acquire(timeout=timeout)
         cursor = conn.cursor()
         
         # Execute SQL query
-        cursor.execute(sql)
+        cursor.execute(sql, timeout=timeout)
         
         # First print success message
         print("Query executed successfully")
@@ -58,7 +111,9 @@ def execute_snowflake_sql(sql: str, **kwargs) -> Dict[str, Any]:
         if cursor.description:
             headers = [desc[0] for desc in cursor.description]
             rows = cursor.fetchall()
+            QUERY_ROWS.inc(len(rows), LABELS)
             if rows:
+                import pandas as pd
                 df = pd.DataFrame(rows, columns=headers)
                 
                 # Convert full dataset to CSV
@@ -67,6 +122,7 @@ def execute_snowflake_sql(sql: str, **kwargs) -> Dict[str, Any]:
                 
                 # Check if we need to truncate by character length
                 if len(full_csv_data) > MAX_CSV_CHARS:
+                    TRUNCATED_RESULTS.inc(labels=LABELS)
                     # Truncate to MAX_CSV_CHARS characters
                     truncated_csv = full_csv_data[:MAX_CSV_CHARS]
                     
@@ -97,22 +153,31 @@ Note: The result has been truncated to {MAX_CSV_CHARS} characters for display pu
         
     except ProgrammingError as e:
         content = f"SQL Error: {str(e)}"
+        outcome = "error"
         logger.error(f"Snowflake SQL error: {str(e)}")
     except DatabaseError as e:
         content = f"Database error: {str(e)}"
+        outcome = "error"
+        discard = True
         logger.error(f"Snowflake database error: {str(e)}")
     except TimeoutError:
         content = f"Execution timed out after {timeout} seconds."
+        outcome = "error"
+        discard = True
         logger.error(f"Snowflake query timed out: {sql}")
     except Exception as e:
         content = f"Unexpected error: {str(e)}"
+        outcome = "error"
+        discard = True
         logger.error(f"Unexpected error executing Snowflake query: {str(e)}")
     finally:
         if conn:
-            conn.close()
+            # SQL errors leave the session usable; anything else may have broken it
+            _pool.release(conn, discard=discard)
             
         # Log execution time
         execution_time = time.time() - start_time
+        QUERY_LATENCY.observe(execution_time, {**LABELS, "outcome": outcome})
         logger.info(f"Execution completed in {execution_time:.2f} seconds")
     
     return {
@@ -0,0 +1,131 @@
+import threading
+import time
+import logging
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Optional
+
+from servers.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+POOL_SIZE = metrics.gauge("pool_connections", "Open connections held by a pool (idle + in use)")
+POOL_IN_USE = metrics.gauge("pool_in_use", "Pooled connections currently checked out")
+POOL_WAIT = metrics.histogram("pool_wait_seconds", "Time spent waiting to check out a pooled connection")
+POOL_CHECKOUTS = metrics.counter("pool_checkouts_total", "Connection checkouts by pool and whether a new connection was opened")
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of reusable connections.
+
+    `factory` opens a new connection and `closer` releases one. Idle
+    connections are reused LIFO so the warmest connection is handed out first.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Any], closer: Callable[[Any], None], max_size: int = 8):
+        self.name = name
+        self.factory = factory
+        self.closer = closer
+        self.max_size = max_size
+        self._idle = deque()
+        self._size = 0
+        self._cond = threading.Condition()
+        self._labels = {"pool": name}
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def _open(self) -> Any:
+        try:
+            return self.factory()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                POOL_SIZE.set(self._size, self._labels)
+                self._cond.notify()
+            raise
+
+    def acquire(self, timeout: Optional[float] = None) -> Any:
+        start = time.perf_counter()
+        with self._cond:
+            while not self._idle and self._size >= self.max_size:
+                remaining = None if timeout is None else timeout - (time.perf_counter() - start)
+                if remaining is not None and remaining <= 0:
+                    raise TimeoutError(f"Timed out waiting for a connection from pool {self.name}")
+                self._cond.wait(remaining)
+            if self._idle:
+                conn = self._idle.pop()
+                opened = False
+            else:
+                # Reserve the slot before opening outside the lock
+                self._size += 1
+                POOL_SIZE.set(self._size, self._labels)
+                conn = None
+                opened = True
+            POOL_IN_USE.inc(labels=self._labels)
+        POOL_WAIT.observe(time.perf_counter() - start, self._labels)
+        POOL_CHECKOUTS.inc(labels={**self._labels, "new": str(opened).lower()})
+        if conn is None:
+            try:
+                conn = self._open()
+            except Exception:
+                POOL_IN_USE.dec(labels=self._labels)
+                raise
+        return conn
+
+    def release(self, conn: Any, discard: bool = False):
+        """Return a connection to the pool, or close it if it is broken"""
+        POOL_IN_USE.dec(labels=self._labels)
+        if discard:
+            self._close(conn)
+            with self._cond:
+                self._size -= 1
+                POOL_SIZE.set(self._size, self._labels)
+                self._cond.notify()
+            return
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None):
+        conn = self.acquire(timeout)
+        discard = False
+        try:
+            yield conn
+        except Exception:
+            discard = True
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    def prefill(self, count: int) -> int:
+        """Open idle connections up front until the pool holds `count` (capped at max_size)"""
+        opened = 0
+        while True:
+            with self._cond:
+                if self._size >= min(count, self.max_size):
+                    return opened
+                self._size += 1
+                POOL_SIZE.set(self._size, self._labels)
+            conn = self._open()
+            with self._cond:
+                self._idle.append(conn)
+                self._cond.notify()
+            opened += 1
+
+    def _close(self, conn: Any):
+        try:
+            self.closer(conn)
+        except Exception as e:
+            logger.warning(f"Error closing connection from pool {self.name}: {str(e)}")
+
+    def close_all(self):
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            POOL_SIZE.set(self._size, self._labels)
+        for conn in idle:
+            self._close(conn)
@@ -0,0 +1,145 @@
+import concurrent.futures
+import logging
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+from servers.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_KEY = "default"
+
+ACTIVE_KEYS = metrics.gauge("scheduler_active_keys", "Rollout keys with queued tool calls")
+THROTTLED = metrics.counter("scheduler_throttled_total", "Dispatch attempts skipped because a key hit its concurrency cap")
+
+
+class _Task:
+    __slots__ = ("fn", "cost", "future")
+
+    def __init__(self, fn: Callable[[], Any], cost: float):
+        self.fn = fn
+        self.cost = cost
+        self.future = concurrent.futures.Future()
+
+
+class _KeyState:
+    __slots__ = ("queue", "deficit", "weight", "running")
+
+    def __init__(self, weight: float):
+        self.queue = deque()
+        self.deficit = 0.0
+        self.weight = weight
+        self.running = 0
+
+
+class FairScheduler:
+    """Thread pool that shares workers across rollout keys with deficit round robin.
+
+    Each key (one rollout) has its own FIFO queue. Workers serve keys in
+    round-robin order, charging each call its estimated cost (seconds) against
+    the key's deficit; a key whose deficit can't cover its next call waits for
+    the next round, where it is credited in proportion to its weight. Keys
+    running `max_per_key` calls are skipped until one finishes, so a rollout
+    firing heavy queries in a loop can't occupy every worker.
+    """
+
+    def __init__(self, max_workers: int, max_per_key: int = 0):
+        self.max_workers = max_workers
+        self.max_per_key = max_per_key if max_per_key > 0 else max_workers
+        self._keys: Dict[str, _KeyState] = {}
+        self._ring = deque()
+        self._cond = threading.Condition()
+        self._shutdown = False
+        self._threads = []
+        for i in range(max_workers):
+            thread = threading.Thread(target=self._worker, name=f"tool-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, key: Optional[str], fn: Callable[[], Any], cost: float = 1.0,
+               weight: float = 1.0) -> concurrent.futures.Future:
+        key = key or DEFAULT_KEY
+        task = _Task(fn, max(cost, 1e-6))
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError("Cannot submit to a scheduler that has been shut down")
+            state = self._keys.get(key)
+            if state is None:
+                state = _KeyState(max(weight, 1e-6))
+                self._keys[key] = state
+            if not state.queue:
+                self._ring.append(key)
+                ACTIVE_KEYS.set(len(self._ring))
+            state.queue.append(task)
+            self._cond.notify()
+        return task.future
+
+    def _pick(self) -> Optional[tuple]:
+        """Select the next (key, task) by deficit round robin; None if every queued key is capped"""
+        while self._ring:
+            eligible = []
+            for _ in range(len(self._ring)):
+                key = self._ring[0]
+                state = self._keys[key]
+                if state.running >= self.max_per_key:
+                    THROTTLED.inc()
+                    self._ring.rotate(-1)
+                    continue
+                task = state.queue[0]
+                if state.deficit >= task.cost:
+                    state.deficit -= task.cost
+                    state.queue.popleft()
+                    state.running += 1
+                    if not state.queue:
+                        # Idle keys don't bank credit
+                        self._ring.popleft()
+                        state.deficit = 0.0
+                        ACTIVE_KEYS.set(len(self._ring))
+                    elif state.deficit < state.queue[0].cost:
+                        self._ring.rotate(-1)
+                    return key, task
+                eligible.append(state)
+                self._ring.rotate(-1)
+            if not eligible:
+                return None
+            # Nobody can afford their next call: credit every eligible key by the same amount of
+            # weighted time, just enough for the closest one (equivalent to repeated DRR quanta)
+            step = min((s.queue[0].cost - s.deficit) / s.weight for s in eligible)
+            for state in eligible:
+                state.deficit += step * state.weight
+        return None
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                picked = self._pick()
+                while picked is None:
+                    if self._shutdown and not self._ring:
+                        return
+                    self._cond.wait()
+                    picked = self._pick()
+            key, task = picked
+            if task.future.set_running_or_notify_cancel():
+                try:
+                    task.future.set_result(task.fn())
+                except BaseException as e:
+                    task.future.set_exception(e)
+            with self._cond:
+                state = self._keys[key]
+                state.running -= 1
+                if state.running == 0 and not state.queue:
+                    del self._keys[key]
+                self._cond.notify_all()
+
+    def queue_depth(self) -> int:
+        with self._cond:
+            return sum(len(state.queue) for state in self._keys.values())
+
+    def shutdown(self, wait: bool = True):
+        with self._cond:
+            self._shutdown = True
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
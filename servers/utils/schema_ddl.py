@@ -0,0 +1,38 @@
+import re
+from typing import List, Tuple
+
+IDENTIFIER = r"(?:`[^`]+`|\"[^\"]+\"|\[[^\]]+\]|[\w$]+)"
+CREATE = re.compile(
+    r"^[ \t]*CREATE\s+(?:OR\s+REPLACE\s+)?(?:TEMP(?:ORARY)?\s+)?(?:TABLE|VIEW)\s+(?:IF\s+NOT\s+EXISTS\s+)?"
+    rf"({IDENTIFIER}(?:\s*\.\s*{IDENTIFIER})*)",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+
+def table_name(raw: str) -> str:
+    """Dotted table name with identifier quotes removed"""
+    return ".".join(part.strip().strip('`"[]') for part in re.findall(IDENTIFIER, raw))
+
+
+def split_schema(schema: str) -> Tuple[str, List[Tuple[str, str]]]:
+    """(preamble, [(table name, definition)]) of a schema.sql; `--` comment lines just above a
+    CREATE belong to its definition, as they usually describe the table"""
+    matches = list(CREATE.finditer(schema))
+    if not matches:
+        return schema.strip(), []
+    starts = []
+    for i, match in enumerate(matches):
+        start = match.start()
+        lower = matches[i - 1].end() if i else 0
+        # Walk back over the comment lines directly above the statement
+        while start > lower:
+            line_start = schema.rfind("\n", lower, start - 1) + 1
+            if line_start < lower or not schema[line_start:start].lstrip().startswith("--"):
+                break
+            start = line_start
+        starts.append(start)
+    tables = []
+    for i, match in enumerate(matches):
+        end = starts[i + 1] if i + 1 < len(matches) else len(schema)
+        tables.append((table_name(match.group(1)), schema[starts[i]:end].strip()))
+    return schema[:starts[0]].strip(), tables
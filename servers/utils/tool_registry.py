@@ -2,27 +2,74 @@ import importlib
 import inspect
 import pkgutil
 import asyncio
-from typing import Dict, Any, Callable, List, Optional
+from typing import Dict, Any, Callable, List, Optional, Tuple
 import logging
-import concurrent.futures
+import threading
+import time
 from functools import partial
 
+from servers.utils.metrics import metrics
+from servers.utils.fair_scheduler import FairScheduler
+
 logger = logging.getLogger(__name__)
 
+TOOL_CALLS = metrics.counter("tool_calls_total", "Tool calls by tool and outcome")
+TOOL_LATENCY = metrics.histogram("tool_latency_seconds", "Tool execution time, excluding queue wait")
+TOOL_QUEUE_WAIT = metrics.histogram("tool_queue_wait_seconds", "Time a tool call waited for an executor worker")
+QUEUE_DEPTH = metrics.gauge("executor_queue_depth", "Tool calls waiting for an executor worker")
+IN_FLIGHT = metrics.gauge("executor_in_flight", "Tool calls currently running on executor workers")
+EXECUTOR_WORKERS = metrics.gauge("executor_workers", "Size of the tool executor thread pool")
+TOOL_IMPORT_TIME = metrics.histogram("tool_import_seconds", "Time to import a lazily loaded tool module")
+
+
+class LazyTool:
+    """Callable placeholder for a manifest entry; imports the tool module on first call"""
+
+    def __init__(self, name: str, target: str):
+        self.name = name
+        self.module_name, self.attr = target.split(":", 1)
+        self._func = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._func is not None
+
+    def resolve(self) -> Callable:
+        if self._func is None:
+            with self._lock:
+                if self._func is None:
+                    start = time.perf_counter()
+                    module = importlib.import_module(self.module_name)
+                    self._func = getattr(module, self.attr)
+                    elapsed = time.perf_counter() - start
+                    TOOL_IMPORT_TIME.observe(elapsed, {"module": self.module_name})
+                    logger.info(f"Loaded tool {self.name} from {self.module_name} in {elapsed:.3f}s")
+        return self._func
+
+    def __call__(self, **kwargs):
+        return self.resolve()(**kwargs)
+
 class ToolRegistry:
 
     def __init__(self):
         self.tools = {}
         self.executor = None
         self.workers_per_tool = 8
+        self.max_per_key = 4
+        # Per-tool EWMA of execution time, used as the fair-scheduling cost of a call
+        self.cost_estimates = {}
     
-    def set_workers_per_tool(self, workers: int):
+    def set_workers_per_tool(self, workers: int, max_per_key: Optional[int] = None):
  
         self.workers_per_tool = workers
+        if max_per_key is not None:
+            self.max_per_key = max_per_key
 
         if self.executor:
             self.executor.shutdown(wait=True)
-        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers_per_tool)
+        self.executor = FairScheduler(max_workers=self.workers_per_tool, max_per_key=self.max_per_key)
+        EXECUTOR_WORKERS.set(self.workers_per_tool)
     
     def register_tool(self, name: str, func: Callable):
         if name in self.tools:
@@ -33,7 +80,8 @@ class ToolRegistry:
     def has_tool(self, name: str) -> bool:
         return name in self.tools
     
-    def load_tools(self):
+    def load_tools(self, lazy: bool = True):
+        """Register tools from the manifest in servers/tools, deferring imports until first use"""
         logger.info("Loading tools...")
 
         # Fix import path issue
@@ -47,8 +95,15 @@ class ToolRegistry:
         
         import servers.tools as tools_package
         
+        manifest = getattr(tools_package, "TOOL_MANIFEST", {})
+        manifest_modules = set()
+        for tool_name, target in manifest.items():
+            tool = LazyTool(tool_name, target)
+            manifest_modules.add(tool.module_name)
+            self.register_tool(tool_name, tool)
+        
         for _, module_name, is_pkg in pkgutil.iter_modules(tools_package.__path__, tools_package.__name__ + '.'):
-            if not is_pkg:
+            if not is_pkg and module_name not in manifest_modules:
                 try:
                     module = importlib.import_module(module_name)
                     
@@ -57,21 +112,78 @@ class ToolRegistry:
                 except Exception as e:
                     logger.error(f"Error loading module {module_name}: {str(e)}")
         
+        if not lazy:
+            self.preload_tools()
+        
         logger.info(f"Loaded {len(self.tools)} tools: {', '.join(self.tools.keys())}")
 
         if not self.executor:
-            self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.workers_per_tool)
+            self.executor = FairScheduler(max_workers=self.workers_per_tool, max_per_key=self.max_per_key)
+            EXECUTOR_WORKERS.set(self.workers_per_tool)
     
-    async def execute_tool(self, name: str, **kwargs) -> Any:
+    def preload_tools(self, names: Optional[List[str]] = None):
+        """Import the modules behind lazily registered tools now instead of on first call"""
+        for name, tool in list(self.tools.items()):
+            if names is not None and name not in names:
+                continue
+            if isinstance(tool, LazyTool) and not tool.loaded:
+                try:
+                    tool.resolve()
+                except Exception as e:
+                    logger.error(f"Error loading tool {name} from {tool.module_name}: {str(e)}")
+    
+    def _run_timed(self, name: str, tool_func: Callable, submitted_at: float,
+                   timing: Dict[str, float], kwargs: Dict[str, Any]) -> Any:
+        """Run a tool on an executor worker, recording queue wait and execution time"""
+        labels = {"tool": name}
+        started_at = time.perf_counter()
+        QUEUE_DEPTH.dec()
+        IN_FLIGHT.inc()
+        timing["queue"] = started_at - submitted_at
+        TOOL_QUEUE_WAIT.observe(timing["queue"], labels)
+        outcome = "ok"
+        try:
+            return tool_func(**kwargs)
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            IN_FLIGHT.dec()
+            timing["exec"] = time.perf_counter() - started_at
+            previous = self.cost_estimates.get(name)
+            self.cost_estimates[name] = timing["exec"] if previous is None else 0.8 * previous + 0.2 * timing["exec"]
+            TOOL_LATENCY.observe(timing["exec"], labels)
+            TOOL_CALLS.inc(labels={"tool": name, "outcome": outcome})
+    
+    async def execute_tool_timed(self, name: str, arguments: Dict[str, Any], rollout_key: Optional[str] = None,
+                                 weight: float = 1.0) -> Tuple[Any, Dict[str, float]]:
+        """Execute a tool and also return its queue wait and execution time in seconds.
+
+        Calls are queued per rollout_key and dispatched fairly across keys.
+        """
         if name not in self.tools:
             raise ValueError(f"Tool {name} not registered")
         
         tool_func = self.tools[name]
+        timing = {"queue": 0.0, "exec": 0.0}
         
-        loop = asyncio.get_event_loop()
-        result = await loop.run_in_executor(
-            self.executor,
-            partial(tool_func, **kwargs)
-        )
+        QUEUE_DEPTH.inc()
+        try:
+            future = self.executor.submit(
+                rollout_key,
+                partial(self._run_timed, name, tool_func, time.perf_counter(), timing, arguments),
+                cost=max(self.cost_estimates.get(name, 0.1), 0.001),
+                weight=weight
+            )
+        except BaseException:
+            QUEUE_DEPTH.dec()
+            raise
+        # A call cancelled while queued (e.g. its request was dropped) never reaches _run_timed
+        future.add_done_callback(lambda f: QUEUE_DEPTH.dec() if f.cancelled() else None)
+        result = await asyncio.wrap_future(future)
         
+        return result, timing
+    
+    async def execute_tool(self, name: str, **kwargs) -> Any:
+        result, _ = await self.execute_tool_timed(name, kwargs)
         return result
\ No newline at end of file
@@ -0,0 +1,64 @@
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Dict, Any, Optional
+
+TRACE_ID_HEADER = "X-Trace-Id"
+PARENT_SPAN_HEADER = "X-Parent-Span-Id"
+
+
+class TraceWriter:
+    """Appends server-side spans as Chrome trace events, linked to the agent's trace ID.
+
+    Uses the same event layout as agent/tracing.py so client and server files
+    can be loaded side by side in chrome://tracing or Perfetto.
+    """
+
+    def __init__(self, trace_file: Optional[str] = None):
+        self._fh = None
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        if trace_file:
+            os.makedirs(os.path.dirname(os.path.abspath(trace_file)), exist_ok=True)
+            self._fh = open(trace_file, "w", encoding="utf-8")
+            self._fh.write("[\n")
+
+    @property
+    def enabled(self) -> bool:
+        return self._fh is not None
+
+    def record(self, name: str, start_us: int, duration_us: int, trace_id: Optional[str],
+               parent_id: Optional[str] = None, **attrs) -> str:
+        span_id = uuid.uuid4().hex[:16]
+        if self._fh is None:
+            return span_id
+        args: Dict[str, Any] = {"trace_id": trace_id, "span_id": span_id, "parent_id": parent_id}
+        args.update(attrs)
+        event = {
+            "name": name,
+            "cat": "server",
+            "ph": "X",
+            "ts": start_us,
+            "dur": max(duration_us, 0),
+            "pid": self._pid,
+            "tid": threading.get_ident(),
+            "args": args,
+        }
+        line = json.dumps(event, ensure_ascii=False) + ",\n"
+        with self._lock:
+            if self._fh is not None:
+                self._fh.write(line)
+                self._fh.flush()
+        return span_id
+
+    def close(self):
+        with self._lock:
+            if self._fh is not None:
+                self._fh.close()
+                self._fh = None
+
+
+def now_us() -> int:
+    return time.time_ns() // 1000
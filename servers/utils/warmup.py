@@ -0,0 +1,169 @@
+import importlib
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, List, Optional
+
+from servers.utils.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DB_TYPES = ("mysql", "postgresql", "sqlite", "snowflake")
+
+# Tool module providing warmup(...) for each database type
+WARMUP_MODULES = {
+    "mysql": "servers.tools.database_tool",
+    "postgresql": "servers.tools.database_tool",
+    "sqlite": "servers.tools.database_tool",
+    "snowflake": "servers.tools.snowflake_tool",
+}
+
+WARMUP_SECONDS = metrics.histogram("warmup_seconds", "Time to warm one target by kind")
+WARMUP_FAILURES = metrics.counter("warmup_failures_total", "Warm-up targets that failed by kind")
+
+# Only schema and description documents are read by warm_files, and at most this much of each
+WARM_EXTENSIONS = (".json", ".csv", ".sql", ".md", ".txt")
+WARM_MAX_FILE_BYTES = 1 << 20
+
+# db_id -> sorted relative paths of the files describing that database
+_catalog: Dict[str, List[str]] = {}
+
+
+def get_catalog(db_id: str) -> Optional[List[str]]:
+    return _catalog.get(db_id)
+
+
+def _plain_name(item: str) -> bool:
+    """A db_id that names a directory directly under databases_path"""
+    return item not in (".", "..") and os.path.basename(item) == item and not (os.altsep and os.altsep in item)
+
+
+def parse_warmup_targets(items: List[str], databases_path: Optional[str] = None,
+                         allow_paths: bool = True) -> List[Dict[str, Any]]:
+    """Turn --warmup arguments into targets.
+
+    Each item is a database type ("snowflake"), a credentials file
+    ("credentials/mysql_credential.json"), an input .jsonl file whose db_id
+    fields are collected, or a db_id. Without `allow_paths` (targets sent by
+    clients) only database types and plain db_id names are accepted.
+    """
+    targets = []
+    seen = set()
+
+    def add(target):
+        key = (target["kind"], target.get("db_type") or target.get("db_id"))
+        if key not in seen:
+            seen.add(key)
+            targets.append(target)
+
+    for item in items:
+        item = str(item).strip()
+        if not item:
+            continue
+        if item.lower() in DB_TYPES:
+            add({"kind": "connection", "db_type": item.lower()})
+        elif not allow_paths:
+            if _plain_name(item):
+                add({"kind": "files", "db_id": item, "databases_path": databases_path})
+            else:
+                logger.warning(f"Ignoring warm-up target {item!r}: only database types and db_ids are accepted")
+        elif item.endswith("_credential.json"):
+            db_type = os.path.basename(item)[:-len("_credential.json")].lower()
+            if db_type in DB_TYPES:
+                add({"kind": "connection", "db_type": db_type})
+            else:
+                logger.warning(f"Unknown database type for credentials file {item}")
+        elif item.endswith(".jsonl") and os.path.isfile(item):
+            with open(item, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    db_id = json.loads(line).get("db_id")
+                    if db_id:
+                        add({"kind": "files", "db_id": db_id, "databases_path": databases_path})
+        else:
+            add({"kind": "files", "db_id": item, "databases_path": databases_path})
+    return targets
+
+
+def warm_connection(db_type: str, connections: int = 1) -> Dict[str, Any]:
+    """Open the pool for a database type (and resume the Snowflake warehouse)"""
+    module = importlib.import_module(WARMUP_MODULES[db_type])
+    if db_type == "snowflake":
+        return module.warmup(connections=connections)
+    return module.warmup(db_type=db_type, connections=connections)
+
+
+def warm_files(db_id: str, databases_path: Optional[str]) -> Dict[str, Any]:
+    """Read the schema and description files under databases_path/db_id (up to WARM_MAX_FILE_BYTES each) so the
+    first ls/cat/grep hits the page cache, record the list of all its files as the catalog for that database,
+    and update its search_schema index"""
+    if not databases_path:
+        raise ValueError("--databases_path is required to warm database files")
+    root = os.path.join(databases_path, db_id)
+    if not os.path.isdir(root):
+        raise FileNotFoundError(f"Database directory not found: {root}")
+
+    files = []
+    total_bytes = 0
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            files.append(os.path.relpath(path, root))
+            if filename.startswith(".") or not filename.lower().endswith(WARM_EXTENSIONS):
+                continue
+            with open(path, "rb") as f:
+                total_bytes += len(f.read(WARM_MAX_FILE_BYTES))
+    files.sort()
+    _catalog[db_id] = files
+    # Bring the search_schema index up to date, so the first search doesn't build it
+    from servers.tools.schema_search_tool import update_index
+    search = update_index(root, force=True)
+    return {"db_id": db_id, "files": len(files), "bytes": total_bytes, "search_indexed": search["indexed"]}
+
+
+def _warm_target(target: Dict[str, Any], connections: int) -> Dict[str, Any]:
+    start = time.perf_counter()
+    kind = target["kind"]
+    try:
+        if kind == "connection":
+            detail = warm_connection(target["db_type"], connections)
+        else:
+            detail = warm_files(target["db_id"], target.get("databases_path"))
+        status = "ok"
+    except Exception as e:
+        WARMUP_FAILURES.inc(labels={"kind": kind})
+        logger.warning(f"Warm-up failed for {target}: {str(e)}")
+        detail = {"error": str(e)}
+        status = "error"
+    elapsed = time.perf_counter() - start
+    WARMUP_SECONDS.observe(elapsed, {"kind": kind})
+    return {"target": {k: v for k, v in target.items() if k != "databases_path"},
+            "status": status, "seconds": elapsed, **detail}
+
+
+def run_warmup(targets: List[Dict[str, Any]], connections: int = 1, max_workers: int = 16,
+               progress: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Warm all targets in parallel; `progress` (if given) is updated as targets finish"""
+    start = time.perf_counter()
+    results = []
+    if progress is not None:
+        progress.update({"total": len(targets), "done": 0})
+    if targets:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(targets))) as executor:
+            futures = [executor.submit(_warm_target, target, connections) for target in targets]
+            for future in as_completed(futures):
+                results.append(future.result())
+                if progress is not None:
+                    progress["done"] = len(results)
+    report = {
+        "targets": len(targets),
+        "failed": sum(1 for r in results if r["status"] != "ok"),
+        "seconds": time.perf_counter() - start,
+        "results": results,
+    }
+    logger.info(f"Warm-up finished: {report['targets']} targets, {report['failed']} failed, {report['seconds']:.2f}s")
+    return report
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The agent is run as `python agent/main.py` and imports its modules flat; the tool server imports `servers.*`
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, "agent")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+from blob_store import BLOB_FILE, BLOB_REF, BlobStore, pack_result, unpack
+from file_manager import RESULTS_FILE, JsonlResultStore, read_results_log
+
+SCHEMA = "CREATE TABLE t (a INT);\n" * 100
+
+
+def test_texts_are_stored_once_and_read_back(tmp_path):
+    blobs = BlobStore(str(tmp_path))
+    first = blobs.put(SCHEMA)
+    assert blobs.put(SCHEMA) == first
+    blobs.close()
+    size = (tmp_path / BLOB_FILE).stat().st_size
+    assert size < len(SCHEMA)
+
+    reopened = BlobStore(str(tmp_path))
+    assert reopened.get(first) == SCHEMA
+    with pytest.raises(KeyError):
+        reopened.get("0" * 40)
+    reopened.close()
+
+
+def test_a_torn_record_is_dropped_on_the_next_write(tmp_path):
+    blobs = BlobStore(str(tmp_path))
+    kept = blobs.put("kept " * 50)
+    blobs.close()
+    with open(tmp_path / BLOB_FILE, "ab") as f:
+        f.write(b"z" + b"\0" * 10)
+    blobs = BlobStore(str(tmp_path))
+    added = blobs.put("added " * 50)
+    blobs.close()
+    blobs = BlobStore(str(tmp_path))
+    assert blobs.get(kept) == "kept " * 50 and blobs.get(added) == "added " * 50
+    blobs.close()
+
+
+def test_read_cache_is_bounded(tmp_path):
+    blobs = BlobStore(str(tmp_path), cache_chars=100)
+    ids = [blobs.put(letter * 40) for letter in "abcd"]
+    for blob_id in ids:
+        blobs.get(blob_id)
+    assert sum(len(text) for text in blobs._cache.values()) <= 100
+    assert list(blobs._cache) == ids[-2:]
+    # Texts larger than the bound are read but never cached
+    big = blobs.put("x" * 500)
+    assert blobs.get(big) == "x" * 500 and big not in blobs._cache
+    blobs.close()
+
+
+def test_pack_and_unpack_round_trip(tmp_path):
+    blobs = BlobStore(str(tmp_path))
+    result = {"instance_id": "a", "conversation": [{"role": "system", "content": SCHEMA},
+                                                   {"role": "user", "content": "short"}]}
+    result["final_messages"] = list(result["conversation"])
+    packed = pack_result(result, blobs, min_chars=100)
+    assert packed["conversation"][0]["content"] == {BLOB_REF: blobs.put(SCHEMA)}
+    assert packed["conversation"][1]["content"] == "short"
+    assert unpack(json.loads(json.dumps(packed)), blobs) == result
+    with pytest.raises(KeyError):
+        unpack(packed, None)
+    blobs.close()
+
+
+def test_results_log_is_self_contained_unless_blobs_are_enabled(tmp_path):
+    result = {"instance_id": "a", "conversation": [{"role": "system", "content": SCHEMA}]}
+    inline = JsonlResultStore(str(tmp_path / "inline"))
+    inline.append(result)
+    inline.close()
+    assert not (tmp_path / "inline" / BLOB_FILE).exists()
+    assert json.dumps(SCHEMA) in (tmp_path / "inline" / RESULTS_FILE).read_text()
+
+    packed = JsonlResultStore(str(tmp_path / "packed"), blob_min_chars=100)
+    packed.append(result)
+    packed.append(result)
+    packed.close()
+    assert json.dumps(SCHEMA) not in (tmp_path / "packed" / RESULTS_FILE).read_text()
+    assert read_results_log(str(tmp_path / "packed")) == [result, result]
@@ -0,0 +1,98 @@
+import json
+from collections import Counter
+
+from checkpoint import CHECKPOINT_FILE, CheckpointStore
+from round_log import RoundLog
+
+PROMPT = [{"role": "system", "content": "system"}, {"role": "user", "content": "task"}]
+
+
+def _play_round(log, i):
+    log.append({"role": "assistant", "content": f"call {i}"},
+               tool_calls=[{"name": "execute_bash", "arguments": {"command": f"ls {i}"}}])
+    log.append({"role": "user", "content": f"EXECUTION RESULT of [execute_bash]:\n{i}"}, role="tool")
+
+
+def _checkpointed_rollout(folder, rounds, key="a#0"):
+    store = CheckpointStore(folder)
+    log = RoundLog(PROMPT, {"elided": {3, 1}})
+    loop_state = {"rounds": Counter({"x": 2}), "hints": 1}
+    for i in range(rounds):
+        _play_round(log, i)
+        store.save_round(key, i + 1, log, loop_state, initial_count=len(PROMPT))
+    return store, log
+
+
+def test_unfinished_rollouts_are_restored_with_their_state(tmp_path):
+    store, log = _checkpointed_rollout(str(tmp_path), 3)
+    store.close()
+
+    checkpoints = CheckpointStore(str(tmp_path)).load()
+    assert list(checkpoints) == ["a#0"]
+    checkpoint = checkpoints["a#0"]
+    assert checkpoint.rounds == 3
+    restored, loop_state = checkpoint.restore(PROMPT, {"elided": set()}, {"rounds": Counter(), "hints": 0})
+    assert restored.messages == log.messages
+    assert restored.conversation() == log.conversation()
+    assert restored.context_state == {"elided": {1, 3}}
+    assert loop_state == {"rounds": Counter({"x": 2}), "hints": 1}
+
+
+def test_checkpoint_lines_hold_only_the_new_entries(tmp_path):
+    store, _ = _checkpointed_rollout(str(tmp_path), 3)
+    store.close()
+    lines = [json.loads(line) for line in (tmp_path / CHECKPOINT_FILE).read_text().splitlines()]
+    assert [(line["offset"], len(line["entries"])) for line in lines] == [(0, 2), (2, 2), (4, 2)]
+
+
+def test_finished_rollouts_are_dropped_and_the_file_compacted(tmp_path):
+    store, _ = _checkpointed_rollout(str(tmp_path), 2, key="a#0")
+    _checkpointed_rollout(str(tmp_path), 1, key="b#0")[0].close()
+    store.finish("a#0")
+    store.close()
+    assert list(CheckpointStore(str(tmp_path)).load()) == ["b#0"]
+    assert len((tmp_path / CHECKPOINT_FILE).read_text().splitlines()) == 1
+
+
+def test_discarded_rollouts_are_not_loaded_again(tmp_path):
+    _checkpointed_rollout(str(tmp_path), 2, key="a#0")[0].close()
+    _checkpointed_rollout(str(tmp_path), 1, key="a#1")[0].close()
+    store = CheckpointStore(str(tmp_path))
+    assert sorted(store.load()) == ["a#0", "a#1"]
+    # e.g. a#0 finished the instance in an earlier run, so a#1 is never resumed
+    store.discard(["a#1"])
+    store.close()
+    assert list(CheckpointStore(str(tmp_path)).load()) == ["a#0"]
+
+
+def test_a_torn_delta_restarts_the_rollout(tmp_path):
+    store, _ = _checkpointed_rollout(str(tmp_path), 3)
+    store.close()
+    path = tmp_path / CHECKPOINT_FILE
+    lines = path.read_text().splitlines()
+    # The second delta was lost: the third no longer continues the first
+    path.write_text(lines[0] + "\n" + lines[1][:20] + "\n" + lines[2] + "\n")
+    assert CheckpointStore(str(tmp_path)).load() == {}
+
+
+def test_resumed_rollouts_keep_appending_deltas(tmp_path):
+    _checkpointed_rollout(str(tmp_path), 2)[0].close()
+    store = CheckpointStore(str(tmp_path))
+    checkpoint = store.load()["a#0"]
+    log, loop_state = checkpoint.restore(PROMPT, {"elided": set()}, {"rounds": Counter(), "hints": 0})
+    store.resume("a#0", checkpoint, len(PROMPT))
+    _play_round(log, 2)
+    store.save_round("a#0", 3, log, loop_state, initial_count=len(PROMPT))
+    store.close()
+    restored = CheckpointStore(str(tmp_path)).load()["a#0"]
+    assert restored.rounds == 3 and len(restored.entries) == 6
+
+
+def test_disabled_store_writes_nothing(tmp_path):
+    store = CheckpointStore(str(tmp_path), enabled=False)
+    log = RoundLog(PROMPT)
+    _play_round(log, 0)
+    store.save_round("a#0", 1, log)
+    store.finish("a#0")
+    store.close()
+    assert not (tmp_path / CHECKPOINT_FILE).exists()
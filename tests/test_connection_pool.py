@@ -0,0 +1,73 @@
+import itertools
+import threading
+
+import pytest
+
+from servers.utils.connection_pool import ConnectionPool
+
+
+def _pool(max_size=2, fail=False):
+    ids = itertools.count()
+    closed = []
+
+    def factory():
+        if fail:
+            raise ConnectionError("refused")
+        return f"conn{next(ids)}"
+
+    return ConnectionPool("test", factory, closed.append, max_size=max_size), closed
+
+
+def test_connections_are_reused_lifo():
+    pool, _ = _pool()
+    a = pool.acquire()
+    b = pool.acquire()
+    pool.release(a)
+    pool.release(b)
+    assert pool.acquire() == b  # The warmest connection first
+    assert pool.acquire() == a
+    assert pool.size == 2
+
+
+def test_checkout_waits_for_a_return_at_max_size():
+    pool, _ = _pool(max_size=1)
+    conn = pool.acquire()
+    with pytest.raises(TimeoutError):
+        pool.acquire(timeout=0.05)
+
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.acquire(timeout=2)))
+    waiter.start()
+    pool.release(conn)
+    waiter.join()
+    assert got == [conn] and pool.size == 1
+
+
+def test_broken_connections_are_closed_and_their_slot_freed():
+    pool, closed = _pool(max_size=1)
+    with pytest.raises(RuntimeError):
+        with pool.connection() as conn:
+            raise RuntimeError("query failed")
+    assert closed == [conn] and pool.size == 0
+    with pool.connection() as fresh:
+        assert fresh != conn
+    assert pool.acquire() == fresh  # Returned normally: reused
+
+
+def test_a_failed_open_gives_its_slot_back():
+    pool, _ = _pool(max_size=1, fail=True)
+    with pytest.raises(ConnectionError):
+        pool.acquire(timeout=0.05)
+    assert pool.size == 0
+    with pytest.raises(ConnectionError):
+        pool.acquire(timeout=0.05)  # Not a TimeoutError: the slot was released
+
+
+def test_prefill_and_close_all():
+    pool, closed = _pool(max_size=3)
+    assert pool.prefill(5) == 3
+    assert pool.prefill(2) == 0
+    in_use = pool.acquire()
+    pool.close_all()
+    assert sorted(closed) == sorted({"conn0", "conn1", "conn2"} - {in_use})
+    assert pool.size == 1
@@ -0,0 +1,68 @@
+from context_manager import RECALL_TOOL, ContextManager, is_error_observation, recall_observation
+from tool_schemas import parse_xml_tool_schemas, with_recall_tool
+
+
+def _rollout(rounds, observation_chars=400):
+    messages = [{"role": "system", "content": "S" * 100}, {"role": "user", "content": "task"}]
+    for i in range(rounds):
+        messages.append({"role": "assistant", "content": f"call {i}"})
+        messages.append({"role": "user", "content": f"EXECUTION RESULT of [execute_bash]:\n{i}" + "x" * observation_chars})
+    return messages
+
+
+def test_disabled_manager_returns_the_messages_unchanged():
+    messages = _rollout(5)
+    manager = ContextManager(budget_tokens=0)
+    assert manager.view(messages, manager.new_state()) is messages
+
+
+def test_old_observations_are_elided_down_to_the_low_water_mark():
+    messages = _rollout(8)
+    manager = ContextManager(budget_tokens=600, keep_rounds=2, stub_chars=20)
+    view = manager.view(messages, manager.new_state())
+    assert view[:2] == messages[:2]
+    elided = [i for i, (old, new) in enumerate(zip(messages, view)) if old is not new]
+    assert elided and all(messages[i]["role"] == "user" for i in elided)
+    # The last keep_rounds rounds are never touched
+    assert view[-4:] == messages[-4:]
+    assert f"Call {RECALL_TOOL} with id={elided[0]}" in view[elided[0]]["content"]
+    assert sum(len(m["content"]) for m in view) / 4 <= 600 * 0.75 + 1
+    assert manager.summary()["elided"] == len(elided)
+
+
+def test_elision_only_moves_forward_so_the_prefix_stays_stable():
+    messages = _rollout(8)
+    manager = ContextManager(budget_tokens=600, keep_rounds=2, stub_chars=20)
+    state = manager.new_state()
+    first = manager.view(messages, state)
+    messages += _rollout(1)[2:]
+    second = manager.view(messages, state)
+    assert second[:len(first) - 4] == first[:len(first) - 4]
+
+
+def test_recall_returns_the_full_observation():
+    messages = _rollout(3)
+    result = recall_observation(messages, {"id": 3})
+    assert result["content"] == f"EXECUTION RESULT of [{RECALL_TOOL}]:\n{messages[3]['content']}"
+    assert "No observation with id=1" in recall_observation(messages, {"id": 1})["content"]
+    assert "No observation" in recall_observation(messages, {"id": "x"})["content"]
+
+
+def test_error_observations():
+    assert is_error_observation("EXECUTION RESULT of [execute_sqlite_sql]:\nError: no such table: foo")
+    assert is_error_observation("{'error': 'boom'}")
+    assert not is_error_observation("EXECUTION RESULT of [execute_bash]:\nschema.sql")
+
+
+def test_recall_tool_is_added_to_the_text_tools_block_once():
+    prompt = "Use tools.\n<tools>\n<function>\n<name>execute_bash</name>\n</function>\n</tools>\nGo."
+    with_recall = with_recall_tool(prompt)
+    assert with_recall_tool(with_recall) == with_recall
+    names = [schema["function"]["name"] for schema in parse_xml_tool_schemas(with_recall)]
+    assert names == ["execute_bash", RECALL_TOOL]
+    assert with_recall.endswith("</tools>\nGo.")
+
+
+def test_recall_tool_is_described_in_prose_without_a_tools_block():
+    prompt = with_recall_tool("You are a helpful assistant.")
+    assert f"`{RECALL_TOOL}`" in prompt and with_recall_tool(prompt) == prompt
@@ -0,0 +1,81 @@
+from convert_to_submission_format import select_majority_answer
+from early_stop import EarlyStopCoordinator, normalize_sql, result_fingerprint, terminate_answer, vote_key
+
+
+def _conversation(answer):
+    return [{"role": "user", "content": "task"},
+            {"role": "assistant", "content": "done", "tool_calls": [{"name": "terminate", "arguments": {"answer": answer}}]}]
+
+
+def _record(answer, **fields):
+    return {"terminated": True, "conversation": _conversation(answer), **fields}
+
+
+def test_normalize_sql_ignores_case_whitespace_comments_and_semicolons():
+    a = "SELECT name, COUNT(*)\n  FROM t -- all rows\n WHERE x = 'Ab  C' /* note */ ;"
+    b = "select name,count( * ) from T where x='Ab  C'"
+    assert normalize_sql(a) == normalize_sql(b)
+    # Quoted literals and identifiers keep their case and spacing
+    assert normalize_sql("SELECT * FROM t WHERE x = 'ab c'") != normalize_sql(b)
+    assert normalize_sql('SELECT "Name" FROM t') != normalize_sql('SELECT "name" FROM t')
+
+
+def test_terminate_answer():
+    assert terminate_answer(_conversation("SELECT 1")) == "SELECT 1"
+    assert terminate_answer([{"tool_calls": [{"name": "terminate", "arguments": '{"answer": "SELECT 2"}'}]}]) == "SELECT 2"
+    assert terminate_answer(_conversation("  ")) is None
+    assert terminate_answer([{"tool_calls": [{"name": "execute_bash", "arguments": {}}]}]) is None
+    assert terminate_answer([]) is None
+
+
+def test_vote_key_prefers_the_result_fingerprint():
+    rows = "EXECUTION RESULT of [execute_sql]:\nname,n\nb,2\na,1"
+    reordered = "EXECUTION RESULT of [execute_sql]:\nname,n\na,1\nb,2"
+    assert result_fingerprint(rows) == result_fingerprint(reordered)  # Row order doesn't count
+    assert result_fingerprint("EXECUTION RESULT of [execute_sql]:\nError: no such table") is None
+    assert vote_key("SELECT 1", result_fingerprint(rows)).startswith("result:")
+    assert vote_key("select 1 ;") == vote_key("SELECT  1") == "sql:select 1"
+
+
+def test_quorum_decides_the_instance_once():
+    coordinator = EarlyStopCoordinator(quorum=2)
+    assert coordinator.enabled and not coordinator.decided("a")
+    assert not coordinator.vote("a", vote_key("SELECT 1"))
+    assert not coordinator.vote("a", vote_key("SELECT 2"))
+    assert coordinator.vote("a", vote_key("select 1;"))
+    assert coordinator.decided("a") and coordinator.decisions["a"] == "sql:select 1"
+    assert not coordinator.vote("a", vote_key("SELECT 2"))  # Votes after the decision change nothing
+    coordinator.record("cancelled", 2)
+    assert coordinator.summary() == {"votes": 4, "decided": 1, "cancelled": 2, "skipped": 0}
+    assert not EarlyStopCoordinator(quorum=0).decided("a")
+
+
+def test_seed_counts_saved_votes_without_stats():
+    coordinator = EarlyStopCoordinator(quorum=2, mode="result")
+    coordinator.seed([
+        {"instance_id": "a", **_record("SELECT 1", vote="result:x")},
+        {"instance_id": "a", **_record("SELECT 1 + 0", vote="result:x")},  # Different SQL, same result
+        {"instance_id": "b", **_record("SELECT 1")},
+        {"instance_id": "b", "terminated": False, "conversation": _conversation("SELECT 1")},
+    ])
+    assert coordinator.decided("a") and coordinator.decisions["a"] == "result:x"
+    assert not coordinator.decided("b")
+    assert coordinator.summary()["votes"] == 0
+
+
+def test_select_majority_answer():
+    records = [_record("SELECT 2", rollout_idx=0), _record("select 1", rollout_idx=1),
+               _record("SELECT 1;", rollout_idx=2), _record("SELECT 2", rollout_idx=3)]
+    record, answer, votes = select_majority_answer(records)
+    # 2 votes each: the answer reached first wins
+    assert (record["rollout_idx"], answer, votes) == (0, "SELECT 2", 2)
+
+    records.append(_record("SELECT  1", rollout_idx=4))
+    record, answer, votes = select_majority_answer(records)
+    assert (record["rollout_idx"], answer, votes) == (1, "select 1", 3)
+
+    # Saved result votes group answers whose SQL differs
+    record, answer, votes = select_majority_answer([
+        _record("SELECT 3", vote="result:y"), _record("SELECT 4", vote="result:x"), _record("SELECT 5", vote="result:x")])
+    assert (answer, votes) == ("SELECT 4", 2)
+    assert select_majority_answer([{"terminated": True, "conversation": []}]) is None
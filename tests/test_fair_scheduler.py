@@ -0,0 +1,109 @@
+import threading
+import time
+
+import pytest
+
+from servers.utils.fair_scheduler import FairScheduler
+
+
+def _blocked(scheduler, key="blocker"):
+    """Occupy a worker until the returned event is set, so later submissions queue up"""
+    release = threading.Event()
+    started = threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    future = scheduler.submit(key, block)
+    assert started.wait(5)
+    return release, future
+
+
+def test_results_and_exceptions_are_returned_through_futures():
+    scheduler = FairScheduler(max_workers=2)
+    try:
+        assert scheduler.submit("a", lambda: 42).result(5) == 42
+        failing = scheduler.submit("a", lambda: 1 / 0)
+        with pytest.raises(ZeroDivisionError):
+            failing.result(5)
+    finally:
+        scheduler.shutdown()
+
+
+def test_a_late_key_is_not_starved_by_a_long_queue():
+    scheduler = FairScheduler(max_workers=1)
+    order = []
+    try:
+        release, blocker = _blocked(scheduler)
+        futures = [scheduler.submit("busy", lambda i=i: order.append(f"busy{i}")) for i in range(6)]
+        futures += [scheduler.submit("late", lambda i=i: order.append(f"late{i}")) for i in range(2)]
+        release.set()
+        for future in [blocker] + futures:
+            future.result(5)
+    finally:
+        scheduler.shutdown()
+    # Round robin: the late key's calls are interleaved with the busy key's instead of waiting for all six
+    assert order.index("late1") < order.index("busy3")
+
+
+def test_weights_share_workers_proportionally():
+    scheduler = FairScheduler(max_workers=1)
+    order = []
+    try:
+        release, blocker = _blocked(scheduler)
+        futures = [scheduler.submit("heavy", lambda: order.append("heavy"), weight=2.0) for _ in range(8)]
+        futures += [scheduler.submit("light", lambda: order.append("light"), weight=1.0) for _ in range(8)]
+        release.set()
+        for future in [blocker] + futures:
+            future.result(5)
+    finally:
+        scheduler.shutdown()
+    first = order[:9]
+    assert first.count("heavy") == 6 and first.count("light") == 3
+
+
+def test_max_per_key_caps_concurrent_calls_of_one_key():
+    scheduler = FairScheduler(max_workers=4, max_per_key=1)
+    running = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def call():
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.02)
+        with lock:
+            running -= 1
+
+    try:
+        futures = [scheduler.submit("rollout", call) for _ in range(5)]
+        for future in futures:
+            future.result(5)
+    finally:
+        scheduler.shutdown()
+    assert peak == 1
+
+
+def test_cancelled_calls_are_not_run():
+    scheduler = FairScheduler(max_workers=1)
+    ran = []
+    try:
+        release, blocker = _blocked(scheduler)
+        queued = scheduler.submit("a", lambda: ran.append("queued"))
+        assert queued.cancel()
+        release.set()
+        blocker.result(5)
+        scheduler.submit("a", lambda: None).result(5)
+    finally:
+        scheduler.shutdown()
+    assert ran == [] and scheduler.queue_depth() == 0
+
+
+def test_submit_after_shutdown_raises():
+    scheduler = FairScheduler(max_workers=1)
+    scheduler.shutdown()
+    with pytest.raises(RuntimeError):
+        scheduler.submit("a", lambda: None)
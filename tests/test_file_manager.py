@@ -0,0 +1,85 @@
+import json
+import os
+
+import pytest
+
+from file_manager import (RESULTS_FILE, BackgroundResultWriter, JsonlResultStore, compact_results,
+                          load_results_by_instance, read_results_log)
+
+
+def _result(instance_id, rollout_idx):
+    return {"instance_id": instance_id, "rollout_idx": rollout_idx, "terminated": True,
+            "conversation": [{"role": "user", "content": f"{instance_id} {rollout_idx}"}]}
+
+
+def test_results_are_appended_one_line_each(tmp_path):
+    store = JsonlResultStore(str(tmp_path), fsync_every=2)
+    store.write([_result("a", 0), _result("b", 0)])
+    store.append(_result("a", 1))
+    store.close()
+    store.close()  # Closing twice is harmless
+    lines = (tmp_path / RESULTS_FILE).read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["rollout_idx"] for line in lines] == [0, 0, 1]
+    assert read_results_log(str(tmp_path)) == [_result("a", 0), _result("b", 0), _result("a", 1)]
+
+
+def test_a_torn_last_line_is_skipped_and_terminated(tmp_path):
+    store = JsonlResultStore(str(tmp_path))
+    store.append(_result("a", 0))
+    store.close()
+    with open(tmp_path / RESULTS_FILE, "ab") as f:
+        f.write(JsonlResultStore.encode(_result("a", 1))[:25])  # The process died mid-write
+    assert read_results_log(str(tmp_path)) == [_result("a", 0)]
+
+    # The next run starts its results on a line of their own
+    store = JsonlResultStore(str(tmp_path))
+    store.append(_result("a", 2))
+    store.close()
+    assert [r["rollout_idx"] for r in read_results_log(str(tmp_path))] == [0, 2]
+
+
+def test_background_writer_batches_and_reports_failures(tmp_path):
+    writer = BackgroundResultWriter(JsonlResultStore(str(tmp_path)))
+    for i in range(5):
+        writer.append(_result("a", i))
+    writer.close()
+    assert [r["rollout_idx"] for r in read_results_log(str(tmp_path))] == list(range(5))
+
+    class FailingStore(JsonlResultStore):
+        def write(self, results):
+            raise OSError("disk full")
+
+    writer = BackgroundResultWriter(FailingStore(str(tmp_path / "failing")))
+    writer.append(_result("a", 0))
+    with pytest.raises(OSError, match="1 results could not be written"):
+        writer.close()
+
+
+def test_results_from_instance_files_and_the_log_are_merged(tmp_path):
+    with open(tmp_path / "a.json", "w", encoding="utf-8") as f:
+        json.dump([_result("a", 0)], f)
+    (tmp_path / "broken.json").write_text("{", encoding="utf-8")
+    store = JsonlResultStore(str(tmp_path))
+    store.write([_result("a", 1), _result("b", 0)])
+    store.close()
+    by_instance = load_results_by_instance(str(tmp_path))
+    assert {instance_id: [r["rollout_idx"] for r in results] for instance_id, results in by_instance.items()} == {
+        "a": [0, 1], "b": [0]}
+
+
+def test_compact_results(tmp_path):
+    store = JsonlResultStore(str(tmp_path))
+    store.write([_result("a", 0), _result("b", 0), _result("a", 1)])
+    store.close()
+
+    dest = tmp_path / "compacted"
+    compact_results(str(tmp_path), str(dest))
+    assert sorted(os.listdir(dest)) == ["a.json", "b.json"]
+    assert os.path.exists(tmp_path / RESULTS_FILE)  # The source folder is left alone
+
+    compact_results(str(tmp_path))
+    assert not os.path.exists(tmp_path / RESULTS_FILE)
+    with open(tmp_path / "a.json", encoding="utf-8") as f:
+        assert json.load(f) == [_result("a", 0), _result("a", 1)]
+    # Resuming from the compacted folder counts every result once
+    assert sum(len(results) for results in load_results_by_instance(str(tmp_path)).values()) == 3
@@ -0,0 +1,51 @@
+from loop_detector import LoopDetector, call_fingerprint, error_signature
+from round_log import RoundLog
+
+
+def _round(log, call, observation):
+    log.append({"role": "assistant", "content": "..."}, tool_calls=[call])
+    log.append({"role": "user", "content": f"EXECUTION RESULT of [{call['name']}]:\n{observation}"})
+
+
+def test_sql_fingerprints_ignore_case_whitespace_comments_and_work_dir():
+    a = {"name": "execute_sqlite_sql", "arguments": {"sql": "SELECT name FROM t", "work_dir": "/a"}}
+    b = {"name": "execute_sqlite_sql", "arguments": {"sql": "select  name\nfrom t -- again", "work_dir": "/b"}}
+    assert call_fingerprint(a) == call_fingerprint(b)
+
+
+def test_non_sql_arguments_must_match_exactly():
+    a = {"name": "execute_bash", "arguments": {"command": "grep -n Customer schema.sql"}}
+    b = {"name": "execute_bash", "arguments": {"command": "grep -n customer schema.sql"}}
+    c = {"name": "search_schema", "arguments": {"query": "order -- total"}}
+    d = {"name": "search_schema", "arguments": {"query": "order"}}
+    assert call_fingerprint(a) != call_fingerprint(b)
+    assert call_fingerprint(c) != call_fingerprint(d)
+
+
+def test_error_signature_masks_literals_and_numbers():
+    assert error_signature("Error: no such column: 'foo' at line 3") == error_signature("Error: no such column: 'bar' at line 7")
+
+
+def test_hint_after_threshold_repeats():
+    detector = LoopDetector(policy="hint", threshold=3)
+    state = detector.new_state()
+    log = RoundLog([{"role": "user", "content": "task"}])
+    call = {"name": "execute_bash", "arguments": {"command": "ls"}}
+    for _ in range(2):
+        _round(log, call, "schema.sql")
+        assert not detector.check(state, log)
+    _round(log, call, "schema.sql")
+    assert not detector.check(state, log)
+    assert log.messages[-1]["content"].startswith("You have repeated the same step 3 times")
+    assert detector.report(state)["repeat"] == 1
+
+
+def test_abort_on_an_error_cycle():
+    detector = LoopDetector(policy="abort", threshold=2)
+    state = detector.new_state()
+    log = RoundLog([{"role": "user", "content": "task"}])
+    _round(log, {"name": "execute_sqlite_sql", "arguments": {"sql": "SELECT a FROM t"}}, "Error: no such column: 'a'")
+    assert not detector.check(state, log)
+    _round(log, {"name": "execute_sqlite_sql", "arguments": {"sql": "SELECT b FROM t"}}, "Error: no such column: 'b'")
+    assert detector.check(state, log)
+    assert state["stopped"] == "error_cycle"
@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+
+from message_processor import TOOL_CALL_CLOSE, MessageProcessor, close_stopped_tool_call
+from round_log import RoundLog
+
+PROMPT = [{"role": "system", "content": "Use execute_sqlite_sql."}, {"role": "user", "content": "task"}]
+ITEM = {"instance_id": "a", "db_id": "shop"}
+# Generation stopped on the </tool_call> stop sequence, which the API leaves out
+STOPPED = "Let me look.\n<tool_call>\n<function=execute_bash>\n<parameter=command>\nls\n</parameter>\n</function>\n"
+
+
+def _processor(**args):
+    return MessageProcessor(SimpleNamespace(databases_path="/data", database_type="sqlite", **args))
+
+
+def test_the_stripped_closing_tag_is_restored():
+    assert close_stopped_tool_call(STOPPED, "stop") == STOPPED.rstrip() + "\n" + TOOL_CALL_CLOSE
+    complete = STOPPED + TOOL_CALL_CLOSE
+    assert close_stopped_tool_call(complete, "stop") == complete
+    # Cut off by max_tokens, or no tool call at all: left as it is
+    assert close_stopped_tool_call(STOPPED, "length") == STOPPED
+    assert close_stopped_tool_call("Just text.", "stop") == "Just text."
+    assert close_stopped_tool_call("", "stop") == ""
+
+
+def test_a_restored_call_is_executed():
+    log = RoundLog(PROMPT)
+    result = _processor().apply_response(close_stopped_tool_call(STOPPED, "stop"), ITEM, log)
+    assert result == {"continue": True, "tool_calls": [
+        {"name": "execute_bash", "arguments": {"command": "ls", "work_dir": "/data/shop"}}]}
+    assert log.record(-1)["content"] == "Let me look."
+
+
+def test_a_call_without_its_closing_tag_gets_the_format_reminder():
+    log = RoundLog(PROMPT)
+    assert _processor(disable_tool_call_repair=True).apply_response(STOPPED, ITEM, log) == {"continue": True}
+    assert "<tool_call> tag format" in log.messages[-1]["content"]
+
+
+def _native_call(call_id, name, arguments):
+    return {"id": call_id, "type": "function", "function": {"name": name, "arguments": arguments}}
+
+
+def test_native_calls_are_all_returned_for_execution():
+    log = RoundLog(PROMPT)
+    message = {"content": "Two reads.", "tool_calls": [
+        _native_call("c1", "execute_bash", '{"command": "ls"}'),
+        _native_call("c2", "execute_sqlite_sql", '{"sql": "SELECT 1"}'),
+    ]}
+    result = _processor().apply_response(message, ITEM, log)
+    assert result == {"continue": True, "tool_calls": [
+        {"id": "c1", "name": "execute_bash", "arguments": {"command": "ls", "work_dir": "/data/shop"}},
+        {"id": "c2", "name": "execute_sqlite_sql", "arguments": {"sql": "SELECT 1"}},
+    ]}
+    # The LLM gets its raw calls back; the conversation keeps the parsed ones
+    assert log.messages[-1] == {"role": "assistant", "content": "Two reads.", "tool_calls": message["tool_calls"]}
+    assert [call["name"] for call in log.record(-1)["tool_calls"]] == ["execute_bash", "execute_sqlite_sql"]
+
+    _processor().apply_tool_results(result["tool_calls"], [{"content": "schema.sql"}, {"content": "1"}], log)
+    assert [(m["role"], m["tool_call_id"]) for m in log.messages[-2:]] == [("tool", "c1"), ("tool", "c2")]
+
+
+def test_invalid_native_arguments_are_answered_without_running():
+    log = RoundLog(PROMPT)
+    message = {"content": "", "tool_calls": [_native_call("c1", "execute_bash", '{"command": '),
+                                             _native_call("c2", "execute_bash", '["ls"]')]}
+    assert _processor().apply_response(message, ITEM, log) == {"continue": True, "tool_calls": []}
+    assert [m["tool_call_id"] for m in log.messages[-2:]] == ["c1", "c2"]
+    assert all("Invalid JSON arguments" in m["content"] for m in log.messages[-2:])
+
+
+def test_native_terminate_and_no_call():
+    log = RoundLog(PROMPT)
+    message = {"content": "", "tool_calls": [_native_call("c1", "terminate", '{"answer": "SELECT 1"}')]}
+    assert _processor().apply_response(message, ITEM, log) == {"terminated": True}
+
+    log = RoundLog(PROMPT)
+    assert _processor().apply_response({"content": "Thinking."}, ITEM, log) == {"continue": True}
+    assert log.messages[-1]["role"] == "user" and "calling a function" in log.messages[-1]["content"]
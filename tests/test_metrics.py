@@ -0,0 +1,48 @@
+import pytest
+
+from servers.utils.metrics import MetricsRegistry
+
+
+def test_counters_and_gauges_render_as_prometheus_text():
+    registry = MetricsRegistry(prefix="test")
+    calls = registry.counter("calls_total", "Calls by tool")
+    calls.inc(labels={"tool": "execute_bash"})
+    calls.inc(2, labels={"tool": 'say "hi"\n'})
+    depth = registry.gauge("queue_depth")
+    depth.set(3)
+    depth.dec()
+    with depth.track_inprogress():
+        assert depth.value() == 3
+    assert registry.render_prometheus() == (
+        "# HELP test_calls_total Calls by tool\n"
+        "# TYPE test_calls_total counter\n"
+        'test_calls_total{tool="execute_bash"} 1\n'
+        'test_calls_total{tool="say \\"hi\\"\\n"} 2\n'
+        "# TYPE test_queue_depth gauge\n"
+        "test_queue_depth 2\n"
+    )
+
+
+def test_histograms_render_cumulative_buckets():
+    registry = MetricsRegistry(prefix="")
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        latency.observe(value, {"tool": "sql"})
+    lines = registry.render_prometheus().splitlines()
+    assert lines[2:] == [
+        'latency_seconds_bucket{tool="sql",le="0.1"} 1',
+        'latency_seconds_bucket{tool="sql",le="1"} 3',
+        'latency_seconds_bucket{tool="sql",le="+Inf"} 4',
+        'latency_seconds_sum{tool="sql"} 6.05',
+        'latency_seconds_count{tool="sql"} 4',
+    ]
+    series = registry.snapshot()["metrics"]["latency_seconds"]["series"][0]
+    assert series["count"] == 4 and series["mean"] == pytest.approx(6.05 / 4)
+    assert 0.1 < series["p50"] <= 1.0 and series["p99"] == 1.0
+
+
+def test_metrics_are_shared_by_name_and_type():
+    registry = MetricsRegistry()
+    assert registry.counter("x") is registry.counter("x")
+    with pytest.raises(ValueError):
+        registry.gauge("x")
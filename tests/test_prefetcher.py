@@ -0,0 +1,52 @@
+import threading
+import time
+
+from prefetcher import InstancePrefetcher
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_prefetcher_stays_within_the_lookahead_window():
+    items = [{"instance_id": f"i{n}", "db_id": "db"} for n in range(5)]
+    prepared = []
+    lock = threading.Lock()
+
+    def prepare(item):
+        if item["instance_id"] == "i2":
+            raise OSError("schema missing")
+        with lock:
+            prepared.append(item["instance_id"])
+
+    prefetcher = InstancePrefetcher(items, lookahead=2, prepare=prepare)
+    prefetcher.start()
+    try:
+        _wait_for(lambda: prefetcher.summary()["prepared"] == 2)
+        time.sleep(0.05)
+        assert prepared == ["i0", "i1"]  # Waits for a rollout to start before going further
+
+        prefetcher.started("i0")
+        _wait_for(lambda: prefetcher.summary()["failed"] == 1)
+        prefetcher.started("i0")  # Later rollouts of a started instance don't move the window
+        prefetcher.started("i2")
+        prefetcher.started("unknown")
+        _wait_for(lambda: prefetcher.summary()["prepared"] == 4)
+        assert prepared == ["i0", "i1", "i3", "i4"]
+        prefetcher.started("i4")
+    finally:
+        prefetcher.stop()
+    summary = prefetcher.summary()
+    # i0 and i4 were ready when they started; i2 failed to prepare, so it started cold
+    assert summary == {"prepared": 4, "failed": 1, "warmed": 0, "warm_failed": 0, "ready": 2, "cold": 1}
+
+
+def test_disabled_prefetcher_starts_no_thread():
+    prefetcher = InstancePrefetcher([{"instance_id": "a"}], lookahead=0, prepare=lambda item: None)
+    assert not prefetcher.enabled
+    prefetcher.start()
+    assert prefetcher._thread is None
+    prefetcher.stop()
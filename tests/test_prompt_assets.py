@@ -0,0 +1,71 @@
+import os
+
+from prompt_assets import PromptAssetCache
+
+
+def _write(path, text, mtime_ns=None):
+    path.write_text(text, encoding="utf-8")
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_files_are_read_once_until_they_change(tmp_path):
+    path = tmp_path / "schema.sql"
+    _write(path, " CREATE TABLE a (x INT);\n", mtime_ns=1_000_000_000)
+    cache = PromptAssetCache()
+    assert cache.read_text(str(path)) == "CREATE TABLE a (x INT);"
+    assert cache.read_text(str(path)) == "CREATE TABLE a (x INT);"
+
+    # Same size, new mtime: the edit is picked up
+    _write(path, " CREATE TABLE b (x INT);\n", mtime_ns=2_000_000_000)
+    assert cache.read_text(str(path)) == "CREATE TABLE b (x INT);"
+    assert cache.read_text(str(tmp_path / "missing.sql")) is None
+    summary = cache.summary()
+    assert (summary["hits"], summary["misses"], summary["stale"], summary["entries"]) == (1, 1, 1, 1)
+
+
+def test_directory_listings_follow_the_directory(tmp_path):
+    (tmp_path / "b.json").write_text("{}")
+    (tmp_path / ".hidden").write_text("")
+    cache = PromptAssetCache()
+    assert cache.list_dir(str(tmp_path)) == "b.json"
+    (tmp_path / "a.json").write_text("{}")
+    os.utime(tmp_path, ns=(3_000_000_000, 3_000_000_000))
+    assert cache.list_dir(str(tmp_path)) == "a.json\nb.json"
+    assert cache.list_dir(str(tmp_path / "missing")) == ""
+
+
+def test_derived_values_are_rebuilt_when_their_file_changes(tmp_path):
+    path = tmp_path / "schema.sql"
+    _write(path, "one", mtime_ns=1_000_000_000)
+    cache = PromptAssetCache()
+    builds = []
+
+    def build(p):
+        builds.append(p)
+        return {"parsed": open(p, encoding="utf-8").read()}
+
+    assert cache.load(str(path), build, kind="index") == {"parsed": "one"}
+    assert cache.load(str(path), build, kind="index") == {"parsed": "one"}
+    _write(path, "two", mtime_ns=2_000_000_000)
+    assert cache.load(str(path), build, kind="index") == {"parsed": "two"}
+    assert len(builds) == 2
+    assert cache.load(str(tmp_path / "missing"), build) is None
+
+
+def test_least_recently_used_entries_are_evicted_past_the_bound(tmp_path):
+    for name in "abc":
+        (tmp_path / name).write_text(name * 40)
+    cache = PromptAssetCache(max_bytes=100)
+    cache.read_text(str(tmp_path / "a"))
+    cache.read_text(str(tmp_path / "b"))
+    cache.read_text(str(tmp_path / "a"))  # b is now the least recently used
+    cache.read_text(str(tmp_path / "c"))
+    summary = cache.summary()
+    assert summary["evictions"] == 1 and summary["entries"] == 2 and summary["bytes"] == 80
+    cache.read_text(str(tmp_path / "a"))
+    assert cache.summary()["hits"] == 2  # a stayed cached, b was evicted
+
+    (tmp_path / "big").write_text("x" * 200)
+    assert cache.read_text(str(tmp_path / "big")) == "x" * 200  # Larger than the bound: returned, not cached
+    assert cache.summary()["entries"] == 2
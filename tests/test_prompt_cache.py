@@ -0,0 +1,63 @@
+import pickle
+
+from prompt_cache import MAX_BREAKPOINTS, LayeredText, PromptCacheStats, apply_cache_hints, prefix_key
+
+SYSTEM = LayeredText(["system prompt", "schema", "knowledge", "task"])
+
+
+def _breakpoints(messages):
+    return sum(1 for message in messages if isinstance(message["content"], list)
+               for block in message["content"] if "cache_control" in block)
+
+
+def test_layered_text_is_a_plain_string():
+    assert SYSTEM == "system prompt\n\nschema\n\nknowledge\n\ntask"
+    assert LayeredText(["a", "", "b"]).layers == ["a", "b"]
+    assert "".join(block["text"] for block in SYSTEM.blocks()) == SYSTEM
+    assert pickle.loads(pickle.dumps(SYSTEM)).layers == SYSTEM.layers
+
+
+def test_only_anthropic_mode_annotates():
+    messages = [{"role": "user", "content": SYSTEM}]
+    assert apply_cache_hints(messages, "none") is messages
+    assert apply_cache_hints(messages, "openai") is messages
+    assert apply_cache_hints([], "anthropic") == []
+
+
+def test_breakpoints_follow_the_most_shared_layers_and_the_last_message():
+    messages = [{"role": "user", "content": SYSTEM},
+                {"role": "assistant", "content": "call"},
+                {"role": "user", "content": "observation"}]
+    annotated = apply_cache_hints(messages, "anthropic")
+    blocks = annotated[0]["content"]
+    # Three layer breakpoints, the task layer falls past the limit; the fourth goes on the last message
+    assert ["cache_control" in block for block in blocks] == [True, True, True, False]
+    assert "".join(block["text"] for block in blocks) == SYSTEM
+    assert annotated[1] == messages[1]
+    assert annotated[2]["content"] == [{"type": "text", "text": "observation", "cache_control": {"type": "ephemeral"}}]
+    assert _breakpoints(annotated) == MAX_BREAKPOINTS
+    assert messages[0]["content"] is SYSTEM  # The input messages are not modified
+
+
+def test_a_lone_layered_prompt_stays_within_the_limit():
+    annotated = apply_cache_hints([{"role": "user", "content": SYSTEM}], "anthropic")
+    assert _breakpoints(annotated) <= MAX_BREAKPOINTS
+    assert "cache_control" in annotated[0]["content"][-1]
+
+
+def test_prefix_key_depends_on_the_shared_layers_only():
+    other_task = LayeredText(["system prompt", "schema", "knowledge", "another task"])
+    other_schema = LayeredText(["system prompt", "other schema", "knowledge", "task"])
+    key = prefix_key([{"role": "user", "content": SYSTEM}])
+    assert key == prefix_key([{"role": "user", "content": other_task}])
+    assert key != prefix_key([{"role": "user", "content": other_schema}])
+
+
+def test_cache_stats_read_openai_and_anthropic_usage():
+    stats = PromptCacheStats()
+    stats.record({"prompt_tokens": 1000, "prompt_tokens_details": {"cached_tokens": 800}})
+    stats.record({"input_tokens": 500, "cache_read_input_tokens": 0, "cache_creation_input_tokens": 400})
+    stats.record(None)
+    summary = stats.summary()
+    assert summary["requests"] == 2 and summary["hits"] == 1 and summary["misses"] == 1
+    assert summary["cache_write_tokens"] == 400 and summary["cached_ratio"] == round(800 / 1500, 3)
@@ -0,0 +1,96 @@
+import threading
+import time
+
+import pytest
+
+from rate_limiter import LLMRateLimiter, parse_reset_duration
+
+
+@pytest.mark.parametrize("value, seconds", [
+    ("1s", 1.0), ("6m0s", 360.0), ("20ms", 0.02), ("0.5", 0.5), ("1h2m", 3720.0),
+])
+def test_parse_reset_duration(value, seconds):
+    assert parse_reset_duration(value) == pytest.approx(seconds)
+
+
+@pytest.mark.parametrize("value", [None, "", "soon"])
+def test_parse_reset_duration_rejects_garbage(value):
+    assert parse_reset_duration(value) is None
+
+
+def test_concurrency_limit_blocks_until_release():
+    limiter = LLMRateLimiter(max_concurrency=1)
+    limiter.acquire()
+    admitted = threading.Event()
+    thread = threading.Thread(target=lambda: (limiter.acquire(), admitted.set()))
+    thread.start()
+    assert not admitted.wait(0.1)
+    limiter.release(usage={"total_tokens": 1, "completion_tokens": 1})
+    assert admitted.wait(2)
+    thread.join()
+
+
+def test_429_halves_the_limit_once_per_cooldown_and_blocks_everyone():
+    limiter = LLMRateLimiter(max_concurrency=8, cooldown=30)
+    for _ in range(3):
+        limiter.acquire()
+    limiter.release(rate_limited=True, headers={"retry-after": "2"})
+    limiter.release(rate_limited=True)
+    assert limiter.summary()["concurrency_limit"] == 4
+    assert limiter.summary()["rate_limited"] == 2
+    assert limiter._try_acquire(0) == pytest.approx(30, abs=1)
+
+
+def test_successes_raise_the_limit_additively():
+    limiter = LLMRateLimiter(max_concurrency=8, initial_concurrency=2)
+    for _ in range(4):
+        limiter.acquire()
+        limiter.release(usage={"total_tokens": 10, "completion_tokens": 5})
+    assert 3 <= limiter.limit < 4
+
+
+def test_usage_corrects_the_token_charge():
+    limiter = LLMRateLimiter(max_concurrency=4, tpm=10_000)
+    estimate = limiter.acquire(1_000)
+    assert limiter.tokens.level == pytest.approx(9_000, abs=5)
+    limiter.release(estimate, usage={"total_tokens": 400, "completion_tokens": 100})
+    assert limiter.tokens.level == pytest.approx(9_600, abs=5)
+
+
+def test_failed_requests_get_their_token_charge_back():
+    limiter = LLMRateLimiter(max_concurrency=4, tpm=10_000)
+    estimate = limiter.acquire(3_000)
+    limiter.release(estimate, success=False)
+    assert limiter.tokens.level == pytest.approx(10_000, abs=5)
+
+
+def test_successful_requests_without_usage_keep_their_token_charge():
+    # e.g. a stream closed at the end of its tool call, before the usage chunk
+    limiter = LLMRateLimiter(max_concurrency=4, tpm=10_000)
+    estimate = limiter.acquire(3_000)
+    limiter.release(estimate)
+    assert limiter.tokens.level == pytest.approx(7_000, abs=5)
+    assert limiter.in_flight == 0
+
+
+def test_headers_teach_the_budgets():
+    limiter = LLMRateLimiter(max_concurrency=4)
+    limiter.acquire()
+    limiter.release(usage={"total_tokens": 1, "completion_tokens": 1}, headers={
+        "x-ratelimit-limit-requests": "60",
+        "x-ratelimit-remaining-requests": "0",
+        "x-ratelimit-reset-requests": "1s",
+        "x-ratelimit-limit-tokens": "5000",
+    })
+    summary = limiter.summary()
+    assert summary["rpm"] == 60 and summary["tpm"] == 5000
+    wait = limiter._try_acquire(0)
+    assert 0 < wait <= 1.0
+
+
+def test_rpm_budget_spaces_requests():
+    limiter = LLMRateLimiter(max_concurrency=4, rpm=60)
+    limiter.requests.level = 0
+    start = time.monotonic()
+    limiter.acquire()
+    assert time.monotonic() - start >= 0.9
@@ -0,0 +1,121 @@
+import json
+import os
+import sqlite3
+
+from file_manager import RESULTS_FILE, JsonlResultStore, read_result_summaries
+from result_index import INDEX_FILE, ResultIndex, count_rounds
+
+CONVERSATION = [
+    {"role": "user", "content": "task"},
+    {"role": "assistant", "content": "call", "tool_calls": [{"name": "execute_bash", "arguments": {"command": "ls"}}]},
+    {"role": "tool", "content": "schema.sql"},
+    {"role": "assistant", "content": "done", "tool_calls": [{"name": "terminate", "arguments": {"answer": "SELECT 1"}}]},
+]
+
+
+def _result(instance_id, rollout_idx, terminated=True):
+    return {"instance_id": instance_id, "rollout_idx": rollout_idx, "terminated": terminated,
+            "conversation": CONVERSATION}
+
+
+def _append_lines(folder, *results):
+    with open(os.path.join(folder, RESULTS_FILE), "a", encoding="utf-8") as f:
+        for result in results:
+            f.write(json.dumps(result) + "\n")
+
+
+def test_count_rounds():
+    assert count_rounds(CONVERSATION) == 2
+    assert count_rounds(None) == 0
+
+
+def test_written_results_are_indexed_with_the_write(tmp_path):
+    index = ResultIndex(str(tmp_path), RESULTS_FILE)
+    store = JsonlResultStore(str(tmp_path), index=index)
+    store.write([_result("a", 0), _result("a", 1, terminated=False), _result("b", 0)])
+    store.close()
+    assert index.sync() == 0
+    assert dict(index.terminated_counts()) == {"a": 1, "b": 1}
+    summaries = index.summaries()
+    assert [(s["instance_id"], s["rollout_idx"], s["rounds"]) for s in summaries] == [("a", 0, 2), ("a", 1, 2), ("b", 0, 2)]
+    assert summaries[0]["vote"] is not None
+    index.close()
+
+
+def test_sync_picks_up_only_new_lines_and_skips_a_torn_tail(tmp_path):
+    folder = str(tmp_path)
+    _append_lines(folder, _result("a", 0))
+    index = ResultIndex(folder, RESULTS_FILE)
+    assert index.sync() == 1
+    _append_lines(folder, _result("b", 0))
+    with open(os.path.join(folder, RESULTS_FILE), "a") as f:
+        f.write('{"instance_id": "c", "rollo')
+    assert index.sync() == 1
+    with open(os.path.join(folder, RESULTS_FILE), "a") as f:
+        f.write('ut_idx": 0, "terminated": true}\n')
+    assert index.sync() == 1
+    assert sorted(index.terminated_counts()) == ["a", "b", "c"]
+    index.close()
+
+
+def test_replaced_log_and_per_instance_files_are_reindexed(tmp_path):
+    folder = str(tmp_path)
+    _append_lines(folder, _result("a", 0), _result("a", 1))
+    index = ResultIndex(folder, RESULTS_FILE)
+    index.sync()
+    # Compacted: the log is gone and the results live in <instance_id>.json
+    os.remove(os.path.join(folder, RESULTS_FILE))
+    with open(os.path.join(folder, "a.json"), "w") as f:
+        json.dump([_result("a", 0)], f)
+    index.sync()
+    assert [s["instance_id"] for s in index.summaries()] == ["a"]
+    assert index.rebuild() == 1
+    index.close()
+
+
+def _old_index(folder):
+    """An index written before the rounds column existed"""
+    conn = sqlite3.connect(os.path.join(folder, INDEX_FILE))
+    conn.executescript("""
+        CREATE TABLE results (source TEXT NOT NULL, offset INTEGER NOT NULL, instance_id TEXT NOT NULL,
+                              rollout_idx INTEGER, terminated INTEGER NOT NULL, cancelled INTEGER NOT NULL, vote TEXT);
+        CREATE TABLE sources (path TEXT PRIMARY KEY, size INTEGER NOT NULL, ident INTEGER NOT NULL);
+        INSERT INTO results VALUES ('results.jsonl', 0, 'stale', 0, 1, 0, NULL);
+        INSERT INTO sources VALUES ('results.jsonl', 999999, 0);
+    """)
+    conn.commit()
+    conn.close()
+
+
+def test_an_index_without_round_counts_is_migrated_and_rebuilt(tmp_path):
+    folder = str(tmp_path)
+    _append_lines(folder, _result("a", 0))
+    _old_index(folder)
+    index = ResultIndex(folder, RESULTS_FILE)
+    assert index.sync() == 1
+    assert [(s["instance_id"], s["rounds"]) for s in index.summaries()] == [("a", 2)]
+    index.close()
+
+
+def test_other_runs_are_read_without_touching_their_folder(tmp_path):
+    folder = str(tmp_path)
+    _append_lines(folder, _result("a", 0))
+    _old_index(folder)
+    index_path = os.path.join(folder, INDEX_FILE)
+    before = open(index_path, "rb").read()
+    # The old index predates round counts, so the results file is read instead; the index isn't migrated
+    assert [(s["instance_id"], s["rounds"]) for s in read_result_summaries(folder)] == [("a", 2)]
+    assert open(index_path, "rb").read() == before
+    assert sorted(os.listdir(folder)) == [INDEX_FILE, RESULTS_FILE]
+
+
+def test_other_runs_current_index_is_read_as_is(tmp_path):
+    folder = str(tmp_path)
+    index = ResultIndex(folder, RESULTS_FILE)
+    store = JsonlResultStore(folder, index=index)
+    store.write([_result("a", 0), _result("b", 0)])
+    store.close()
+    index.close()
+    assert [s["instance_id"] for s in read_result_summaries(folder)] == ["a", "b"]
+    assert sorted(os.listdir(folder)) == [INDEX_FILE, RESULTS_FILE]
+    assert read_result_summaries(str(tmp_path / "missing")) == []
@@ -0,0 +1,47 @@
+from rollout_fork import Fork, cluster_forks, history_key, share_context_state
+from round_log import RoundLog
+
+PROMPT = [{"role": "system", "content": "system"}, {"role": "user", "content": "task"}]
+
+
+def _fork(rollout_idx, *replies):
+    log = RoundLog(PROMPT, {"elided": {rollout_idx}})
+    for reply in replies:
+        log.append({"role": "assistant", "content": reply})
+    return Fork(rollout_idx, log)
+
+
+def test_forks_with_identical_histories_are_clustered_in_first_seen_order():
+    forks = [_fork(0, "ls"), _fork(1, "cat schema.sql"), _fork(2, "ls"), _fork(3)]
+    clusters = cluster_forks(forks)
+    assert [[fork.rollout_idx for fork in cluster] for cluster in clusters] == [[0, 2], [1], [3]]
+    assert cluster_forks([]) == []
+
+
+def test_history_key_is_insensitive_to_key_order():
+    assert history_key([{"role": "user", "content": "x"}]) == history_key([{"content": "x", "role": "user"}])
+    assert history_key([{"role": "user", "content": "x"}]) != history_key([{"role": "user", "content": "y"}])
+
+
+def test_clustered_forks_share_the_first_forks_context_state():
+    cluster = cluster_forks([_fork(0, "ls"), _fork(1, "ls")])[0]
+    share_context_state(cluster)
+    assert cluster[1].log.context_state == {"elided": {0}}
+    cluster[1].log.context_state["elided"].add(5)  # A copy: the forks may diverge later
+    assert cluster[0].log.context_state == {"elided": {0}}
+
+
+def test_fork_results():
+    fork = _fork(1, "done")
+    fork.status = "terminated"
+    fork.vote = "sql:select 1"
+    result = fork.result("a")
+    assert result["terminated"] and result["vote"] == "sql:select 1" and "cancelled" not in result
+    assert result["conversation"][-1] == {"role": "assistant", "content": "done"}
+
+    fork.status = "cancelled"
+    assert fork.result("a")["cancelled"] and not fork.result("a")["terminated"]
+
+    fork.fail("LLM error", round_num=3)
+    assert fork.result("a") == {"instance_id": "a", "rollout_idx": 1, "error": "LLM error", "terminated": False,
+                                "round_failed": 3}
@@ -0,0 +1,46 @@
+from context_manager import ContextManager
+from round_log import RoundLog
+
+PROMPT = [{"role": "system", "content": "system"}, {"role": "user", "content": "task"}]
+CALL = {"name": "execute_bash", "arguments": {"command": "ls"}}
+
+
+def _log():
+    log = RoundLog(PROMPT)
+    log.append({"role": "assistant", "content": "Let me look.\n<tool_call>...</tool_call>"},
+               content="Let me look.", tool_calls=[CALL])
+    log.append({"role": "user", "content": "EXECUTION RESULT of [execute_bash]:\nschema.sql"}, role="tool")
+    return log
+
+
+def test_messages_are_the_llm_view_and_conversation_the_saved_view():
+    log = _log()
+    assert log.messages[2] == {"role": "assistant", "content": "Let me look.\n<tool_call>...</tool_call>"}
+    assert log.conversation() == PROMPT + [
+        {"role": "assistant", "content": "Let me look.", "tool_calls": [CALL]},
+        {"role": "tool", "content": "EXECUTION RESULT of [execute_bash]:\nschema.sql"},
+    ]
+    assert log.conversation(-1) == [log.record(-1)]
+    assert len(log) == 4
+
+
+def test_messages_are_stored_once_and_shared_with_forks():
+    log = _log()
+    fork = RoundLog(log.messages)
+    fork.append({"role": "assistant", "content": "other"})
+    assert fork.messages[0] is log.messages[0] and len(log) == 4
+    # Views are built from references, not copies
+    assert log.conversation()[0] is PROMPT[0]
+
+
+def test_entries_round_trip_through_extend():
+    log = _log()
+    restored = RoundLog(PROMPT)
+    restored.extend(log.entries(len(PROMPT)))
+    assert restored.messages == log.messages and restored.conversation() == log.conversation()
+
+
+def test_compacted_view_goes_through_the_context_manager():
+    manager = ContextManager(budget_tokens=0)
+    log = RoundLog(PROMPT, manager.new_state())
+    assert log.compacted(manager) is log.messages
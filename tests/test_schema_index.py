@@ -0,0 +1,109 @@
+import json
+import os
+
+import pytest
+
+import schema_index
+from schema_index import SCHEMA_FILE, SchemaPruner, index_path, load_schema_index, split_schema, tokenize, \
+    write_schema_index
+
+PADDING = "\n".join(f"  note_{i} TEXT," for i in range(20))
+SCHEMA = f"""PRAGMA foreign_keys = ON;
+
+-- Customers of the shop
+CREATE TABLE customers (
+  customer_id INTEGER PRIMARY KEY,
+{PADDING}
+  name TEXT
+);
+
+CREATE TABLE IF NOT EXISTS "orders" (
+  order_id INTEGER,
+{PADDING}
+  customer_id INTEGER
+);
+
+CREATE TABLE `shipping_addresses` (
+  address_id INTEGER,
+{PADDING}
+  city TEXT
+);
+"""
+
+
+@pytest.fixture(autouse=True)
+def index_dir(tmp_path):
+    previous = schema_index._index_dir
+    schema_index.set_index_dir(str(tmp_path / "index"))
+    yield tmp_path / "index"
+    schema_index.set_index_dir(previous)
+
+
+def _database(tmp_path, schema=SCHEMA):
+    path = tmp_path / SCHEMA_FILE
+    path.parent.mkdir(parents=True)
+    path.write_text(schema, encoding="utf-8")
+    return str(path)
+
+
+def test_split_schema_keeps_comments_with_their_table():
+    preamble, tables = split_schema(SCHEMA)
+    assert preamble == "PRAGMA foreign_keys = ON;"
+    assert [name for name, _ in tables] == ["customers", "orders", "shipping_addresses"]
+    assert tables[0][1].startswith("-- Customers of the shop\nCREATE TABLE customers")
+
+
+def test_tokenize_splits_identifiers_and_folds_plurals():
+    assert tokenize("shippingRates order_items CREATE TABLE") == ["shipping", "rate", "order", "item"]
+    assert tokenize("categories x") == ["category"]
+
+
+def test_top_k_ranks_the_named_table_first(tmp_path):
+    index = load_schema_index(_database(tmp_path))
+    assert index.top_k("Which city are the orders shipped to?", 2)[0] in (1, 2)
+    assert index.top_k("How many orders were placed?", 1) == [1]
+    assert index.top_k("unrelated words only", 3) == []
+
+
+def test_prune_keeps_the_top_tables_and_lists_the_rest(tmp_path):
+    schema_path = _database(tmp_path)
+    pruner = SchemaPruner(top_k=1)
+    pruned = pruner.prune(schema_path, SCHEMA, "How many orders were placed?")
+    assert 'CREATE TABLE IF NOT EXISTS "orders"' in pruned
+    assert "CREATE TABLE customers" not in pruned
+    assert "2 more tables, not shown: customers, shipping_addresses" in pruned
+    assert pruned.startswith("PRAGMA foreign_keys = ON;")
+    summary = pruner.summary()
+    assert summary["pruned"] == 1 and summary["tables_kept"] == 1 and summary["tables_omitted"] == 2
+    assert summary["chars_saved"] == len(SCHEMA) - len(pruned)
+
+
+def test_prune_returns_the_full_schema_when_it_cannot_shrink_it(tmp_path):
+    schema_path = _database(tmp_path)
+    assert SchemaPruner(top_k=3).prune(schema_path, SCHEMA, "orders") == SCHEMA  # No more tables than top_k
+    pruner = SchemaPruner(top_k=1)
+    assert pruner.prune(schema_path, SCHEMA, "nothing relevant") == SCHEMA  # No table matches
+
+    small = "CREATE TABLE a (x INT);\nCREATE TABLE orders (y INT);\n"
+    small_path = _database(tmp_path / "small", small)
+    assert pruner.prune(small_path, small, "orders") == small  # The note would cost more than it saves
+    assert pruner.summary()["full"] == 2 and pruner.summary()["pruned"] == 0
+
+
+def test_written_index_is_loaded_while_it_matches_the_schema(tmp_path, index_dir):
+    db_dir = tmp_path / "shop"
+    schema_path = _database(db_dir)
+    before = sorted(os.listdir(db_dir / "database_description"))
+    assert write_schema_index(str(tmp_path / "missing")) is None
+    built = write_schema_index(str(db_dir))
+    # Kept in the index directory; the database directory (the agent's work_dir) is left as it was
+    assert os.listdir(index_dir) == [os.path.basename(index_path(str(db_dir)))]
+    assert sorted(os.listdir(db_dir / "database_description")) == before
+    assert index_path(str(tmp_path / "other" / "shop")) != index_path(str(db_dir))
+    with open(index_path(str(db_dir)), encoding="utf-8") as f:
+        assert json.load(f)["digest"] == built.digest
+    assert load_schema_index(schema_path).to_dict() == built.to_dict()
+
+    with open(schema_path, "a", encoding="utf-8") as f:
+        f.write("CREATE TABLE refunds (refund_id INTEGER);\n")
+    assert [t["name"] for t in load_schema_index(schema_path).tables][-1] == "refunds"
@@ -0,0 +1,112 @@
+import json
+import os
+import time
+
+import pytest
+
+from servers.tools import schema_search_tool
+from servers.tools.schema_search_tool import index_path, search_schema, set_rescan_seconds, update_index
+from servers.utils.warmup import warm_files
+
+SCHEMA_SQL = """-- Orders placed in the shop
+CREATE TABLE orders (
+  order_id INTEGER, -- one per checkout
+  customer_id INTEGER
+);
+
+CREATE TABLE customers (customer_id INTEGER, name TEXT);
+"""
+
+DDL_CSV = """table_name,description,DDL
+products,Items for sale,"CREATE TABLE products (product_id INT, price REAL)"
+,no name,ignored
+"""
+
+TABLE_JSON = {
+    "table_fullname": "SHOP.PUBLIC.SUPPLIERS",
+    "column_names": ["supplier_id", "country"],
+    "column_types": ["NUMBER", "TEXT"],
+    "description": "Who the products come from",
+    "sample_rows": [{"supplier_id": 1, "country": "Norway"}],
+}
+
+
+@pytest.fixture
+def index_dir(tmp_path):
+    previous = schema_search_tool._index_dir, schema_search_tool._rescan_seconds
+    schema_search_tool.set_index_dir(str(tmp_path / "index"))
+    set_rescan_seconds(0)
+    yield tmp_path / "index"
+    schema_search_tool.set_index_dir(previous[0])
+    set_rescan_seconds(previous[1])
+
+
+@pytest.fixture
+def db_dir(tmp_path):
+    db = tmp_path / "shop"
+    (db / "database_description").mkdir(parents=True)
+    (db / "database_description" / "schema.sql").write_text(SCHEMA_SQL, encoding="utf-8")
+    (db / "DDL.csv").write_text(DDL_CSV, encoding="utf-8")
+    (db / "SUPPLIERS.json").write_text(json.dumps(TABLE_JSON), encoding="utf-8")
+    (db / "data.csv").write_text("a,b\n1,2\n", encoding="utf-8")  # Only DDL.csv is a schema document
+    return db
+
+
+def test_parsers():
+    sql = schema_search_tool._documents_from_sql(SCHEMA_SQL)
+    assert [(name, description) for name, _, description, _ in sql] == [
+        ("orders", "Orders placed in the shop"), ("customers", "")]
+    assert schema_search_tool._documents_from_ddl_csv(DDL_CSV) == [
+        ("products", "CREATE TABLE products (product_id INT, price REAL)", "Items for sale", "")]
+    assert schema_search_tool._documents_from_json(json.dumps(TABLE_JSON)) == [
+        ("SHOP.PUBLIC.SUPPLIERS", "supplier_id NUMBER\ncountry TEXT", "Who the products come from", "1 | Norway")]
+    assert schema_search_tool._documents_from_json("[1, 2]") == []
+
+
+def test_index_is_kept_outside_the_database_directory(index_dir, db_dir):
+    assert update_index(str(db_dir), force=True) == {"indexed": 3, "removed": 0, "files": 3}
+    path = index_path(str(db_dir))
+    assert os.path.dirname(path) == str(index_dir) and os.path.basename(path).startswith("shop-")
+    assert os.path.exists(path)
+    assert not [name for name in os.listdir(db_dir) if name.endswith((".sqlite", "-wal", "-shm"))]
+    assert index_path(str(db_dir.parent / "other" / "shop")) != path
+
+
+def test_only_changed_files_are_reindexed(index_dir, db_dir):
+    update_index(str(db_dir), force=True)
+    assert update_index(str(db_dir)) == {"indexed": 0, "removed": 0}  # Indexed: queries don't rescan
+    assert update_index(str(db_dir), force=True) == {"indexed": 0, "removed": 0, "files": 3}
+
+    (db_dir / "DDL.csv").write_text(DDL_CSV.replace("Items for sale", "Goods for sale, with prices"), encoding="utf-8")
+    os.remove(db_dir / "SUPPLIERS.json")
+    assert update_index(str(db_dir), force=True) == {"indexed": 1, "removed": 1, "files": 2}
+    assert "No tables match" in search_schema("Norway", work_dir=str(db_dir))["content"]
+    assert "[Goods]" in search_schema("goods", work_dir=str(db_dir))["content"]
+
+
+def test_queries_use_an_existing_index_as_it_is(index_dir, db_dir):
+    update_index(str(db_dir), force=True)
+    schema_search_tool._last_scan.clear()  # As in a server started after the index was built
+    (db_dir / "DDL.csv").write_text(DDL_CSV.replace("Items for sale", "Goods for sale"), encoding="utf-8")
+    assert "No tables match" in search_schema("goods", work_dir=str(db_dir))["content"]
+
+    set_rescan_seconds(0.01)
+    time.sleep(0.02)
+    assert "[Goods]" in search_schema("goods", work_dir=str(db_dir))["content"]
+
+
+def test_warm_up_builds_the_index(index_dir, db_dir):
+    assert warm_files("shop", str(db_dir.parent))["search_indexed"] == 3
+    assert update_index(str(db_dir), force=True)["indexed"] == 0
+
+
+def test_search_schema(index_dir, db_dir):
+    content = search_schema("customer orders", work_dir=str(db_dir))["content"]
+    assert content.startswith("EXECUTION RESULT of [search_schema]:\n1. ")
+    assert f"orders ({os.path.join('database_description', 'schema.sql')})" in content
+    assert "SHOP.PUBLIC.SUPPLIERS (SUPPLIERS.json)" in search_schema("Norway", work_dir=str(db_dir))["content"]
+    assert search_schema("customer", work_dir=str(db_dir), limit="x")["content"].count("\n") >= 1
+
+    assert "No tables match: zebra" in search_schema("zebra", work_dir=str(db_dir))["content"]
+    assert "work_dir (the database directory) is required" in search_schema("orders")["content"]
+    assert "Database directory not found" in search_schema("orders", work_dir=str(db_dir / "missing"))["content"]
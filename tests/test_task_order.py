@@ -0,0 +1,52 @@
+import random
+
+import pytest
+
+from task_order import expected_rounds, interleave_rollouts, order_items, round_history
+
+
+def _items(*specs):
+    return [{"instance_id": instance_id, "db_id": db_id} for instance_id, db_id in specs]
+
+
+def test_round_history_skips_results_without_rounds():
+    summaries = [{"instance_id": "a", "rounds": 4}, {"instance_id": "a", "rounds": 6},
+                 {"instance_id": "b", "rounds": 0}, {"instance_id": "c"}]
+    assert dict(round_history(summaries)) == {"a": [4, 6]}
+
+
+def test_expected_rounds_falls_back_to_the_database_then_overall_mean():
+    items = _items(("a", "x"), ("b", "x"), ("c", "y"), ("d", "z"))
+    expected = expected_rounds(items, {"a": [4, 6], "c": [11]})
+    assert expected == {"a": 5.0, "b": 5.0, "c": 11.0, "d": 8.0}
+    assert expected_rounds(items, {}) == {"a": 1.0, "b": 1.0, "c": 1.0, "d": 1.0}
+
+
+def test_order_items():
+    items = _items(("a", "x"), ("b", "y"), ("c", "x"), ("d", "y"), ("e", "z"))
+    expected = {"a": 2, "b": 9, "c": 3, "d": 1, "e": 5}
+    ids = lambda ordered: [item["instance_id"] for item in ordered]  # noqa: E731
+
+    assert ids(order_items(items, "longest", expected)) == ["b", "e", "c", "a", "d"]
+    # y (10 rounds) first; z and x (5 each) tie, so z, whose longest instance comes first, goes next
+    assert ids(order_items(items, "db", expected)) == ["b", "d", "e", "c", "a"]
+    assert ids(order_items(items, "longest")) == ids(items)  # Stable without history
+
+    random.seed(0)
+    shuffled = order_items(items, "random")
+    assert sorted(ids(shuffled)) == ids(items) and shuffled is not items
+    with pytest.raises(ValueError):
+        order_items(items, "alphabetical")
+
+
+def test_interleave_rollouts():
+    a, b, c = _items(("a", "x"), ("b", "x"), ("c", "y"))
+    tasks = [(a, 0), (a, 1), (a, 2), (b, 0), (b, 1), (c, 0), (c, 1)]
+    names = lambda queued: [(item["instance_id"], idx) for item, idx in queued]  # noqa: E731
+
+    assert names(interleave_rollouts(tasks)) == [
+        ("a", 0), ("b", 0), ("c", 0), ("a", 1), ("b", 1), ("c", 1), ("a", 2)]
+    assert names(interleave_rollouts(tasks, by_db=True)) == [
+        ("a", 0), ("b", 0), ("a", 1), ("b", 1), ("a", 2), ("c", 0), ("c", 1)]
+    # Pending rollouts keep their own indices
+    assert names(interleave_rollouts([(a, 3), (b, 1), (a, 4)])) == [("a", 3), ("b", 1), ("a", 4)]
@@ -0,0 +1,53 @@
+from tool_call_repair import ToolCallRepairer, format_tool_call
+
+SQL_TOOL = "execute_sqlite_sql"
+
+
+def _repair(content):
+    repairer = ToolCallRepairer()
+    return repairer.repair(content, SQL_TOOL), repairer.summary()
+
+
+def test_unclosed_tags_are_closed():
+    repaired, stats = _repair("Let me look.\n<tool_call>\n<function=execute_bash>\n<parameter=command>\nls")
+    assert repaired == "Let me look.\n" + format_tool_call("execute_bash", {"command": "ls"})
+    assert stats == {"unclosed_tags": 1}
+
+
+def test_missing_wrapper_is_added():
+    repaired, stats = _repair("<function=execute_sqlite_sql>\n<parameter=sql>\nSELECT 1\n</parameter>\n</function>")
+    assert repaired == format_tool_call(SQL_TOOL, {"sql": "SELECT 1"})
+    assert stats == {"missing_wrapper": 1}
+
+
+def test_json_call_in_a_fence():
+    content = 'I will run:\n```json\n{"name": "execute_bash", "arguments": {"command": "cat schema.sql"}}\n```'
+    repaired, stats = _repair(content)
+    assert repaired == "I will run:\n" + format_tool_call("execute_bash", {"command": "cat schema.sql"})
+    assert stats == {"json": 1}
+
+
+def test_openai_style_json_with_string_arguments():
+    content = '{"type": "function", "function": {"name": "terminate", "arguments": "{\\"answer\\": \\"SELECT 2\\"}"}}'
+    repaired, _ = _repair(content)
+    assert repaired == format_tool_call("terminate", {"answer": "SELECT 2"})
+
+
+def test_last_sql_block_becomes_a_call_to_the_sql_tool():
+    content = "First:\n```sql\nSELECT 1\n```\nBetter:\n```sql\nSELECT 2\n```"
+    repaired, stats = _repair(content)
+    assert repaired.endswith(format_tool_call(SQL_TOOL, {"sql": "SELECT 2"}))
+    assert stats == {"sql_block": 1}
+
+
+def test_bash_block():
+    repaired, stats = _repair("```bash\nls -la\n```")
+    assert repaired == format_tool_call("execute_bash", {"command": "ls -la"})
+    assert stats == {"bash_block": 1}
+
+
+def test_prose_is_not_repaired():
+    repairer = ToolCallRepairer()
+    assert repairer.repair("I think the answer is 42.", SQL_TOOL) is None
+    assert repairer.repair("", SQL_TOOL) is None
+    assert repairer.summary() == {"unrepaired": 2}
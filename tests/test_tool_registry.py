@@ -0,0 +1,47 @@
+import sys
+
+import pytest
+
+from servers.tools import TOOL_MANIFEST
+from servers.utils.tool_registry import LazyTool, ToolRegistry
+
+
+@pytest.fixture
+def tool_module(tmp_path, monkeypatch):
+    (tmp_path / "lazy_tool_example.py").write_text(
+        "def echo(**kwargs):\n    return {'content': kwargs}\n", encoding="utf-8")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield "lazy_tool_example"
+    sys.modules.pop("lazy_tool_example", None)
+
+
+def test_lazy_tool_imports_its_module_on_first_call(tool_module):
+    tool = LazyTool("echo", f"{tool_module}:echo")
+    assert not tool.loaded and tool_module not in sys.modules
+    assert tool(text="hi") == {"content": {"text": "hi"}}
+    assert tool.loaded and tool_module in sys.modules
+    assert tool.resolve() is sys.modules[tool_module].echo
+
+
+def test_manifest_tools_are_registered_without_importing_them():
+    registry = ToolRegistry()
+    registry.load_tools()
+    try:
+        assert set(TOOL_MANIFEST) <= set(registry.tools)
+        for name in TOOL_MANIFEST:
+            assert isinstance(registry.tools[name], LazyTool)
+        assert not registry.tools["execute_snowflake_sql"].loaded
+
+        registry.preload_tools(["terminate"])
+        assert registry.tools["terminate"].loaded
+        assert not registry.tools["execute_snowflake_sql"].loaded
+    finally:
+        registry.executor.shutdown(wait=True)
+
+
+def test_a_broken_manifest_entry_fails_on_preload_without_raising(caplog):
+    registry = ToolRegistry()
+    registry.register_tool("broken", LazyTool("broken", "servers.tools.no_such_module:run"))
+    registry.preload_tools()
+    assert not registry.tools["broken"].loaded
+    assert "Error loading tool broken" in caplog.text
@@ -0,0 +1,32 @@
+import os
+
+from tool_schemas import NATIVE_PROTOCOL_NOTE, default_tool_schemas, native_system_prompt, parse_xml_tool_schemas
+
+PROMPTS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "prompts")
+
+
+def _prompt(name="spider_agent.txt"):
+    with open(os.path.join(PROMPTS, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def test_tools_block_becomes_tool_schemas():
+    schemas = parse_xml_tool_schemas(_prompt())
+    assert [s["function"]["name"] for s in schemas] == ["execute_snowflake_sql", "execute_bash", "terminate"]
+    parameters = schemas[0]["function"]["parameters"]
+    assert parameters["required"] == ["sql"] and parameters["properties"]["sql"]["type"] == "string"
+    assert parse_xml_tool_schemas("No tools here.") == []
+
+
+def test_native_system_prompt_drops_the_text_protocol():
+    prompt = native_system_prompt(_prompt())
+    assert "<tools>" not in prompt and "<tool_call>" not in prompt
+    assert "one tool_call at a time" not in prompt and "<function=" not in prompt
+    assert "Required parameters MUST be specified" in prompt  # Reminders unrelated to the format stay
+    assert prompt.endswith(NATIVE_PROTOCOL_NOTE)
+    assert "\n\n\n" not in prompt
+
+
+def test_default_tool_schemas_name_the_database_tool():
+    names = [s["function"]["name"] for s in default_tool_schemas("mysql")]
+    assert names == ["execute_mysql_sql", "execute_bash", "terminate"]
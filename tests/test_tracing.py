@@ -0,0 +1,48 @@
+import pytest
+
+from tracing import PARENT_SPAN_HEADER, TRACE_ID_HEADER, Tracer, load_events, parse_server_timing, summarize
+
+
+@pytest.mark.parametrize("header, timings", [
+    ("queue;dur=1.2, exec;dur=30.5", {"queue": 1.2, "exec": 30.5}),
+    ('exec;desc="tool run";dur=4', {"exec": 4.0}),
+    ("queue, exec;dur=abc, ;dur=3", {}),
+    (None, {}),
+    ("", {}),
+])
+def test_parse_server_timing(header, timings):
+    assert parse_server_timing(header) == timings
+
+
+def test_disabled_tracer_is_a_no_op():
+    tracer = Tracer()
+    with tracer.trace("a", 0) as rollout:
+        with tracer.span("llm_call") as span:
+            assert rollout is None and span is None
+        assert tracer.propagation_headers() == {}
+
+
+def test_spans_nest_and_summarize_by_phase(tmp_path):
+    path = str(tmp_path / "trace.json")
+    tracer = Tracer()
+    tracer.configure(path)
+    with tracer.trace("a", 0):
+        with tracer.span("llm_call", round=1):
+            pass
+        with tracer.span("tool_request") as request:
+            headers = tracer.propagation_headers()
+            assert headers[PARENT_SPAN_HEADER] == request.span_id and TRACE_ID_HEADER in headers
+            tracer.record("tool_exec", request.start_us, 2_000_000)
+    tracer.close()
+
+    events = load_events([path])
+    by_name = {event["name"]: event for event in events}
+    assert set(by_name) == {"rollout", "llm_call", "tool_request", "tool_exec"}
+    assert by_name["tool_exec"]["args"]["parent_id"] == by_name["tool_request"]["args"]["span_id"]
+    assert by_name["llm_call"]["args"]["parent_id"] == by_name["rollout"]["args"]["span_id"]
+    assert by_name["llm_call"]["args"]["round"] == 1
+
+    phases = summarize([path])["instances"]["a"]
+    assert phases["rollouts"] == 1 and phases["tool_exec"] == pytest.approx(2.0)
+    # tool_exec is nested in tool_request, so it doesn't count against "other"
+    assert phases["other"] == pytest.approx(phases["rollout"] - phases["llm_call"] - phases["tool_request"], abs=1e-6)